@@ -0,0 +1,283 @@
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from analytics_retention import ROLLUP_WATERMARK_KEY
+
+logger = logging.getLogger(__name__)
+
+BUCKETS = ('hour', 'day', 'week', 'month')
+DIMENSIONS = ('event_type', 'category', 'course_id')
+METRICS = ('event_count', 'enrollments', 'enrollment_velocity', 'fill_rate', 'rating_distribution')
+RATING_VALUES = (1, 2, 3, 4, 5)
+
+# SQLite pre-aggregates rows to the hour so pandas only sees one row per
+# hour and group instead of one per event. Grouping hour-first follows the
+# (date, course_id) index order, so SQLite doesn't need a sort.
+HOUR_SQL = "substr({column}, 1, 13) || ':00:00'"
+
+
+def floor_to_bucket(timestamps: pd.Series, bucket: str) -> pd.Series:
+    """Vectorized truncation of timestamps to the start of their bucket"""
+    if bucket == 'hour':
+        return timestamps.dt.floor('h')
+    if bucket == 'day':
+        return timestamps.dt.floor('D')
+    if bucket == 'week':
+        return timestamps.dt.to_period('W-SUN').dt.start_time
+    return timestamps.dt.to_period('M').dt.start_time
+
+
+def bucket_days(starts: pd.Series, bucket: str) -> np.ndarray:
+    """Length of each bucket in days, used to normalise velocities"""
+    if bucket == 'hour':
+        return np.full(len(starts), 1 / 24)
+    if bucket == 'day':
+        return np.ones(len(starts))
+    if bucket == 'week':
+        return np.full(len(starts), 7.0)
+    return starts.dt.days_in_month.to_numpy(dtype=float)
+
+
+def _to_records(frame: pd.DataFrame) -> List[Dict]:
+    if frame.empty:
+        return []
+    frame = frame.copy()
+    for column in frame.columns:
+        if pd.api.types.is_datetime64_any_dtype(frame[column]):
+            frame[column] = frame[column].dt.strftime('%Y-%m-%dT%H:%M:%S')
+    frame = frame.astype(object).where(frame.notna(), None)
+    return frame.to_dict(orient='records')
+
+
+def naive_local(timestamp: pd.Timestamp) -> pd.Timestamp:
+    """Events are stored as naive local times (datetime.now()); convert an offset-aware bound to match"""
+    if timestamp.tzinfo is None:
+        return timestamp
+    return pd.Timestamp(timestamp.to_pydatetime().astimezone()).tz_localize(None)
+
+
+class AnalyticsReporter:
+    """Ad-hoc reports over analytics events, enrollments and ratings.
+
+    SQLite pre-aggregates rows to hourly counts, which are pulled in chunks
+    with only the needed columns and rolled up to the requested buckets and
+    dimensions with pandas group-bys, so no per-row Python loop is involved.
+    Event counts for periods already rolled up by AnalyticsRetention come
+    from the hourly rollups (which survive archival), and raw events are
+    only read after the rollup watermark or for the part of an hour before
+    a start that is not on the hour."""
+
+    def __init__(self, database, chunk_size: int = 50000):
+        self.database = database
+        self.chunk_size = chunk_size
+
+    def parse_request(self, args) -> Dict:
+        """Validate report parameters from a query-string style mapping"""
+        now = datetime.now()
+        try:
+            end = pd.Timestamp(args.get('end')) if args.get('end') else pd.Timestamp(now)
+            start = pd.Timestamp(args.get('start')) if args.get('start') else end - pd.Timedelta(days=30)
+        except ValueError:
+            raise ValueError('start and end must be ISO 8601 dates')
+        start, end = naive_local(start), naive_local(end)
+        if start >= end:
+            raise ValueError('start must be before end')
+
+        bucket = args.get('bucket', 'day')
+        if bucket not in BUCKETS:
+            raise ValueError(f'Invalid bucket. Must be one of: {list(BUCKETS)}')
+
+        group_by = [dim for dim in (args.get('group_by') or '').split(',') if dim]
+        invalid = [dim for dim in group_by if dim not in DIMENSIONS]
+        if invalid:
+            raise ValueError(f'Invalid group_by {invalid}. Must be from: {list(DIMENSIONS)}')
+
+        metrics = [metric for metric in (args.get('metrics') or 'event_count,enrollments').split(',') if metric]
+        invalid = [metric for metric in metrics if metric not in METRICS]
+        if invalid:
+            raise ValueError(f'Invalid metrics {invalid}. Must be from: {list(METRICS)}')
+
+        filters = {dim: args.get(dim) for dim in DIMENSIONS if args.get(dim)}
+        return {'start': start, 'end': end, 'bucket': bucket, 'group_by': group_by,
+                'metrics': metrics, 'filters': filters}
+
+    def build_report(self, start: pd.Timestamp, end: pd.Timestamp, bucket: str = 'day',
+                     group_by: Optional[List[str]] = None, metrics: Optional[List[str]] = None,
+                     filters: Optional[Dict[str, str]] = None) -> Dict:
+        group_by = group_by or []
+        metrics = metrics or ['event_count']
+        filters = filters or {}
+
+        conn = self.database.get_connection()
+        try:
+            courses = pd.read_sql_query(
+                'SELECT id AS course_id, category, capacity, enrolled FROM courses', conn
+            )
+            categories = courses.set_index('course_id')['category']
+
+            report = {
+                'range': {'start': start.isoformat(), 'end': end.isoformat()},
+                'bucket': bucket,
+                'group_by': group_by,
+                'filters': filters
+            }
+            if 'event_count' in metrics:
+                report['event_count'] = _to_records(
+                    self._event_counts(conn, start, end, bucket, group_by, filters, categories))
+            if 'enrollments' in metrics or 'enrollment_velocity' in metrics:
+                enrollments = self._enrollment_counts(conn, start, end, bucket, group_by, filters, categories)
+                if 'enrollment_velocity' in metrics and not enrollments.empty:
+                    enrollments['velocity_per_day'] = np.round(
+                        enrollments['enrollments'].to_numpy() / bucket_days(enrollments['bucket_start'], bucket), 3)
+                report['enrollments'] = _to_records(enrollments)
+            if 'fill_rate' in metrics:
+                report['fill_rate'] = _to_records(self._fill_rate(courses, group_by, filters))
+            if 'rating_distribution' in metrics:
+                report['rating_distribution'] = _to_records(
+                    self._rating_distribution(conn, start, end, group_by, filters, categories))
+            return report
+        finally:
+            conn.close()
+
+    def _rollup_watermark(self, conn) -> Optional[pd.Timestamp]:
+        cursor = conn.cursor()
+        cursor.execute('SELECT value FROM job_state WHERE key = ?', (ROLLUP_WATERMARK_KEY,))
+        row = cursor.fetchone()
+        return pd.Timestamp(row[0]) if row and row[0] else None
+
+    def _apply_dimensions(self, frame: pd.DataFrame, filters: Dict, categories: pd.Series,
+                          allowed: tuple) -> pd.DataFrame:
+        if 'category' in allowed:
+            frame['category'] = frame['course_id'].map(categories)
+        for dim, value in filters.items():
+            if dim in allowed:
+                frame = frame[frame[dim] == value]
+        return frame
+
+    def _aggregate_chunks(self, conn, query: str, params: list, time_column: str, weight_column: str,
+                          bucket: str, keys: List[str], filters: Dict, categories: pd.Series,
+                          allowed: tuple) -> List[pd.Series]:
+        partials = []
+        for chunk in pd.read_sql_query(query, conn, params=params, chunksize=self.chunk_size):
+            if chunk.empty:
+                continue
+            chunk = self._apply_dimensions(chunk, filters, categories, allowed)
+            chunk['bucket_start'] = floor_to_bucket(pd.to_datetime(chunk[time_column], format='ISO8601'), bucket)
+            partials.append(chunk[weight_column].groupby([chunk[key] for key in keys], dropna=False).sum())
+        return partials
+
+    def _event_counts(self, conn, start, end, bucket, group_by, filters, categories) -> pd.DataFrame:
+        keys = ['bucket_start'] + group_by
+        allowed = DIMENSIONS
+        watermark = self._rollup_watermark(conn)
+        split = min(max(watermark.floor('h'), start), end) if watermark is not None else start
+        # Rollups hold whole hours, so a start inside an hour reads that partial hour from the raw rows
+        first_hour = min(start.ceil('h'), split)
+        partials = []
+
+        if first_hour > start:
+            partials += self._raw_event_counts(conn, start, first_hour, bucket, keys, filters, categories)
+        if split > first_hour:
+            # Rollups store a missing type/course as ''; turn it back into NULL to match the raw rows
+            partials += self._aggregate_chunks(
+                conn,
+                '''SELECT bucket_start, NULLIF(event_type, '') AS event_type,
+                          NULLIF(course_id, '') AS course_id, event_count FROM analytics_rollups
+                   WHERE granularity = 'hour' AND bucket_start >= ? AND bucket_start < ?''',
+                [first_hour.isoformat(), split.isoformat()],
+                'bucket_start', 'event_count', bucket, keys, filters, categories, allowed)
+        if split < end:
+            partials += self._raw_event_counts(conn, split, end, bucket, keys, filters, categories)
+
+        return self._combine(partials, keys, 'count')
+
+    def _raw_event_counts(self, conn, start, end, bucket, keys, filters, categories) -> List[pd.Series]:
+        return self._aggregate_chunks(
+            conn,
+            f'''SELECT {HOUR_SQL.format(column='timestamp')} AS hour, event_type, course_id, COUNT(*) AS n
+               FROM analytics WHERE timestamp >= ? AND timestamp < ?
+               GROUP BY 1, 2, 3''',
+            [start.isoformat(), end.isoformat()],
+            'hour', 'n', bucket, keys, filters, categories, DIMENSIONS)
+
+    def _enrollment_counts(self, conn, start, end, bucket, group_by, filters, categories) -> pd.DataFrame:
+        keys = ['bucket_start'] + [dim for dim in group_by if dim != 'event_type']
+        allowed = ('category', 'course_id')
+        partials = self._aggregate_chunks(
+            conn,
+            f'''SELECT e.hour, c.id AS course_id, e.n FROM (
+                   SELECT {HOUR_SQL.format(column='enrollment_date')} AS hour, course_pk, COUNT(*) AS n
+                   FROM enrollments WHERE enrollment_date >= ? AND enrollment_date < ?
+                   GROUP BY 1, 2
+               ) e LEFT JOIN courses c ON c.pk = e.course_pk''',
+            [start.isoformat(), end.isoformat()],
+            'hour', 'n', bucket, keys, filters, categories, allowed)
+        return self._combine(partials, keys, 'enrollments')
+
+    @staticmethod
+    def _combine(partials: List[pd.Series], keys: List[str], value_name: str) -> pd.DataFrame:
+        if not partials:
+            return pd.DataFrame(columns=keys + [value_name])
+        combined = pd.concat(partials).groupby(level=list(range(len(keys))), dropna=False).sum()
+        combined.index.names = keys
+        frame = combined.rename(value_name).reset_index()
+        frame[value_name] = frame[value_name].astype(np.int64)
+        return frame.sort_values(keys, na_position='last').reset_index(drop=True)
+
+    def _fill_rate(self, courses: pd.DataFrame, group_by: List[str], filters: Dict) -> pd.DataFrame:
+        """Current seats filled per group (a snapshot, not bucketed by time)"""
+        keys = [dim for dim in group_by if dim != 'event_type']
+        frame = courses
+        for dim, value in filters.items():
+            if dim != 'event_type':
+                frame = frame[frame[dim] == value]
+        if frame.empty:
+            return pd.DataFrame(columns=keys + ['enrolled', 'capacity', 'fill_rate'])
+        if keys:
+            totals = frame.groupby(keys, dropna=False)[['enrolled', 'capacity']].sum().reset_index()
+        else:
+            totals = pd.DataFrame({'enrolled': [frame['enrolled'].sum()], 'capacity': [frame['capacity'].sum()]})
+        capacity = totals['capacity'].to_numpy(dtype=float)
+        enrolled = totals['enrolled'].to_numpy(dtype=float)
+        totals['fill_rate'] = np.round(
+            np.divide(enrolled * 100.0, capacity, out=np.zeros_like(enrolled), where=capacity > 0), 1)
+        return totals
+
+    def _rating_distribution(self, conn, start, end, group_by, filters, categories) -> pd.DataFrame:
+        keys = [dim for dim in group_by if dim != 'event_type']
+        allowed = ('category', 'course_id')
+        counts = []
+        for chunk in pd.read_sql_query(
+                '''SELECT c.id AS course_id, r.rating FROM course_ratings r
+                   LEFT JOIN courses c ON c.pk = r.course_pk
+                   WHERE r.created_at >= ? AND r.created_at < ?''',
+                conn, params=[start.isoformat(), end.isoformat()], chunksize=self.chunk_size):
+            chunk = self._apply_dimensions(chunk, filters, categories, allowed)
+            chunk = chunk[chunk['rating'].isin(RATING_VALUES)]
+            if chunk.empty:
+                continue
+            group_keys = [chunk[key] for key in keys] + [chunk['rating']]
+            counts.append(chunk.groupby(group_keys, dropna=False).size())
+
+        columns = [f'rating_{value}' for value in RATING_VALUES]
+        if not counts:
+            return pd.DataFrame(columns=keys + columns + ['total', 'average'])
+        combined = pd.concat(counts).groupby(level=list(range(len(keys) + 1)), dropna=False).sum()
+        if keys:
+            table = combined.unstack(level=-1, fill_value=0).reindex(columns=list(RATING_VALUES), fill_value=0)
+        else:
+            table = combined.reindex(list(RATING_VALUES), fill_value=0).to_frame().T
+        values = table.to_numpy(dtype=np.int64)
+        totals = values.sum(axis=1)
+        frame = pd.DataFrame(values, columns=columns)
+        frame['total'] = totals
+        frame['average'] = np.round(values @ np.array(RATING_VALUES) / np.maximum(totals, 1), 2)
+        if keys:
+            index = table.index.to_frame(index=False)
+            index.columns = keys
+            frame = pd.concat([index, frame], axis=1)
+        return frame
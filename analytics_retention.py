@@ -0,0 +1,262 @@
+import gzip
+import json
+import logging
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from maintenance import bound_connection, out_of_time
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_WATERMARK_KEY = 'analytics_rollup_watermark'
+
+# SQL expressions turning an ISO timestamp into the start of its bucket
+BUCKET_EXPRESSIONS = {
+    'hour': "substr(timestamp, 1, 13) || ':00:00'",
+    'day': "substr(timestamp, 1, 10) || 'T00:00:00'"
+}
+
+
+class AnalyticsRetention:
+    """Keeps the analytics table small.
+
+    Raw events are first rolled up into hourly and daily counts per
+    event_type/course_id (incrementally, behind a watermark). Events older
+    than the retention cutoff that have already been rolled up are then
+    written to gzip NDJSON archive segments and deleted in bounded batches.
+
+    A segment is written and renamed into place before its rows are deleted,
+    so a crash can at worst leave a row in both the archive and the table;
+    the next run archives it again under the same id, and archive readers
+    should de-duplicate on `id`."""
+
+    def __init__(self, database, archive_dir: str = 'analytics_archive', retention_days: int = 90,
+                 batch_size: int = 5000, max_batches: int = 20, grace_minutes: int = 5):
+        self.database = database
+        self.archive_dir = archive_dir
+        self.retention_days = retention_days
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        self.grace_minutes = grace_minutes
+
+    def run(self, now: Optional[datetime] = None, deadline: Optional[float] = None) -> Dict:
+        """Roll up new events, then archive and prune expired ones.
+
+        With a time.monotonic() `deadline`, statements still running at it
+        are rolled back and no new chunk or batch starts after it; the
+        results then report `complete: False`."""
+        now = now or datetime.now()
+        rolled_up = self.rollup(now, deadline)
+        archived = self.archive_expired(now, deadline)
+        return {'rollup': rolled_up, 'archive': archived}
+
+    def _get_watermark(self, cursor) -> Optional[str]:
+        cursor.execute('SELECT value FROM job_state WHERE key = ?', (ROLLUP_WATERMARK_KEY,))
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    def rollup(self, now: Optional[datetime] = None, deadline: Optional[float] = None) -> Dict:
+        """Aggregate events from the watermark up to the last closed hour, a day per transaction"""
+        now = now or datetime.now()
+        # Only roll up hours that can no longer receive events
+        upper = (now - timedelta(minutes=self.grace_minutes)).replace(minute=0, second=0, microsecond=0)
+        upper_iso = upper.isoformat()
+
+        conn = self.database.get_connection()
+        bound_connection(conn, deadline)
+        cursor = conn.cursor()
+        try:
+            first_iso = lower_iso = self._get_watermark(cursor) or ''
+            if lower_iso >= upper_iso:
+                return {'events': 0, 'from': lower_iso, 'to': upper_iso, 'complete': True}
+            if not lower_iso:
+                # First run: start from the oldest event's hour rather than the beginning of time
+                cursor.execute('SELECT MIN(timestamp) FROM analytics WHERE timestamp < ?', (upper_iso,))
+                oldest = cursor.fetchone()[0]
+                lower_iso = min(oldest[:13] + ':00:00', upper_iso) if oldest else upper_iso
+
+            total = 0
+            reached = first_iso
+            while True:
+                # A day at a time, so a backlog commits progress instead of one huge transaction
+                chunk_upper_iso = upper_iso
+                if lower_iso < upper_iso:
+                    next_day = datetime.fromisoformat(lower_iso[:13] + ':00:00') + timedelta(days=1)
+                    chunk_upper_iso = min(next_day.isoformat(), upper_iso)
+                try:
+                    total += self._rollup_chunk(conn, lower_iso, chunk_upper_iso)
+                except sqlite3.OperationalError as e:
+                    if 'interrupt' not in str(e):
+                        raise
+                    # Out of time mid-chunk; SQLite rolled it back and the next run redoes it
+                    conn.rollback()
+                    break
+                lower_iso = reached = chunk_upper_iso
+                if reached >= upper_iso or out_of_time(deadline):
+                    break
+
+            logger.info(f"Rolled up {total} analytics events from {first_iso or 'start'} to {reached or 'start'}")
+            return {'events': total, 'from': first_iso, 'to': reached, 'complete': reached >= upper_iso}
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def _rollup_chunk(self, conn, lower_iso: str, upper_iso: str) -> int:
+        """Add the events in [lower_iso, upper_iso) to the rollups and move the watermark, in one transaction"""
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute('SELECT COUNT(*) FROM analytics WHERE timestamp >= ? AND timestamp < ?',
+                       (lower_iso, upper_iso))
+        event_count = cursor.fetchone()[0]
+
+        for granularity, bucket_sql in BUCKET_EXPRESSIONS.items():
+            cursor.execute(f'''
+                INSERT INTO analytics_rollups (granularity, bucket_start, event_type, course_id, event_count)
+                SELECT ?, {bucket_sql}, COALESCE(event_type, ''), COALESCE(course_id, ''), COUNT(*)
+                FROM analytics
+                WHERE timestamp >= ? AND timestamp < ?
+                GROUP BY 2, 3, 4
+                ON CONFLICT (granularity, bucket_start, event_type, course_id)
+                DO UPDATE SET event_count = event_count + excluded.event_count
+            ''', (granularity, lower_iso, upper_iso))
+
+        cursor.execute('''
+            INSERT INTO job_state (key, value, updated_at) VALUES (?, ?, ?)
+            ON CONFLICT (key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at
+        ''', (ROLLUP_WATERMARK_KEY, upper_iso, datetime.now().isoformat()))
+        conn.commit()
+        return event_count
+
+    def archive_expired(self, now: Optional[datetime] = None, deadline: Optional[float] = None) -> Dict:
+        """Move rolled-up events older than the retention cutoff to archive segments"""
+        now = now or datetime.now()
+        cutoff_iso = (now - timedelta(days=self.retention_days)).isoformat()
+
+        conn = self.database.get_connection()
+        bound_connection(conn, deadline)
+        cursor = conn.cursor()
+        archived = 0
+        segments = []
+        complete = False
+        try:
+            # Never delete events whose counts aren't in the rollups yet
+            watermark = self._get_watermark(cursor)
+            if not watermark:
+                return {'events': 0, 'segments': [], 'cutoff': cutoff_iso, 'complete': True}
+            limit_iso = min(cutoff_iso, watermark)
+
+            for _ in range(self.max_batches):
+                if out_of_time(deadline):
+                    break
+                segment = None
+                try:
+                    cursor.execute('''
+                        SELECT rowid, id, event_type, course_id, student_id, data, timestamp
+                        FROM analytics
+                        WHERE timestamp < ?
+                        ORDER BY timestamp
+                        LIMIT ?
+                    ''', (limit_iso, self.batch_size))
+                    rows = cursor.fetchall()
+                    if not rows:
+                        complete = True
+                        break
+
+                    segment = self._write_segment(rows)
+
+                    cursor.execute('BEGIN IMMEDIATE')
+                    cursor.executemany('DELETE FROM analytics WHERE rowid = ?', [(row[0],) for row in rows])
+                    conn.commit()
+                except sqlite3.OperationalError as e:
+                    if 'interrupt' not in str(e):
+                        raise
+                    # Out of time; the rows are still in the table, so their segment goes
+                    conn.rollback()
+                    if segment:
+                        os.remove(os.path.join(self.archive_dir, segment))
+                    break
+                segments.append(segment)
+                archived += len(rows)
+
+                if len(rows) < self.batch_size:
+                    complete = True
+                    break
+
+            if archived:
+                logger.info(f"Archived {archived} analytics events older than {cutoff_iso} into {len(segments)} segments")
+            return {'events': archived, 'segments': segments, 'cutoff': cutoff_iso, 'complete': complete}
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def _write_segment(self, rows: List) -> str:
+        """Write rows to a new gzip NDJSON segment; segments are never modified once renamed"""
+        os.makedirs(self.archive_dir, exist_ok=True)
+        first_ts = rows[0][6] or ''
+        stamp = first_ts[:19].replace('-', '').replace(':', '').replace('T', '-') or 'unknown'
+        name = f'analytics-{stamp}-{time.time_ns()}.ndjson.gz'
+        path = os.path.join(self.archive_dir, name)
+        tmp_path = path + '.tmp'
+
+        with open(tmp_path, 'wb') as raw:
+            with gzip.GzipFile(fileobj=raw, mode='wb') as gz:
+                for _, event_id, event_type, course_id, student_id, data, timestamp in rows:
+                    try:
+                        payload = json.loads(data) if data else None
+                    except ValueError:
+                        payload = data
+                    record = {
+                        'id': event_id,
+                        'event_type': event_type,
+                        'course_id': course_id,
+                        'student_id': student_id,
+                        'data': payload,
+                        'timestamp': timestamp
+                    }
+                    gz.write((json.dumps(record, separators=(',', ':')) + '\n').encode('utf-8'))
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(tmp_path, path)
+        return name
+
+    def get_rollups(self, granularity: str = 'day', start: str = '', end: str = '',
+                    event_type: str = '', course_id: str = '') -> List[Dict]:
+        """Read aggregated counts, newest bucket last"""
+        if granularity not in BUCKET_EXPRESSIONS:
+            raise ValueError(f'Invalid granularity. Must be one of: {list(BUCKET_EXPRESSIONS)}')
+        query = '''
+            SELECT bucket_start, event_type, course_id, event_count
+            FROM analytics_rollups WHERE granularity = ?
+        '''
+        params = [granularity]
+        if start:
+            query += ' AND bucket_start >= ?'
+            params.append(start)
+        if end:
+            query += ' AND bucket_start < ?'
+            params.append(end)
+        if event_type:
+            query += ' AND event_type = ?'
+            params.append(event_type)
+        if course_id:
+            query += ' AND course_id = ?'
+            params.append(course_id)
+        query += ' ORDER BY bucket_start, event_type, course_id'
+
+        conn = self.database.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            return [
+                {'bucket_start': row[0], 'event_type': row[1], 'course_id': row[2] or None, 'count': row[3]}
+                for row in cursor.fetchall()
+            ]
+        finally:
+            conn.close()
@@ -1,40 +1,119 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, g, Response
 from flask_cors import CORS
 import json
 import uuid
 import os
+import multiprocessing
+import threading
 from datetime import datetime, timedelta
 import sqlite3
 import csv
 from io import StringIO, BytesIO
 import pandas as pd
 from werkzeug.utils import secure_filename
-import openai
 from typing import List, Dict, Optional
 import logging
+import time
+import hmac
+import metrics
+import migrations
+from profiler import SamplingProfiler
+from analytics_retention import AnalyticsRetention
+from analytics_reports import AnalyticsReporter
+from progress_ingestion import ProgressIngestor
+from certificates import CertificateIssuer
+from recommendations import RecommendationEngine
+from bulk_operations import BulkOperations
+from snapshot_reads import SnapshotReader
+from sharding import ShardMap, ShardRouter, TenantLocal, UnknownTenantError, tenant_dir
+from rate_limiting import MemoryBucketStore, RateLimiter, SQLiteBucketStore, retry_after_header
+from response_encoding import json_response
+from change_stream import ChangeHub
+from delta_sync import CourseChangeLog, ResyncRequired
+from batch_requests import BatchExecutor, FORWARDED_HEADERS, shared_connection
+from catalog_engine import CourseCatalog, SORT_FIELDS, SORT_ORDERS
+from duplicate_detection import DuplicateDetector, ON_DUPLICATE
+from sql_tracing import SQLTracer
+from maintenance import DatabaseMaintenance, StepInterrupted
+import llm_client
 
 app = Flask(__name__)
 CORS(app)
 app.config['SECRET_KEY'] = 'iron-lady-advanced-course-manager'
+app.config['SLOW_QUERY_MS'] = float(os.getenv('SLOW_QUERY_MS', 100))
+app.config['QUERY_BUDGET'] = int(os.getenv('QUERY_BUDGET', 20))
+app.config['PROFILER_TOKEN'] = os.getenv('PROFILER_TOKEN', '')
+app.config['ANALYTICS_RETENTION_DAYS'] = int(os.getenv('ANALYTICS_RETENTION_DAYS', 90))
+app.config['ANALYTICS_ARCHIVE_DIR'] = os.getenv('ANALYTICS_ARCHIVE_DIR', 'analytics_archive')
+app.config['ANALYTICS_RETENTION_INTERVAL_SECONDS'] = float(os.getenv('ANALYTICS_RETENTION_INTERVAL_SECONDS', 3600))
+app.config['PROGRESS_FLUSH_INTERVAL'] = float(os.getenv('PROGRESS_FLUSH_INTERVAL', 1.0))
+app.config['CERTIFICATE_DIR'] = os.getenv('CERTIFICATE_DIR', 'certificates')
+app.config['CERTIFICATE_WORKERS'] = int(os.getenv('CERTIFICATE_WORKERS', 0)) or None
+app.config['RECOMMENDATION_REFRESH_SECONDS'] = float(os.getenv('RECOMMENDATION_REFRESH_SECONDS', 60))
+app.config['RECOMMENDATION_REBUILD_SECONDS'] = float(os.getenv('RECOMMENDATION_REBUILD_SECONDS', 3600))
+app.config['BULK_CHUNK_SIZE'] = int(os.getenv('BULK_CHUNK_SIZE', 2000))
+app.config['READ_SNAPSHOT_MODE'] = os.getenv('READ_SNAPSHOT_MODE', 'wal')
+app.config['READ_REPLICA_PATH'] = os.getenv('READ_REPLICA_PATH') or None
+app.config['READ_REPLICA_REFRESH_SECONDS'] = float(os.getenv('READ_REPLICA_REFRESH_SECONDS', 30))
+app.config['TENANT_SHARDING'] = os.getenv('TENANT_SHARDING', 'false').lower() == 'true'
+app.config['TENANT_HEADER'] = os.getenv('TENANT_HEADER', 'X-Tenant-ID')
+app.config['TENANT_AUTO_PROVISION'] = os.getenv('TENANT_AUTO_PROVISION', 'false').lower() == 'true'
+app.config['DEFAULT_TENANT'] = os.getenv('DEFAULT_TENANT', 'default')
+app.config['SHARD_MAP_PATH'] = os.getenv('SHARD_MAP_PATH', 'shard_map.json')
+app.config['SHARD_DIR'] = os.getenv('SHARD_DIR', 'shards')
+app.config['RATE_LIMITING'] = os.getenv('RATE_LIMITING', 'true').lower() == 'true'
+app.config['RATE_LIMIT_STORE'] = os.getenv('RATE_LIMIT_STORE', 'memory')
+app.config['RATE_LIMIT_TRUST_FORWARDED'] = os.getenv('RATE_LIMIT_TRUST_FORWARDED', 'false').lower() == 'true'
+app.config['MAINTENANCE_INTERVAL_SECONDS'] = float(os.getenv('MAINTENANCE_INTERVAL_SECONDS', 300))
+app.config['MAINTENANCE_OFF_PEAK_HOURS'] = os.getenv('MAINTENANCE_OFF_PEAK_HOURS', '2-5')
+app.config['MAINTENANCE_FREELIST_RATIO'] = float(os.getenv('MAINTENANCE_FREELIST_RATIO', 0.2))
+app.config['MAINTENANCE_WAL_MB'] = float(os.getenv('MAINTENANCE_WAL_MB', 64))
+app.config['MAINTENANCE_STEP_SECONDS'] = float(os.getenv('MAINTENANCE_STEP_SECONDS', 2))
+app.config['DUPLICATE_THRESHOLD'] = float(os.getenv('DUPLICATE_THRESHOLD', 0.8))
+app.config['DUPLICATE_CLUSTER_LIMIT'] = int(os.getenv('DUPLICATE_CLUSTER_LIMIT', 1000))
+app.config['CATALOG_ENGINE'] = os.getenv('CATALOG_ENGINE', 'false').lower() == 'true'
+app.config['CATALOG_SYNC_INTERVAL_SECONDS'] = float(os.getenv('CATALOG_SYNC_INTERVAL_SECONDS', 1.0))
+app.config['COURSE_TOMBSTONE_RETENTION_DAYS'] = int(os.getenv('COURSE_TOMBSTONE_RETENTION_DAYS', 30))
+app.config['CHANGE_STREAM_HISTORY'] = int(os.getenv('CHANGE_STREAM_HISTORY', 1000))
+app.config['CHANGE_STREAM_HEARTBEAT_SECONDS'] = float(os.getenv('CHANGE_STREAM_HEARTBEAT_SECONDS', 15))
+app.config['CHANGE_STREAM_MAX_SUBSCRIBERS'] = int(os.getenv('CHANGE_STREAM_MAX_SUBSCRIBERS', 10000))
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class AdvancedCourseDatabase:
-    def __init__(self, db_name='iron_lady_courses.db'):
+    def __init__(self, db_name='iron_lady_courses.db', seed_sample_data=True):
         self.db_name = db_name
+        self.seed_sample_data = seed_sample_data
         self.init_database()
     
+    def get_connection(self):
+        """Open an instrumented connection to the course database (a batch reuses its snapshot's)"""
+        shared = shared_connection(self.db_name)
+        if shared is not None:
+            return shared
+        return metrics.connect(self.db_name)
+    
     def init_database(self):
         """Initialize SQLite database with comprehensive schema"""
-        conn = sqlite3.connect(self.db_name)
+        conn = self.get_connection()
         cursor = conn.cursor()
         
+        # Only takes effect on a new, empty file; existing files switch on their first maintenance VACUUM
+        cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        
+        # Rebuild databases created with UUID primary keys
+        migrations.upgrade(conn)
+        
+        # Tables key on compact INTEGER rowids; the UUID `id` columns are the
+        # external identifiers used by the API
+        
         # Courses table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS courses (
-                id TEXT PRIMARY KEY,
+                pk INTEGER PRIMARY KEY,
+                id TEXT NOT NULL UNIQUE,
                 title TEXT NOT NULL,
                 description TEXT,
                 duration TEXT,
@@ -51,14 +130,16 @@ class AdvancedCourseDatabase:
                 prerequisites TEXT,
                 learning_outcomes TEXT,
                 course_image TEXT,
-                difficulty_level TEXT DEFAULT 'intermediate'
+                difficulty_level TEXT DEFAULT 'intermediate',
+                version INTEGER
             )
         ''')
         
         # Students table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS students (
-                id TEXT PRIMARY KEY,
+                pk INTEGER PRIMARY KEY,
+                id TEXT NOT NULL UNIQUE,
                 name TEXT NOT NULL,
                 email TEXT UNIQUE NOT NULL,
                 phone TEXT,
@@ -71,37 +152,39 @@ class AdvancedCourseDatabase:
         # Enrollments table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS enrollments (
-                id TEXT PRIMARY KEY,
-                student_id TEXT,
-                course_id TEXT,
+                pk INTEGER PRIMARY KEY,
+                id TEXT NOT NULL UNIQUE,
+                student_pk INTEGER,
+                course_pk INTEGER,
                 enrollment_date TEXT,
                 completion_date TEXT,
                 progress REAL DEFAULT 0,
                 grade TEXT,
                 certificate_issued BOOLEAN DEFAULT FALSE,
-                FOREIGN KEY (student_id) REFERENCES students (id),
-                FOREIGN KEY (course_id) REFERENCES courses (id)
+                FOREIGN KEY (student_pk) REFERENCES students (pk),
+                FOREIGN KEY (course_pk) REFERENCES courses (pk)
             )
         ''')
         
         # Course ratings table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS course_ratings (
-                id TEXT PRIMARY KEY,
-                course_id TEXT,
+                pk INTEGER PRIMARY KEY,
+                id TEXT NOT NULL UNIQUE,
+                course_pk INTEGER,
                 student_id TEXT,
                 rating INTEGER,
                 review TEXT,
                 created_at TEXT,
-                FOREIGN KEY (course_id) REFERENCES courses (id),
-                FOREIGN KEY (student_id) REFERENCES students (id)
+                FOREIGN KEY (course_pk) REFERENCES courses (pk)
             )
         ''')
         
         # Analytics table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS analytics (
-                id TEXT PRIMARY KEY,
+                pk INTEGER PRIMARY KEY,
+                id TEXT,
                 event_type TEXT,
                 course_id TEXT,
                 student_id TEXT,
@@ -109,16 +192,88 @@ class AdvancedCourseDatabase:
                 timestamp TEXT
             )
         ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_analytics_timestamp ON analytics (timestamp)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_enrollments_date ON enrollments (enrollment_date, course_pk)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_enrollments_course ON enrollments (course_pk)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_enrollments_student ON enrollments (student_pk)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_course_ratings_course ON course_ratings (course_pk)')
+        
+        # Hourly/daily analytics aggregates, kept after raw events are archived
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS analytics_rollups (
+                granularity TEXT NOT NULL,
+                bucket_start TEXT NOT NULL,
+                event_type TEXT NOT NULL,
+                course_id TEXT NOT NULL DEFAULT '',
+                event_count INTEGER DEFAULT 0,
+                PRIMARY KEY (granularity, bucket_start, event_type, course_id)
+            )
+        ''')
+        
+        # Change versions for delta sync: triggers stamp every course write
+        # with the next clock value and leave a tombstone for every delete
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS change_clock (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                version INTEGER NOT NULL,
+                pruned_version INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS course_tombstones (
+                course_id TEXT PRIMARY KEY,
+                version INTEGER NOT NULL,
+                deleted_at TEXT
+            )
+        ''')
+        cursor.execute('INSERT OR IGNORE INTO change_clock (id, version) SELECT 1, COALESCE(MAX(version), 0) FROM courses')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_courses_version ON courses (version)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_course_tombstones_version ON course_tombstones (version)')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS courses_version_insert AFTER INSERT ON courses
+            BEGIN
+                UPDATE change_clock SET version = version + 1 WHERE id = 1;
+                UPDATE courses SET version = (SELECT version FROM change_clock WHERE id = 1) WHERE pk = NEW.pk;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS courses_version_update AFTER UPDATE ON courses
+            WHEN NEW.version IS OLD.version
+            BEGIN
+                UPDATE change_clock SET version = version + 1 WHERE id = 1;
+                UPDATE courses SET version = (SELECT version FROM change_clock WHERE id = 1) WHERE pk = NEW.pk;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS courses_tombstone AFTER DELETE ON courses
+            BEGIN
+                UPDATE change_clock SET version = version + 1 WHERE id = 1;
+                INSERT OR REPLACE INTO course_tombstones (course_id, version, deleted_at)
+                VALUES (OLD.id, (SELECT version FROM change_clock WHERE id = 1),
+                        strftime('%Y-%m-%dT%H:%M:%f', 'now', 'localtime'));
+            END
+        ''')
         
+        # Key/value bookkeeping for background jobs (watermarks, last runs)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS job_state (
+                key TEXT PRIMARY KEY,
+                value TEXT,
+                updated_at TEXT
+            )
+        ''')
+        
+        cursor.execute(f'PRAGMA user_version = {migrations.SCHEMA_VERSION}')
         conn.commit()
         conn.close()
         
         # Insert sample data if database is empty
-        self.populate_sample_data()
+        if self.seed_sample_data:
+            self.populate_sample_data()
     
     def populate_sample_data(self):
         """Populate database with sample courses if empty"""
-        conn = sqlite3.connect(self.db_name)
+        conn = self.get_connection()
         cursor = conn.cursor()
         
         cursor.execute('SELECT COUNT(*) FROM courses')
@@ -200,18 +355,205 @@ class AdvancedCourseDatabase:
         conn.commit()
         conn.close()
 
-# Initialize database
-db = AdvancedCourseDatabase()
+# Initialize database: one SQLite shard per tenant, the default tenant
+# keeping the original file
+def open_shard(tenant: str, path: str) -> AdvancedCourseDatabase:
+    return AdvancedCourseDatabase(path, seed_sample_data=(tenant == app.config['DEFAULT_TENANT']))
+
+db = ShardRouter(
+    open_shard,
+    ShardMap(app.config['SHARD_MAP_PATH'], app.config['SHARD_DIR'],
+             app.config['DEFAULT_TENANT'], 'iron_lady_courses.db'),
+    auto_provision=app.config['TENANT_AUTO_PROVISION']
+)
+# Certificate render processes (forkserver/spawn) re-import the main module,
+# and with it this one; they must not open shards or start workers
+APP_PROCESS = multiprocessing.current_process().name == 'MainProcess'
+
+# Open (and migrate) every mapped shard up front rather than on first request
+if APP_PROCESS:
+    for tenant in (db.shard_map.tenants() if app.config['TENANT_SHARDING'] else [db.default_tenant]):
+        db.shard(tenant)
+
+def tenant_path(base: str, tenant: str) -> str:
+    return tenant_dir(base, tenant, db.default_tenant)
+
+# Reporting and export reads go through snapshots so they never stall writes
+def create_snapshot_reader(tenant, shard):
+    reader = SnapshotReader(
+        shard,
+        mode=app.config['READ_SNAPSHOT_MODE'],
+        replica_path=app.config['READ_REPLICA_PATH'] if tenant == db.default_tenant else None,
+        refresh_interval=app.config['READ_REPLICA_REFRESH_SECONDS']
+    )
+    reader.start()
+    return reader
+
+snapshot_reader = TenantLocal(db, create_snapshot_reader)
+
+analytics_retention = TenantLocal(db, lambda tenant, shard: AnalyticsRetention(
+    shard,
+    archive_dir=tenant_path(app.config['ANALYTICS_ARCHIVE_DIR'], tenant),
+    retention_days=app.config['ANALYTICS_RETENTION_DAYS']
+))
+analytics_reporter = AnalyticsReporter(db)
+
+def create_progress_ingestor(tenant, shard):
+    ingestor = ProgressIngestor(shard, flush_interval=app.config['PROGRESS_FLUSH_INTERVAL'])
+    ingestor.completion_listeners.append(
+        lambda item: log_tenant_analytics(tenant, 'course_completed', item['course_id'],
+                                          {'student_id': item['student_id']})
+    )
+    ingestor.start()
+    return ingestor
+
+progress_ingestor = TenantLocal(db, create_progress_ingestor)
+
+certificate_issuer = TenantLocal(db, lambda tenant, shard: CertificateIssuer(
+    shard,
+    output_dir=tenant_path(app.config['CERTIFICATE_DIR'], tenant),
+    workers=app.config['CERTIFICATE_WORKERS']
+))
+
+def create_recommender(tenant, shard):
+    engine = RecommendationEngine(
+        shard,
+        refresh_interval=app.config['RECOMMENDATION_REFRESH_SECONDS'],
+        rebuild_interval=app.config['RECOMMENDATION_REBUILD_SECONDS']
+    )
+    engine.start()
+    return engine
+
+recommender = TenantLocal(db, create_recommender)
+
+def run_retention_job(tenant: str, deadline: float) -> str:
+    result = analytics_retention.for_tenant(tenant).run(deadline=deadline)
+    detail = (f"rolled up {result['rollup']['events']} events, archived {result['archive']['events']} "
+              f"in {len(result['archive']['segments'])} segments")
+    # Out of time with events left: keep the task due for the next tick
+    if not (result['rollup']['complete'] and result['archive']['complete']):
+        raise StepInterrupted(f'{detail}; more left for the next run')
+    return detail
+
+def create_maintenance(tenant, shard):
+    maintenance = DatabaseMaintenance(
+        shard,
+        interval=app.config['MAINTENANCE_INTERVAL_SECONDS'],
+        off_peak_hours=app.config['MAINTENANCE_OFF_PEAK_HOURS'],
+        freelist_ratio=app.config['MAINTENANCE_FREELIST_RATIO'],
+        wal_bytes=int(app.config['MAINTENANCE_WAL_MB'] * 1024 * 1024),
+        step_seconds=app.config['MAINTENANCE_STEP_SECONDS']
+    )
+    # Rollups and archiving run with the rest of the maintenance, one worker at a time
+    if app.config['ANALYTICS_RETENTION_INTERVAL_SECONDS'] > 0:
+        maintenance.schedule('analytics_retention', lambda deadline: run_retention_job(tenant, deadline),
+                             app.config['ANALYTICS_RETENTION_INTERVAL_SECONDS'])
+    maintenance.start()
+    return maintenance
+
+db_maintenance = TenantLocal(db, create_maintenance)
+
+# Columns the API exposes for a course (the integer pk stays internal)
+COURSE_FIELDS = ['id', 'title', 'description', 'duration', 'instructor', 'category', 'price', 'capacity',
+                 'enrolled', 'status', 'rating', 'total_ratings', 'created_at', 'updated_at', 'prerequisites',
+                 'learning_outcomes', 'course_image', 'difficulty_level', 'version']
+
+def parse_course_fields(fields: str) -> List[str]:
+    """Columns for a ?fields= projection; id is always included"""
+    if not fields:
+        return COURSE_FIELDS
+    requested = [field.strip() for field in fields.split(',') if field.strip()]
+    invalid = [field for field in requested if field not in COURSE_FIELDS]
+    if invalid:
+        raise ValueError(f'Invalid fields {invalid}. Must be from: {COURSE_FIELDS}')
+    return ['id'] + [field for field in dict.fromkeys(requested) if field != 'id']
+
+COURSE_UPDATABLE_FIELDS = ['title', 'description', 'duration', 'instructor', 'category',
+                           'price', 'capacity', 'status', 'prerequisites', 'learning_outcomes',
+                           'difficulty_level']
+
+# Write routes publish course changes to subscribers of the tenant's stream
+change_hub = TenantLocal(db, lambda tenant, shard: ChangeHub(
+    history=app.config['CHANGE_STREAM_HISTORY'],
+    heartbeat=app.config['CHANGE_STREAM_HEARTBEAT_SECONDS'],
+    max_subscribers=app.config['CHANGE_STREAM_MAX_SUBSCRIBERS']
+))
+
+course_change_log = TenantLocal(db, lambda tenant, shard: CourseChangeLog(
+    shard, tombstone_retention_days=app.config['COURSE_TOMBSTONE_RETENTION_DAYS']
+))
+
+# MinHash/LSH index used to flag or skip near-duplicate courses on create and import
+duplicate_detector = TenantLocal(db, lambda tenant, shard: DuplicateDetector(
+    shard, threshold=app.config['DUPLICATE_THRESHOLD']
+))
+
+# Optional in-memory columnar copy of the catalog for course list queries
+course_catalog = TenantLocal(db, lambda tenant, shard: CourseCatalog(
+    shard, sync_interval=app.config['CATALOG_SYNC_INTERVAL_SECONDS']
+)) if app.config['CATALOG_ENGINE'] else None
+
+def publish_course_change(event_type: str, data: Dict, tenant: Optional[str] = None):
+    """After a committed course write: update the catalog engine, then notify stream subscribers"""
+    tenant = tenant or db.current_tenant()
+    if course_catalog is not None:
+        try:
+            course_catalog.for_tenant(tenant).sync()
+        except Exception as e:
+            logger.error(f"Error updating catalog engine: {e}")
+    change_hub.for_tenant(tenant).publish(event_type, data)
+
+def create_bulk_operations(tenant, shard):
+    operations = BulkOperations(shard, updatable_fields=COURSE_UPDATABLE_FIELDS,
+                                chunk_size=app.config['BULK_CHUNK_SIZE'])
+    operations.completion_listeners.append(
+        lambda job: log_tenant_analytics(tenant, f"bulk_{job['action']}", None, {
+            'job_id': job['job_id'], 'status': job['status'], 'courses': job['updated']
+        })
+    )
+    operations.completion_listeners.append(lambda job: publish_bulk_changes(tenant, job))
+    return operations
+
+def publish_bulk_changes(tenant: str, job: Dict):
+    """Bulk jobs touch too many rows to stream one by one; clients reload instead"""
+    if job['updated']:
+        publish_course_change('courses_changed', {
+            'source': f"bulk_{job['action']}", 'count': job['updated']
+        }, tenant=tenant)
+
+bulk_operations = TenantLocal(db, create_bulk_operations)
+
+# Per-tenant background workers: snapshots, heartbeat flushing, recommendation
+# rebuilds and maintenance (which also runs analytics retention)
+TENANT_WORKERS = (snapshot_reader, progress_ingestor, recommender, db_maintenance)
+started_tenants = set()
+started_tenants_lock = threading.Lock()
+
+def start_tenant_workers(tenant: str):
+    """Start one tenant's background workers and load its catalog copy; a no-op once done"""
+    if tenant in started_tenants:
+        return
+    with started_tenants_lock:
+        if tenant in started_tenants:
+            return
+        for subsystem in TENANT_WORKERS:
+            subsystem.for_tenant(tenant)
+        if course_catalog is not None:
+            course_catalog.for_tenant(tenant).sync()
+        started_tenants.add(tenant)
+
+# Every mapped tenant's workers start with the app
+if APP_PROCESS:
+    for tenant in (db.shard_map.tenants() if app.config['TENANT_SHARDING'] else [db.default_tenant]):
+        start_tenant_workers(tenant)
 
 class AIAssistant:
-    def __init__(self):
-        self.api_key = os.getenv('OPENAI_API_KEY')
-        if self.api_key:
-            openai.api_key = self.api_key
+    def __init__(self, llm: llm_client.LLMClient):
+        self.llm = llm
     
     def generate_course_description(self, title: str, category: str) -> Dict:
         """Generate AI-powered course description and metadata"""
-        if not self.api_key:
+        if not self.llm.enabled:
             return self._fallback_suggestions(title, category)
         
         try:
@@ -229,15 +571,15 @@ class AIAssistant:
             - suggested_price: price range
             """
             
-            response = openai.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[{"role": "user", "content": prompt}],
+            # Fails fast while the circuit breaker is open
+            response_text = self.llm.chat(
+                'ai_assistant',
+                [{"role": "user", "content": prompt}],
                 max_tokens=500,
                 temperature=0.7
             )
             
             import re
-            response_text = response.choices[0].message.content
             # Extract JSON from response
             json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
             if json_match:
@@ -270,63 +612,330 @@ class AIAssistant:
         
         return suggestions.get(category, suggestions['Leadership'])
 
-ai_assistant = AIAssistant()
+llm = llm_client.from_env()
+ai_assistant = AIAssistant(llm)
+
+sql_tracer = SQLTracer(slow_query_ms=app.config['SLOW_QUERY_MS'], query_budget=app.config['QUERY_BUDGET'])
+sql_tracer.install()
+
+profiler = SamplingProfiler()
+
+batch_executor = BatchExecutor(app, forwarded_headers=FORWARDED_HEADERS + (app.config['TENANT_HEADER'],))
+
+# Token buckets live in this process, or in a SQLite file shared by all workers
+rate_limiter = RateLimiter(
+    MemoryBucketStore() if app.config['RATE_LIMIT_STORE'] == 'memory'
+    else SQLiteBucketStore(app.config['RATE_LIMIT_STORE'])
+)
+
+# Request instrumentation; registered first so requests rejected by the
+# rate limiter or tenant routing below are still timed and counted
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    start = g.pop('request_start', None)
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.http_request_duration_seconds.observe(time.perf_counter() - start, route, request.method)
+        metrics.http_requests_total.inc(route, request.method, str(response.status_code))
+        if response.status_code >= 500:
+            metrics.http_request_errors_total.inc(route, request.method)
+    return response
+
+# Rate limiting
+
+def rate_limit_client() -> str:
+    """Client identity for rate limiting: the peer address, or the first proxy hop if trusted"""
+    if app.config['RATE_LIMIT_TRUST_FORWARDED']:
+        forwarded = request.headers.get('X-Forwarded-For', '')
+        if forwarded:
+            return forwarded.split(',')[0].strip()
+    return request.remote_addr or 'unknown'
+
+@app.before_request
+def enforce_rate_limits():
+    if not app.config['RATE_LIMITING'] or request.method == 'OPTIONS':
+        return None
+    route_class = rate_limiter.classify(request.url_rule.rule if request.url_rule else None)
+    if route_class is None:
+        return None
+    
+    allowed, remaining, retry_after = rate_limiter.check_rate(rate_limit_client(), route_class)
+    if not allowed:
+        response = jsonify({'error': 'Rate limit exceeded', 'route_class': route_class})
+        response.status_code = 429
+        response.headers['Retry-After'] = retry_after_header(retry_after)
+        return response
+    
+    reason, retry_after = rate_limiter.admit(route_class)
+    if reason is not None:
+        response = jsonify({'error': 'Server is busy, please retry', 'route_class': route_class})
+        response.status_code = 503
+        response.headers['Retry-After'] = retry_after_header(retry_after)
+        return response
+    g.rate_limit = (route_class, time.perf_counter(), remaining)
+
+@app.after_request
+def add_rate_limit_headers(response):
+    if 'rate_limit' in g:
+        route_class, _, remaining = g.rate_limit
+        response.headers['X-RateLimit-Limit'] = str(rate_limiter.route_classes[route_class].burst)
+        response.headers['X-RateLimit-Remaining'] = str(int(remaining))
+    return response
+
+@app.teardown_request
+def release_rate_limit(error=None):
+    state = g.pop('rate_limit', None)
+    if state is not None:
+        route_class, start, _ = state
+        rate_limiter.release(route_class, time.perf_counter() - start)
+
+# Tenant routing
+
+@app.before_request
+def resolve_tenant():
+    if not app.config['TENANT_SHARDING']:
+        return None
+    try:
+        tenant = db.resolve(request.headers.get(app.config['TENANT_HEADER']) or request.args.get('tenant'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except UnknownTenantError:
+        return jsonify({'error': 'Unknown tenant'}), 404
+    # Tenants auto-provisioned here or by another worker start their workers on first use
+    start_tenant_workers(tenant)
+    g.tenant_token = db.activate(tenant)
+
+@app.teardown_request
+def reset_tenant(error=None):
+    token = g.pop('tenant_token', None)
+    if token is not None:
+        db.deactivate(token)
+
+@app.before_request
+def start_sql_trace():
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    g.sql_trace_token = sql_tracer.start_request(route)
+
+@app.after_request
+def finish_sql_trace(response):
+    token = g.pop('sql_trace_token', None)
+    if token is not None:
+        trace = sql_tracer.finish_request(token)
+        if trace is not None:
+            response.headers['X-Query-Count'] = str(trace.query_count)
+            response.headers['X-Query-Time-Ms'] = f'{trace.total_time * 1000:.3f}'
+    return response
+
+@app.before_request
+def start_profiling():
+    if profiler.armed and request.url_rule is not None and request.url_rule.rule != '/api/debug/profile':
+        g.profiling = profiler.begin_request(request.url_rule.rule)
+
+@app.teardown_request
+def stop_profiling(error=None):
+    if g.pop('profiling', False):
+        profiler.end_request()
 
 # API Routes
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    return jsonify({'status': 'healthy', 'timestamp': datetime.now().isoformat()})
+    return jsonify({
+        'status': 'healthy',
+        'timestamp': datetime.now().isoformat(),
+        'tenant': db.current_tenant(),
+        'read_snapshot': snapshot_reader.status(),
+        'change_stream': change_hub.status(),
+        'catalog_engine': course_catalog.status() if course_catalog is not None else None,
+        'llm': llm.status()
+    })
+
+@app.route('/api/changes/stream', methods=['GET'])
+def stream_changes():
+    """Server-sent events for course changes in the current tenant"""
+    try:
+        subscription = change_hub.subscribe(
+            request.headers.get('Last-Event-ID') or request.args.get('last_event_id'))
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 503
+    
+    # The subscription is the body; it ends when the client disconnects
+    response = Response(subscription, mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus text-format metrics"""
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/api/debug/rate-limits', methods=['GET'])
+def get_rate_limits():
+    """Rate limit classes with current in-flight, queued and latency figures"""
+    return jsonify({'enabled': app.config['RATE_LIMITING'], **rate_limiter.status()})
+
+@app.route('/api/debug/slow-queries', methods=['GET'])
+def get_slow_queries():
+    """Recent slow statements with query plans and requests over the query budget"""
+    return jsonify(sql_tracer.report())
+
+def profiler_authorized() -> bool:
+    """Profiling is only reachable when PROFILER_TOKEN is set and presented"""
+    token = app.config['PROFILER_TOKEN']
+    supplied = request.headers.get('X-Profiler-Token', '')
+    return bool(token) and hmac.compare_digest(token, supplied)
+
+@app.route('/api/debug/profile', methods=['POST'])
+def start_profile():
+    """Profile the next N requests and/or a time window"""
+    if not profiler_authorized():
+        return jsonify({'error': 'Profiler access denied'}), 403
+    try:
+        data = request.get_json(silent=True) or {}
+        max_requests = data.get('requests')
+        seconds = data.get('seconds')
+        interval_ms = float(data.get('interval_ms', 5))
+        
+        if not max_requests and not seconds:
+            return jsonify({'error': 'Provide requests and/or seconds'}), 400
+        if interval_ms < 1:
+            return jsonify({'error': 'interval_ms must be at least 1'}), 400
+        
+        profiler.arm(
+            max_requests=int(max_requests) if max_requests else None,
+            seconds=float(seconds) if seconds else None,
+            interval=interval_ms / 1000
+        )
+        return jsonify({'message': 'Profiler armed', **profiler.status()}), 202
+        
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 409
+    except Exception as e:
+        logger.error(f"Error starting profiler: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/debug/profile', methods=['GET'])
+def get_profile():
+    """Profiler status, or collapsed stacks with ?format=collapsed"""
+    if not profiler_authorized():
+        return jsonify({'error': 'Profiler access denied'}), 403
+    if request.args.get('format') == 'collapsed':
+        return Response(profiler.collapsed(request.args.get('route')), mimetype='text/plain')
+    return jsonify(profiler.status())
+
+@app.route('/api/debug/profile', methods=['DELETE'])
+def stop_profile():
+    """Stop the running profiling session"""
+    if not profiler_authorized():
+        return jsonify({'error': 'Profiler access denied'}), 403
+    profiler.disarm()
+    return jsonify({'message': 'Profiler stopped', **profiler.status()})
+
+@app.route('/api/batch', methods=['POST'])
+def run_batch():
+    """Run several GET requests on one snapshot; ?stream=true returns NDJSON parts as they finish"""
+    try:
+        data = request.get_json(silent=True) or {}
+        sub_requests = batch_executor.validate(data.get('requests'))
+        stream = bool(data.get('stream')) or request.args.get('stream') == 'true'
+        
+        # Captured here: a streamed body runs after this request context is gone
+        results = batch_executor.run(snapshot_reader.for_tenant(), db.shard().db_name, sub_requests,
+                                     dict(request.headers), rate_limit_client())
+        
+        if stream:
+            return Response((json.dumps(part, default=str) + '\n' for part in results),
+                            mimetype='application/x-ndjson')
+        
+        meta = next(results)
+        return json_response({**meta, 'responses': list(results)},
+                             accept_encoding=request.headers.get('Accept-Encoding', ''), route='/api/batch')
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error running batch: {e}")
+        return jsonify({'error': str(e)}), 500
+
+def query_courses(search: str, category: str, status: str, sort_by: str, sort_order: str,
+                  limit: int, offset: int, columns: List[str]):
+    """One page of courses and the total matching, from SQLite"""
+    # Build query
+    where = '1=1'
+    params = []
+    
+    if search:
+        where += ' AND (title LIKE ? OR description LIKE ? OR instructor LIKE ?)'
+        search_param = f'%{search}%'
+        params.extend([search_param, search_param, search_param])
+    
+    if category:
+        where += ' AND category = ?'
+        params.append(category)
+    
+    if status:
+        where += ' AND status = ?'
+        params.append(status)
+    
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    
+    query = f'SELECT {", ".join(columns)} FROM courses WHERE {where} ORDER BY {sort_by} {sort_order} LIMIT ? OFFSET ?'
+    cursor.execute(query, params + [limit, offset])
+    courses = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    
+    # Get total count
+    cursor.execute(f'SELECT COUNT(*) FROM courses WHERE {where}', params)
+    total_count = cursor.fetchone()[0]
+    
+    conn.close()
+    return courses, total_count
 
 @app.route('/api/courses', methods=['GET'])
 def get_courses():
     """Get all courses with filtering and sorting"""
     try:
-        conn = sqlite3.connect(db.db_name)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
         # Get query parameters
         search = request.args.get('search', '')
         category = request.args.get('category', '')
         status = request.args.get('status', '')
         sort_by = request.args.get('sort_by', 'created_at')
-        sort_order = request.args.get('sort_order', 'DESC')
+        sort_order = request.args.get('sort_order', 'DESC').upper()
         limit = request.args.get('limit', 100, type=int)
         offset = request.args.get('offset', 0, type=int)
         
-        # Build query
-        query = 'SELECT * FROM courses WHERE 1=1'
-        params = []
-        
-        if search:
-            query += ' AND (title LIKE ? OR description LIKE ? OR instructor LIKE ?)'
-            search_param = f'%{search}%'
-            params.extend([search_param, search_param, search_param])
-        
-        if category:
-            query += ' AND category = ?'
-            params.append(category)
-        
-        if status:
-            query += ' AND status = ?'
-            params.append(status)
-        
-        query += f' ORDER BY {sort_by} {sort_order} LIMIT ? OFFSET ?'
-        params.extend([limit, offset])
-        
-        cursor.execute(query, params)
-        courses = [dict(row) for row in cursor.fetchall()]
-        
-        # Get total count
-        count_query = query.split('ORDER BY')[0].replace('SELECT *', 'SELECT COUNT(*)')
-        cursor.execute(count_query, params[:-2])  # Exclude limit/offset from count
-        total_count = cursor.fetchone()[0]
+        # Only whitelisted columns and directions reach ORDER BY
+        if sort_by not in SORT_FIELDS:
+            return jsonify({'error': f'Invalid sort_by. Must be one of: {list(SORT_FIELDS)}'}), 400
+        if sort_order not in SORT_ORDERS:
+            return jsonify({'error': f'Invalid sort_order. Must be one of: {list(SORT_ORDERS)}'}), 400
+        # SQLite reads LIMIT -1 as "no limit"; neither path allows an unbounded page
+        if limit < 0 or offset < 0:
+            return jsonify({'error': 'limit and offset must not be negative'}), 400
         
-        conn.close()
-        
-        return jsonify({
+        # ?fields= projects the columns; id is always included
+        try:
+            columns = parse_course_fields(request.args.get('fields', ''))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # The catalog engine answers from memory, except inside a batch, whose
+        # results must all come from the batch's snapshot
+        if course_catalog is not None and shared_connection(db.db_name) is None:
+            courses, total_count = course_catalog.query(search, category, status, sort_by, sort_order,
+                                                        limit, offset, columns)
+        else:
+            courses, total_count = query_courses(search, category, status, sort_by, sort_order,
+                                                 limit, offset, columns)
+        
+        return json_response({
             'courses': courses,
             'total_count': total_count,
             'page_info': {
@@ -334,12 +943,32 @@ def get_courses():
                 'offset': offset,
                 'has_more': offset + len(courses) < total_count
             }
-        })
+        }, accept_encoding=request.headers.get('Accept-Encoding', ''), route='/api/courses')
         
     except Exception as e:
         logger.error(f"Error getting courses: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/courses/changes', methods=['GET'])
+def get_course_changes():
+    """Courses created, updated or deleted since a change version"""
+    try:
+        since = request.args.get('since', 0, type=int)
+        limit = request.args.get('limit', 500, type=int)
+        columns = parse_course_fields(request.args.get('fields', ''))
+        
+        return json_response(course_change_log.changes_since(since, limit, columns),
+                             accept_encoding=request.headers.get('Accept-Encoding', ''),
+                             route='/api/courses/changes')
+        
+    except ResyncRequired as e:
+        return jsonify({'error': str(e)}), 410
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error getting course changes: {e}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/courses', methods=['POST'])
 def create_course():
     """Create a new course"""
@@ -352,7 +981,19 @@ def create_course():
             if not data.get(field):
                 return jsonify({'error': f'Missing required field: {field}'}), 400
         
-        conn = sqlite3.connect(db.db_name)
+        # Near-duplicates are reported by default, rejected with on_duplicate=skip
+        on_duplicate = data.get('on_duplicate', 'flag')
+        if on_duplicate not in ON_DUPLICATE:
+            return jsonify({'error': f'Invalid on_duplicate. Must be one of: {list(ON_DUPLICATE)}'}), 400
+        duplicates = []
+        if on_duplicate != 'allow':
+            duplicate_detector.sync()
+            signature, text_hash, duplicates = duplicate_detector.check(
+                data['title'], data['description'], data['instructor'])
+            if duplicates and on_duplicate == 'skip':
+                return jsonify({'error': 'A near-duplicate course already exists', 'duplicates': duplicates}), 409
+        
+        conn = db.get_connection()
         cursor = conn.cursor()
         
         course_id = str(uuid.uuid4())
@@ -373,12 +1014,21 @@ def create_course():
         ))
         
         conn.commit()
+        cursor.execute(f'SELECT {", ".join(COURSE_FIELDS)} FROM courses WHERE id = ?', (course_id,))
+        course = dict(zip(COURSE_FIELDS, cursor.fetchone()))
         conn.close()
         
         # Log analytics
         log_analytics('course_created', course_id, data)
+        publish_course_change('course_created', course)
+        if on_duplicate != 'allow':
+            duplicate_detector.add(course_id, data['title'], signature, text_hash)
         
-        return jsonify({'message': 'Course created successfully', 'course_id': course_id}), 201
+        return jsonify({
+            'message': 'Course created successfully',
+            'course_id': course_id,
+            'duplicates': duplicates
+        }), 201
         
     except Exception as e:
         logger.error(f"Error creating course: {e}")
@@ -390,18 +1040,14 @@ def update_course(course_id):
     try:
         data = request.get_json()
         
-        conn = sqlite3.connect(db.db_name)
+        conn = db.get_connection()
         cursor = conn.cursor()
         
         # Build update query dynamically
         set_clauses = []
         params = []
         
-        updatable_fields = ['title', 'description', 'duration', 'instructor', 'category',
-                          'price', 'capacity', 'status', 'prerequisites', 'learning_outcomes',
-                          'difficulty_level']
-        
-        for field in updatable_fields:
+        for field in COURSE_UPDATABLE_FIELDS:
             if field in data:
                 set_clauses.append(f'{field} = ?')
                 params.append(data[field])
@@ -409,8 +1055,10 @@ def update_course(course_id):
         if not set_clauses:
             return jsonify({'error': 'No fields to update'}), 400
         
+        changes = {field: data[field] for field in COURSE_UPDATABLE_FIELDS if field in data}
+        changes['updated_at'] = datetime.now().isoformat()
         set_clauses.append('updated_at = ?')
-        params.append(datetime.now().isoformat())
+        params.append(changes['updated_at'])
         params.append(course_id)
         
         query = f'UPDATE courses SET {", ".join(set_clauses)} WHERE id = ?'
@@ -425,6 +1073,7 @@ def update_course(course_id):
         
         # Log analytics
         log_analytics('course_updated', course_id, data)
+        publish_course_change('course_updated', {'id': course_id, **changes})
         
         return jsonify({'message': 'Course updated successfully'})
         
@@ -436,24 +1085,29 @@ def update_course(course_id):
 def delete_course(course_id):
     """Delete a course"""
     try:
-        conn = sqlite3.connect(db.db_name)
+        conn = db.get_connection()
         cursor = conn.cursor()
         
-        cursor.execute('DELETE FROM courses WHERE id = ?', (course_id,))
+        cursor.execute('SELECT pk FROM courses WHERE id = ?', (course_id,))
+        course_row = cursor.fetchone()
         
-        if cursor.rowcount == 0:
+        if not course_row:
             conn.close()
             return jsonify({'error': 'Course not found'}), 404
         
+        course_pk = course_row[0]
+        cursor.execute('DELETE FROM courses WHERE pk = ?', (course_pk,))
+        
         # Also delete related enrollments and ratings
-        cursor.execute('DELETE FROM enrollments WHERE course_id = ?', (course_id,))
-        cursor.execute('DELETE FROM course_ratings WHERE course_id = ?', (course_id,))
+        cursor.execute('DELETE FROM enrollments WHERE course_pk = ?', (course_pk,))
+        cursor.execute('DELETE FROM course_ratings WHERE course_pk = ?', (course_pk,))
         
         conn.commit()
         conn.close()
         
         # Log analytics
         log_analytics('course_deleted', course_id, {})
+        publish_course_change('course_deleted', {'id': course_id})
         
         return jsonify({'message': 'Course deleted successfully'})
         
@@ -469,42 +1123,51 @@ def enroll_student(course_id):
         student_name = data.get('student_name', 'Anonymous Student')
         student_email = data.get('student_email', f'student_{uuid.uuid4().hex[:8]}@example.com')
         
-        conn = sqlite3.connect(db.db_name)
+        conn = db.get_connection()
         cursor = conn.cursor()
         
         # Check course capacity
-        cursor.execute('SELECT enrolled, capacity FROM courses WHERE id = ?', (course_id,))
+        cursor.execute('SELECT pk, enrolled, capacity FROM courses WHERE id = ?', (course_id,))
         course_info = cursor.fetchone()
         
         if not course_info:
             conn.close()
             return jsonify({'error': 'Course not found'}), 404
         
-        enrolled, capacity = course_info
+        course_pk, enrolled, capacity = course_info
         if enrolled >= capacity:
             conn.close()
             return jsonify({'error': 'Course is at full capacity'}), 400
         
         # Create or get student
-        student_id = str(uuid.uuid4())
-        cursor.execute('INSERT OR IGNORE INTO students (id, name, email, created_at) VALUES (?, ?, ?, ?)',
-                      (student_id, student_name, student_email, datetime.now().isoformat()))
+        cursor.execute('SELECT pk, id FROM students WHERE email = ?', (student_email,))
+        existing_student = cursor.fetchone()
+        if existing_student:
+            student_pk, student_id = existing_student
+        else:
+            student_id = str(uuid.uuid4())
+            cursor.execute('INSERT INTO students (id, name, email, created_at) VALUES (?, ?, ?, ?)',
+                          (student_id, student_name, student_email, datetime.now().isoformat()))
+            student_pk = cursor.lastrowid
         
         # Create enrollment
         enrollment_id = str(uuid.uuid4())
         cursor.execute('''
-            INSERT INTO enrollments (id, student_id, course_id, enrollment_date)
+            INSERT INTO enrollments (id, student_pk, course_pk, enrollment_date)
             VALUES (?, ?, ?, ?)
-        ''', (enrollment_id, student_id, course_id, datetime.now().isoformat()))
+        ''', (enrollment_id, student_pk, course_pk, datetime.now().isoformat()))
         
         # Update course enrollment count
-        cursor.execute('UPDATE courses SET enrolled = enrolled + 1 WHERE id = ?', (course_id,))
+        cursor.execute('UPDATE courses SET enrolled = enrolled + 1 WHERE pk = ?', (course_pk,))
+        cursor.execute('SELECT enrolled FROM courses WHERE pk = ?', (course_pk,))
+        enrolled = cursor.fetchone()[0]
         
         conn.commit()
         conn.close()
         
         # Log analytics
         log_analytics('student_enrolled', course_id, {'student_id': student_id})
+        publish_course_change('course_updated', {'id': course_id, 'enrolled': enrolled})
         
         return jsonify({
             'message': 'Student enrolled successfully',
@@ -516,6 +1179,217 @@ def enroll_student(course_id):
         logger.error(f"Error enrolling student: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/enrollments/<enrollment_id>/progress', methods=['POST'])
+def report_progress(enrollment_id):
+    """Accept a learner progress heartbeat (written in the next batched flush)"""
+    try:
+        data = request.get_json(silent=True) or {}
+        progress = data.get('progress')
+        grade = data.get('grade')
+        
+        if not isinstance(progress, (int, float)) or isinstance(progress, bool) or not 0 <= progress <= 100:
+            return jsonify({'error': 'Progress must be a number between 0 and 100'}), 400
+        if grade is not None and not isinstance(grade, str):
+            return jsonify({'error': 'Grade must be a string'}), 400
+        
+        conn = db.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT 1 FROM enrollments WHERE id = ?', (enrollment_id,))
+            exists = cursor.fetchone() is not None
+        finally:
+            conn.close()
+        if not exists:
+            return jsonify({'error': 'Enrollment not found'}), 404
+        
+        progress_ingestor.submit(enrollment_id, float(progress), grade)
+        
+        return jsonify({'message': 'Progress accepted', 'enrollment_id': enrollment_id}), 202
+        
+    except Exception as e:
+        logger.error(f"Error accepting progress: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/progress/status', methods=['GET'])
+def get_progress_status():
+    """Pending heartbeats and the result of the last flush"""
+    return jsonify(progress_ingestor.status())
+
+@app.route('/api/certificates/issue', methods=['POST'])
+def issue_certificates():
+    """Start a background job issuing certificates for completed enrollments"""
+    try:
+        data = request.get_json(silent=True) or {}
+        limit = data.get('limit')
+        if limit is not None and (not isinstance(limit, int) or limit < 1):
+            return jsonify({'error': 'Limit must be a positive integer'}), 400
+        
+        job = certificate_issuer.start(limit=limit)
+        return jsonify({'message': 'Certificate job started', 'job': job}), 202
+        
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 409
+    except Exception as e:
+        logger.error(f"Error starting certificate job: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/certificates/status', methods=['GET'])
+def get_certificate_status():
+    """Pending certificates and the current/last job"""
+    try:
+        return jsonify(certificate_issuer.status())
+    except Exception as e:
+        logger.error(f"Error getting certificate status: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/certificates/<enrollment_id>', methods=['GET'])
+def download_certificate(enrollment_id):
+    """Download an issued certificate"""
+    path = certificate_issuer.certificate_path(enrollment_id)
+    if not os.path.exists(path):
+        return jsonify({'error': 'Certificate not found'}), 404
+    return send_file(os.path.abspath(path), mimetype='application/pdf',
+                     download_name=f'iron_lady_certificate_{enrollment_id}.pdf')
+
+@app.route('/api/courses/<course_id>/recommendations', methods=['GET'])
+def get_course_recommendations(course_id):
+    """Courses that learners of this course also enrolled in"""
+    limit = request.args.get('limit', 5, type=int)
+    return jsonify({
+        'course_id': course_id,
+        'recommendations': recommender.for_course(course_id, limit),
+        'built_at': recommender.tables.built_at
+    })
+
+@app.route('/api/students/<student_id>/recommendations', methods=['GET'])
+def get_student_recommendations(student_id):
+    """Personalised course recommendations for a learner"""
+    limit = request.args.get('limit', 5, type=int)
+    return jsonify({
+        'student_id': student_id,
+        'recommendations': recommender.for_student(student_id, limit),
+        'built_at': recommender.tables.built_at
+    })
+
+@app.route('/api/admin/recommendations/rebuild', methods=['POST'])
+def rebuild_recommendations():
+    """Rebuild the recommendation tables now"""
+    try:
+        return jsonify({'message': 'Recommendations rebuilt', **recommender.rebuild()})
+    except Exception as e:
+        logger.error(f"Error rebuilding recommendations: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/admin/maintenance', methods=['GET'])
+def get_maintenance_status():
+    """Database size, free pages, WAL size, due tasks and recent maintenance steps"""
+    try:
+        return jsonify(db_maintenance.status())
+    except Exception as e:
+        logger.error(f"Error reading maintenance status: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/admin/maintenance/run', methods=['POST'])
+def run_maintenance():
+    """Run due maintenance now, or the listed tasks with force=true"""
+    try:
+        data = request.get_json(silent=True) or {}
+        result = db_maintenance.run(tasks=data.get('tasks'), force=bool(data.get('force', False)))
+        return jsonify({'message': 'Maintenance completed', **result})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error running maintenance: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/admin/tenants', methods=['GET'])
+def list_tenants():
+    """Tenants and the shard file each one is routed to"""
+    return jsonify({
+        'sharding_enabled': app.config['TENANT_SHARDING'],
+        'current_tenant': db.current_tenant(),
+        'tenants': db.tenants()
+    })
+
+@app.route('/api/admin/tenants', methods=['POST'])
+def provision_tenant():
+    """Create (and migrate) a shard for a new tenant"""
+    try:
+        data = request.get_json(silent=True) or {}
+        tenant = str(data.get('tenant_id', '')).strip().lower()
+        result = db.provision(tenant)
+        start_tenant_workers(tenant)
+        return jsonify({'message': 'Tenant provisioned', **result}), 201 if result['created'] else 200
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error provisioning tenant: {e}")
+        return jsonify({'error': str(e)}), 500
+
+def summarize_shard(tenant: str, shard) -> Dict:
+    """Headline counts for one tenant's shard"""
+    conn = shard.get_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute('''
+        SELECT COUNT(*), SUM(status = 'active'), COALESCE(SUM(enrolled), 0),
+               COALESCE(SUM(price * enrolled), 0), COALESCE(SUM(rating * total_ratings), 0),
+               COALESCE(SUM(total_ratings), 0)
+        FROM courses
+    ''')
+    courses, active_courses, enrolled, revenue, rating_points, ratings = cursor.fetchone()
+    cursor.execute('SELECT COUNT(*) FROM students')
+    students = cursor.fetchone()[0]
+    cursor.execute('SELECT COUNT(*), COUNT(completion_date) FROM enrollments')
+    enrollments, completions = cursor.fetchone()
+    
+    conn.close()
+    return {
+        'courses': courses,
+        'active_courses': active_courses or 0,
+        'students': students,
+        'enrollments': enrollments,
+        'completions': completions,
+        'seats_filled': enrolled,
+        'revenue': round(revenue, 2),
+        'ratings': ratings,
+        'rating_points': rating_points
+    }
+
+@app.route('/api/admin/aggregates', methods=['GET'])
+def get_tenant_aggregates():
+    """Cross-tenant totals, computed on every shard in parallel"""
+    try:
+        start = time.perf_counter()
+        per_tenant = db.fan_out(summarize_shard)
+        
+        totals = {}
+        failed = []
+        for tenant, summary in per_tenant.items():
+            if 'error' in summary:
+                failed.append(tenant)
+                continue
+            for key, value in summary.items():
+                totals[key] = totals.get(key, 0) + value
+            rating_points = summary.pop('rating_points')
+            summary['avg_rating'] = round(rating_points / summary['ratings'], 2) if summary['ratings'] else 0
+        if totals:
+            rating_points = totals.pop('rating_points')
+            totals['avg_rating'] = round(rating_points / totals['ratings'], 2) if totals['ratings'] else 0
+            totals['revenue'] = round(totals['revenue'], 2)
+        
+        return jsonify({
+            'tenants': per_tenant,
+            'totals': totals,
+            'failed_tenants': failed,
+            'duration_ms': round((time.perf_counter() - start) * 1000, 3)
+        })
+        
+    except Exception as e:
+        logger.error(f"Error aggregating tenants: {e}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/ai/generate-course', methods=['POST'])
 def generate_ai_course():
     """Generate AI-powered course suggestions"""
@@ -531,7 +1405,7 @@ def generate_ai_course():
         
         return jsonify({
             'suggestions': suggestions,
-            'ai_powered': bool(ai_assistant.api_key)
+            'ai_powered': ai_assistant.llm.enabled
         })
         
     except Exception as e:
@@ -542,8 +1416,8 @@ def generate_ai_course():
 def get_dashboard_analytics():
     """Get dashboard analytics data"""
     try:
-        conn = sqlite3.connect(db.db_name)
-        cursor = conn.cursor()
+        snapshot = snapshot_reader.open()
+        cursor = snapshot.connection.cursor()
         
         # Get basic stats
         cursor.execute('SELECT COUNT(*) FROM courses')
@@ -592,9 +1466,9 @@ def get_dashboard_analytics():
                 'fill_rate': round(row[4], 1)
             })
         
-        conn.close()
+        snapshot.close()
         
-        return jsonify({
+        response = jsonify({
             'stats': {
                 'total_courses': total_courses,
                 'total_students': total_students,
@@ -603,21 +1477,73 @@ def get_dashboard_analytics():
             },
             'category_distribution': category_distribution,
             'enrollment_trends': enrollment_trends,
-            'top_courses': top_courses
+            'top_courses': top_courses,
+            'snapshot': snapshot.info()
         })
+        response.headers.update(snapshot.headers())
+        return response
         
     except Exception as e:
         logger.error(f"Error getting analytics: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/analytics/rollups', methods=['GET'])
+def get_analytics_rollups():
+    """Get hourly or daily event counts per event type and course"""
+    try:
+        rollups = analytics_retention.get_rollups(
+            granularity=request.args.get('granularity', 'day'),
+            start=request.args.get('start', ''),
+            end=request.args.get('end', ''),
+            event_type=request.args.get('event_type', ''),
+            course_id=request.args.get('course_id', '')
+        )
+        return jsonify({'rollups': rollups, 'total_buckets': len(rollups)})
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error getting analytics rollups: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/analytics/report', methods=['GET'])
+def get_analytics_report():
+    """Ad-hoc report over events, enrollments and ratings
+
+    Query parameters: start, end (ISO 8601), bucket (hour/day/week/month),
+    group_by (comma separated event_type, category, course_id), metrics
+    (event_count, enrollments, enrollment_velocity, fill_rate,
+    rating_distribution) and optional event_type/category/course_id filters.
+    """
+    try:
+        params = analytics_reporter.parse_request(request.args)
+        return jsonify(analytics_reporter.build_report(**params))
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error building analytics report: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/admin/analytics/retention', methods=['POST'])
+def run_analytics_retention():
+    """Roll up analytics events and archive those past the retention window"""
+    try:
+        result = analytics_retention.run()
+        return jsonify({'message': 'Analytics retention completed', **result})
+        
+    except Exception as e:
+        logger.error(f"Error running analytics retention: {e}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/export/courses', methods=['GET'])
 def export_courses():
     """Export courses to CSV or JSON"""
     try:
         format_type = request.args.get('format', 'json').lower()
         
-        conn = sqlite3.connect(db.db_name)
-        cursor = conn.cursor()
+        snapshot = snapshot_reader.open()
+        cursor = snapshot.connection.cursor()
         
         cursor.execute('''
             SELECT id, title, description, duration, instructor, category, price, 
@@ -627,6 +1553,7 @@ def export_courses():
         ''')
         
         courses = cursor.fetchall()
+        snapshot.close()
         columns = ['id', 'title', 'description', 'duration', 'instructor', 'category', 
                   'price', 'capacity', 'enrolled', 'status', 'rating', 'created_at', 'updated_at']
         
@@ -644,13 +1571,14 @@ def export_courses():
             csv_file.write(csv_data.encode('utf-8'))
             csv_file.seek(0)
             
-            conn.close()
-            return send_file(
+            response = send_file(
                 csv_file,
                 mimetype='text/csv',
                 as_attachment=True,
                 download_name=f'iron_lady_courses_{datetime.now().strftime("%Y%m%d")}.csv'
             )
+            response.headers.update(snapshot.headers())
+            return response
         
         else:  # JSON format
             course_list = []
@@ -661,11 +1589,13 @@ def export_courses():
             export_data = {
                 'export_date': datetime.now().isoformat(),
                 'total_courses': len(course_list),
-                'courses': course_list
+                'courses': course_list,
+                'snapshot': snapshot.info()
             }
             
-            conn.close()
-            return jsonify(export_data)
+            response = jsonify(export_data)
+            response.headers.update(snapshot.headers())
+            return response
     
     except Exception as e:
         logger.error(f"Error exporting courses: {e}")
@@ -685,15 +1615,24 @@ def import_courses():
         if not file.filename.lower().endswith('.csv'):
             return jsonify({'error': 'Only CSV files are supported'}), 400
         
+        # flag: import and report near-duplicates; skip: leave them out; allow: no check
+        on_duplicate = request.form.get('on_duplicate', request.args.get('on_duplicate', 'flag'))
+        if on_duplicate not in ON_DUPLICATE:
+            return jsonify({'error': f'Invalid on_duplicate. Must be one of: {list(ON_DUPLICATE)}'}), 400
+        
         # Read and process CSV
         csv_content = file.read().decode('utf-8')
         csv_reader = csv.DictReader(StringIO(csv_content))
         
-        conn = sqlite3.connect(db.db_name)
+        conn = db.get_connection()
         cursor = conn.cursor()
         
         imported_count = 0
+        skipped_count = 0
         errors = []
+        duplicates = []
+        if on_duplicate != 'allow':
+            duplicate_detector.sync()
         
         for row_num, row in enumerate(csv_reader, 1):
             try:
@@ -702,6 +1641,17 @@ def import_courses():
                     errors.append(f"Row {row_num}: Missing required fields")
                     continue
                 
+                # LSH lookup: only courses sharing a band bucket are compared,
+                # including rows added earlier in this file
+                if on_duplicate != 'allow':
+                    signature, text_hash, matches = duplicate_detector.check(
+                        row.get('title', ''), row.get('description', ''), row.get('instructor', ''))
+                    if matches:
+                        duplicates.append({'row': row_num, 'title': row.get('title', ''), 'matches': matches})
+                        if on_duplicate == 'skip':
+                            skipped_count += 1
+                            continue
+                
                 course_id = str(uuid.uuid4())
                 now = datetime.now().isoformat()
                 
@@ -722,17 +1672,31 @@ def import_courses():
                     now, now
                 ))
                 
+                if on_duplicate != 'allow':
+                    duplicate_detector.add(course_id, row.get('title', ''), signature, text_hash)
                 imported_count += 1
                 
             except Exception as e:
                 errors.append(f"Row {row_num}: {str(e)}")
         
-        conn.commit()
-        conn.close()
+        try:
+            conn.commit()
+        except Exception:
+            # Rows added to the duplicate index were never written
+            duplicate_detector.reset()
+            raise
+        finally:
+            conn.close()
+        
+        if imported_count:
+            publish_course_change('courses_changed', {'source': 'import', 'count': imported_count})
         
         return jsonify({
             'message': f'Import completed. {imported_count} courses imported.',
             'imported_count': imported_count,
+            'skipped_duplicates': skipped_count,
+            'duplicate_count': len(duplicates),
+            'duplicates': duplicates[:50],
             'errors': errors[:10]  # Limit errors shown
         })
         
@@ -740,6 +1704,26 @@ def import_courses():
         logger.error(f"Error importing courses: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/courses/duplicates', methods=['GET'])
+def get_duplicate_clusters():
+    """Clusters of near-duplicate courses across the catalog"""
+    try:
+        threshold = request.args.get('threshold', type=float)
+        limit = request.args.get('limit', 100, type=int)
+        if threshold is not None and not 0 < threshold <= 1:
+            return jsonify({'error': 'threshold must be between 0 and 1'}), 400
+        if limit < 0:
+            return jsonify({'error': 'limit must not be negative'}), 400
+        limit = min(limit, app.config['DUPLICATE_CLUSTER_LIMIT'])
+        
+        return json_response(duplicate_detector.clusters(threshold=threshold, limit=limit),
+                             accept_encoding=request.headers.get('Accept-Encoding', ''),
+                             route='/api/courses/duplicates')
+        
+    except Exception as e:
+        logger.error(f"Error finding duplicate courses: {e}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/bulk/update-status', methods=['PUT'])
 def bulk_update_status():
     """Bulk update course status"""
@@ -751,33 +1735,66 @@ def bulk_update_status():
         if not course_ids or not new_status:
             return jsonify({'error': 'Course IDs and status are required'}), 400
         
-        valid_statuses = ['draft', 'active', 'completed', 'archived']
-        if new_status not in valid_statuses:
-            return jsonify({'error': f'Invalid status. Must be one of: {valid_statuses}'}), 400
-        
-        conn = sqlite3.connect(db.db_name)
-        cursor = conn.cursor()
-        
-        # Build query with proper number of placeholders
-        placeholders = ','.join(['?' for _ in course_ids])
-        query = f'UPDATE courses SET status = ?, updated_at = ? WHERE id IN ({placeholders})'
-        
-        params = [new_status, datetime.now().isoformat()] + course_ids
-        cursor.execute(query, params)
-        
-        updated_count = cursor.rowcount
-        conn.commit()
-        conn.close()
+        # Chunked through a temp table, so any number of ids fits
+        job = bulk_operations.run(bulk_operations.create_job('status', course_ids=course_ids, status=new_status))
+        updated_count = job['updated']
         
         return jsonify({
             'message': f'Updated {updated_count} courses to {new_status} status',
             'updated_count': updated_count
         })
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Error bulk updating status: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/bulk/operations', methods=['POST'])
+def create_bulk_operation():
+    """Patch, change status of or delete many courses by id list or filter"""
+    try:
+        data = request.get_json(silent=True) or {}
+        job = bulk_operations.create_job(
+            data.get('action', ''),
+            course_ids=data.get('course_ids'),
+            course_filter=data.get('filter'),
+            fields=data.get('fields'),
+            status=data.get('status'),
+            chunk_size=data.get('chunk_size')
+        )
+        
+        if data.get('wait'):
+            return jsonify({'message': 'Bulk operation finished', 'job': bulk_operations.run(job)})
+        return jsonify({'message': 'Bulk operation started', 'job': bulk_operations.start(job)}), 202
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error running bulk operation: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/bulk/operations', methods=['GET'])
+def list_bulk_operations():
+    """Recent bulk operations, newest first"""
+    return jsonify({'jobs': bulk_operations.list_jobs()})
+
+@app.route('/api/bulk/operations/<job_id>', methods=['GET'])
+def get_bulk_operation(job_id):
+    """Progress of one bulk operation"""
+    job = bulk_operations.get(job_id)
+    if not job:
+        return jsonify({'error': 'Bulk operation not found'}), 404
+    return jsonify(job)
+
+@app.route('/api/bulk/operations/<job_id>', methods=['DELETE'])
+def cancel_bulk_operation(job_id):
+    """Stop a running bulk operation after its current chunk"""
+    job = bulk_operations.cancel(job_id)
+    if not job:
+        return jsonify({'error': 'Bulk operation not found'}), 404
+    return jsonify({'message': 'Cancellation requested', 'job': job})
+
 @app.route('/api/courses/<course_id>/rate', methods=['POST'])
 def rate_course(course_id):
     """Rate a course"""
@@ -790,37 +1807,43 @@ def rate_course(course_id):
         if not 1 <= rating <= 5:
             return jsonify({'error': 'Rating must be between 1 and 5'}), 400
         
-        conn = sqlite3.connect(db.db_name)
+        conn = db.get_connection()
         cursor = conn.cursor()
         
         # Check if course exists
-        cursor.execute('SELECT id FROM courses WHERE id = ?', (course_id,))
-        if not cursor.fetchone():
+        cursor.execute('SELECT pk FROM courses WHERE id = ?', (course_id,))
+        course_row = cursor.fetchone()
+        if not course_row:
             conn.close()
             return jsonify({'error': 'Course not found'}), 404
+        course_pk = course_row[0]
         
         # Add rating
         rating_id = str(uuid.uuid4())
         cursor.execute('''
-            INSERT OR REPLACE INTO course_ratings (id, course_id, student_id, rating, review, created_at)
+            INSERT OR REPLACE INTO course_ratings (id, course_pk, student_id, rating, review, created_at)
             VALUES (?, ?, ?, ?, ?, ?)
-        ''', (rating_id, course_id, student_id, rating, review, datetime.now().isoformat()))
+        ''', (rating_id, course_pk, student_id, rating, review, datetime.now().isoformat()))
         
         # Update course average rating
         cursor.execute('''
             SELECT AVG(rating) as avg_rating, COUNT(*) as total_ratings
-            FROM course_ratings WHERE course_id = ?
-        ''', (course_id,))
+            FROM course_ratings WHERE course_pk = ?
+        ''', (course_pk,))
         
         avg_rating, total_ratings = cursor.fetchone()
         
         cursor.execute('''
-            UPDATE courses SET rating = ?, total_ratings = ? WHERE id = ?
-        ''', (round(avg_rating, 1), total_ratings, course_id))
+            UPDATE courses SET rating = ?, total_ratings = ? WHERE pk = ?
+        ''', (round(avg_rating, 1), total_ratings, course_pk))
         
         conn.commit()
         conn.close()
         
+        publish_course_change('course_updated', {
+            'id': course_id, 'rating': round(avg_rating, 1), 'total_ratings': total_ratings
+        })
+        
         return jsonify({
             'message': 'Course rated successfully',
             'new_average_rating': round(avg_rating, 1),
@@ -839,7 +1862,7 @@ def get_search_suggestions():
         if len(query) < 2:
             return jsonify({'suggestions': []})
         
-        conn = sqlite3.connect(db.db_name)
+        conn = db.get_connection()
         cursor = conn.cursor()
         
         # Search in titles, instructors, and categories
@@ -866,8 +1889,9 @@ def get_search_suggestions():
 
 def log_analytics(event_type: str, course_id: str, data: Dict):
     """Log analytics events"""
+    start = time.perf_counter()
     try:
-        conn = sqlite3.connect(db.db_name)
+        conn = db.get_connection()
         cursor = conn.cursor()
         
         analytics_id = str(uuid.uuid4())
@@ -882,7 +1906,15 @@ def log_analytics(event_type: str, course_id: str, data: Dict):
         conn.commit()
         conn.close()
     except Exception as e:
+        metrics.analytics_write_errors_total.inc()
         logger.error(f"Error logging analytics: {e}")
+    finally:
+        metrics.analytics_write_duration_seconds.observe(time.perf_counter() - start)
+
+def log_tenant_analytics(tenant: str, event_type: str, course_id: str, data: Dict):
+    """Log an analytics event from a background worker into its tenant's shard"""
+    with db.use_tenant(tenant):
+        log_analytics(event_type, course_id, data)
 
 # Error handlers
 @app.errorhandler(404)
@@ -896,21 +1928,43 @@ def internal_error(error):
 if __name__ == '__main__':
     print("🚀 Starting Iron Lady Advanced Course Management API")
     print("📊 Database initialized with sample data")
-    print("🤖 AI Assistant", "enabled" if ai_assistant.api_key else "disabled (no API key)")
+    print("🤖 AI Assistant", "enabled" if ai_assistant.llm.enabled else "disabled (no API key)")
     print("🌐 Server running on http://localhost:5000")
     print("\n📋 Available Endpoints:")
     print("GET    /api/health - Health check")
+    print("GET    /api/changes/stream - Course change events (SSE)")
+    print("GET    /api/debug/rate-limits - Rate limiter state")
+    print("GET    /api/metrics - Prometheus metrics")
+    print("GET    /api/debug/slow-queries - Slow query log")
+    print("POST   /api/debug/profile - Arm sampling profiler (X-Profiler-Token)")
+    print("POST   /api/batch - Several GET requests on one snapshot")
     print("GET    /api/courses - List courses")
+    print("GET    /api/courses/changes - Course changes since a version")
     print("POST   /api/courses - Create course") 
     print("PUT    /api/courses/<id> - Update course")
     print("DELETE /api/courses/<id> - Delete course")
     print("POST   /api/courses/<id>/enroll - Enroll student")
     print("POST   /api/courses/<id>/rate - Rate course")
+    print("POST   /api/enrollments/<id>/progress - Report learner progress")
+    print("POST   /api/certificates/issue - Issue certificates (background job)")
+    print("GET    /api/courses/<id>/recommendations - Learners also enrolled in")
+    print("GET    /api/students/<id>/recommendations - Recommendations for a learner")
     print("POST   /api/ai/generate-course - AI course generation")
     print("GET    /api/analytics/dashboard - Dashboard data")
+    print("GET    /api/analytics/rollups - Hourly/daily event rollups")
+    print("GET    /api/analytics/report - Ad-hoc analytics report")
+    print("POST   /api/admin/analytics/retention - Roll up and archive analytics")
     print("GET    /api/export/courses - Export courses")
     print("POST   /api/import/courses - Import courses")
+    print("GET    /api/courses/duplicates - Near-duplicate course clusters")
     print("PUT    /api/bulk/update-status - Bulk status update")
+    print("POST   /api/bulk/operations - Chunked bulk patch/status/delete")
+    print("GET    /api/bulk/operations/<id> - Bulk operation progress")
     print("GET    /api/search/suggestions - Search suggestions")
+    print("GET    /api/admin/maintenance - Database maintenance status")
+    print("POST   /api/admin/maintenance/run - Run database maintenance now")
+    print("GET    /api/admin/tenants - Tenants and their shards")
+    print("POST   /api/admin/tenants - Provision a tenant shard")
+    print("GET    /api/admin/aggregates - Cross-tenant totals (parallel fan-out)")
     
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,148 @@
+import json
+import logging
+import time
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional
+
+from werkzeug.test import EnvironBuilder
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+batch_requests_total = metrics.registry.counter(
+    'batch_requests_total', 'Sub-requests executed through the batch endpoint', ('status',))
+batch_size = metrics.registry.histogram(
+    'batch_size', 'Sub-requests per batch', buckets=(1, 2, 5, 10, 20, 50))
+
+MAX_SUB_REQUESTS = 20
+# Sub-requests share one read snapshot, so only reads are allowed
+METHODS = ('GET',)
+# Endpoints that would nest batches or never finish
+EXCLUDED_PATHS = ('/api/batch', '/api/changes/stream')
+# Headers a sub-request inherits from the batch request
+FORWARDED_HEADERS = ('Authorization', 'X-Profiler-Token', 'X-Forwarded-For', 'User-Agent')
+
+_shared: ContextVar[Optional['SharedConnection']] = ContextVar('batch_connection', default=None)
+
+
+class SharedConnection:
+    """A batch's snapshot connection handed to each sub-request.
+
+    Route handlers close (and may commit) the connections they open. Here
+    those calls are no-ops, so the read transaction, and with it the
+    snapshot, lasts for the whole batch."""
+
+    def __init__(self, connection, db_name: str, taken_at: float):
+        object.__setattr__(self, '_connection', connection)
+        object.__setattr__(self, 'db_name', db_name)
+        object.__setattr__(self, 'taken_at', taken_at)
+
+    def close(self):
+        pass
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._connection, name, value)
+
+
+def shared_connection(db_name: str) -> Optional[SharedConnection]:
+    """The current batch's connection, if a batch is running against this database"""
+    shared = _shared.get()
+    return shared if shared is not None and shared.db_name == db_name else None
+
+
+class BatchExecutor:
+    """Runs a list of GET sub-requests through the app on one snapshot.
+
+    Each sub-request is dispatched with its own request and app context, so
+    the usual hooks (tenant routing, rate limits, metrics, query budget)
+    still apply to it. While it runs, `get_connection()` and snapshot
+    reads for the batch's database return the shared snapshot connection.
+    Every result therefore comes from the same point in time, and the batch
+    opens one connection instead of one per handler."""
+
+    def __init__(self, app, max_requests: int = MAX_SUB_REQUESTS, forwarded_headers=FORWARDED_HEADERS):
+        self.app = app
+        self.max_requests = max_requests
+        self.forwarded_headers = {name.lower() for name in forwarded_headers}
+
+    def validate(self, sub_requests) -> List[Dict]:
+        if not isinstance(sub_requests, list) or not sub_requests:
+            raise ValueError('requests must be a non-empty list')
+        if len(sub_requests) > self.max_requests:
+            raise ValueError(f'At most {self.max_requests} requests per batch')
+        validated = []
+        for index, sub_request in enumerate(sub_requests):
+            if not isinstance(sub_request, dict):
+                raise ValueError(f'Request {index} must be an object')
+            method = str(sub_request.get('method', 'GET')).upper()
+            path = str(sub_request.get('path', ''))
+            params = sub_request.get('params') or {}
+            if method not in METHODS:
+                raise ValueError(f'Request {index}: method must be one of {list(METHODS)}')
+            if not path.startswith('/api/') or path.split('?')[0].rstrip('/') in EXCLUDED_PATHS:
+                raise ValueError(f'Request {index}: path {path!r} cannot be batched')
+            if not isinstance(params, dict):
+                raise ValueError(f'Request {index}: params must be an object')
+            validated.append({'id': sub_request.get('id', index), 'method': method, 'path': path,
+                              'params': params})
+        return validated
+
+    def run(self, reader, db_name: str, sub_requests: List[Dict], headers: Dict[str, str],
+            remote_addr: str) -> Iterator[Dict]:
+        """Yield the snapshot details, then one result per sub-request in order"""
+        batch_size.observe(len(sub_requests))
+        snapshot = reader.open()
+        try:
+            # The first read fixes the snapshot; the clock value lets clients delta sync from here
+            version = snapshot.connection.execute('SELECT version FROM change_clock WHERE id = 1').fetchone()[0]
+            shared = SharedConnection(snapshot.connection, db_name, snapshot.taken_at)
+            yield {'snapshot': snapshot.info(), 'version': version}
+
+            forwarded = {name: value for name, value in headers.items() if name.lower() in self.forwarded_headers}
+            for sub_request in sub_requests:
+                # Pinned only while the sub-request runs, never across a yield
+                token = _shared.set(shared)
+                try:
+                    result = self._dispatch(sub_request, forwarded, remote_addr)
+                finally:
+                    _shared.reset(token)
+                yield result
+        finally:
+            snapshot.close()
+
+    def _dispatch(self, sub_request: Dict, headers: Dict[str, str], remote_addr: str) -> Dict:
+        start = time.perf_counter()
+        builder = EnvironBuilder(path=sub_request['path'], method=sub_request['method'],
+                                 query_string=sub_request['params'], headers=headers,
+                                 environ_base={'REMOTE_ADDR': remote_addr})
+        try:
+            # A fresh app context gives the sub-request its own `g`
+            with self.app.app_context(), self.app.request_context(builder.get_environ()):
+                response = self.app.full_dispatch_request()
+                status = response.status_code
+                # send_file responses stream a file; read it here instead
+                response.direct_passthrough = False
+                body = response.get_data(as_text=True)
+                if response.is_json:
+                    body = json.loads(body)
+        except Exception as e:
+            logger.error(f"Batched request {sub_request['path']} failed: {e}")
+            status, body = 500, {'error': str(e)}
+
+        batch_requests_total.inc(str(status))
+        return {
+            'id': sub_request['id'],
+            'status': status,
+            'body': body,
+            'duration_ms': round((time.perf_counter() - start) * 1000, 3)
+        }
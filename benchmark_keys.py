@@ -0,0 +1,145 @@
+"""Compare UUID text primary keys against INTEGER surrogate keys.
+
+Builds the same synthetic catalogue twice in temporary SQLite files - once
+with the legacy schema (TEXT UUID primary keys, enrollments referencing
+courses/students by UUID) and once with the current schema (INTEGER
+PRIMARY KEY plus a unique UUID `id`) - and reports file size, bulk insert
+throughput and the time of a course/enrollment/student join.
+
+    python benchmark_keys.py --courses 500 --students 50000 --enrollments 200000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+LEGACY_SCHEMA = '''
+    CREATE TABLE courses (id TEXT PRIMARY KEY, title TEXT, category TEXT, created_at TEXT);
+    CREATE TABLE students (id TEXT PRIMARY KEY, name TEXT, email TEXT UNIQUE, created_at TEXT);
+    CREATE TABLE enrollments (id TEXT PRIMARY KEY, student_id TEXT, course_id TEXT,
+                              enrollment_date TEXT, progress REAL DEFAULT 0);
+    CREATE INDEX idx_enrollments_course ON enrollments (course_id);
+    CREATE INDEX idx_enrollments_student ON enrollments (student_id);
+'''
+
+INTEGER_SCHEMA = '''
+    CREATE TABLE courses (pk INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, title TEXT, category TEXT,
+                          created_at TEXT);
+    CREATE TABLE students (pk INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, name TEXT, email TEXT UNIQUE,
+                           created_at TEXT);
+    CREATE TABLE enrollments (pk INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, student_pk INTEGER,
+                              course_pk INTEGER, enrollment_date TEXT, progress REAL DEFAULT 0);
+    CREATE INDEX idx_enrollments_course ON enrollments (course_pk);
+    CREATE INDEX idx_enrollments_student ON enrollments (student_pk);
+'''
+
+LEGACY_JOIN = '''
+    SELECT c.category, COUNT(*), AVG(e.progress), COUNT(DISTINCT s.email)
+    FROM enrollments e
+    JOIN courses c ON c.id = e.course_id
+    JOIN students s ON s.id = e.student_id
+    GROUP BY c.category
+'''
+
+INTEGER_JOIN = '''
+    SELECT c.category, COUNT(*), AVG(e.progress), COUNT(DISTINCT s.email)
+    FROM enrollments e
+    JOIN courses c ON c.pk = e.course_pk
+    JOIN students s ON s.pk = e.student_pk
+    GROUP BY c.category
+'''
+
+CATEGORIES = ['leadership', 'business', 'technology', 'personal_development']
+
+
+def make_data(courses: int, students: int, enrollments: int, seed: int):
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    course_rows = [(str(uuid.UUID(int=rng.getrandbits(128))), f'Course {i}', rng.choice(CATEGORIES),
+                    (start + timedelta(minutes=i)).isoformat()) for i in range(courses)]
+    student_rows = [(str(uuid.UUID(int=rng.getrandbits(128))), f'Learner {i}', f'learner{i}@example.com',
+                     (start + timedelta(seconds=i)).isoformat()) for i in range(students)]
+    enrollment_rows = [(str(uuid.UUID(int=rng.getrandbits(128))), rng.randrange(students), rng.randrange(courses),
+                        (start + timedelta(seconds=i * 7)).isoformat(), rng.random() * 100)
+                       for i in range(enrollments)]
+    return course_rows, student_rows, enrollment_rows
+
+
+def load(path: str, integer_keys: bool, data, batch_size: int) -> float:
+    course_rows, student_rows, enrollment_rows = data
+    conn = sqlite3.connect(path)
+    conn.executescript(INTEGER_SCHEMA if integer_keys else LEGACY_SCHEMA)
+    cursor = conn.cursor()
+    start = time.perf_counter()
+    cursor.executemany('INSERT INTO courses (id, title, category, created_at) VALUES (?, ?, ?, ?)', course_rows)
+    cursor.executemany('INSERT INTO students (id, name, email, created_at) VALUES (?, ?, ?, ?)', student_rows)
+    if integer_keys:
+        # Rows were inserted in order, so the n-th row has pk n + 1
+        rows = [(eid, student + 1, course + 1, date, progress)
+                for eid, student, course, date, progress in enrollment_rows]
+        sql = 'INSERT INTO enrollments (id, student_pk, course_pk, enrollment_date, progress) VALUES (?, ?, ?, ?, ?)'
+    else:
+        rows = [(eid, student_rows[student][0], course_rows[course][0], date, progress)
+                for eid, student, course, date, progress in enrollment_rows]
+        sql = 'INSERT INTO enrollments (id, student_id, course_id, enrollment_date, progress) VALUES (?, ?, ?, ?, ?)'
+    for offset in range(0, len(rows), batch_size):
+        cursor.executemany(sql, rows[offset:offset + batch_size])
+        conn.commit()
+    elapsed = time.perf_counter() - start
+    conn.execute('VACUUM')
+    conn.close()
+    return elapsed
+
+
+def time_join(path: str, query: str, repeat: int) -> float:
+    conn = sqlite3.connect(path)
+    conn.execute(query).fetchall()  # warm the page cache
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.execute(query).fetchall()
+        best = min(best, time.perf_counter() - start)
+    conn.close()
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--courses', type=int, default=500)
+    parser.add_argument('--students', type=int, default=50000)
+    parser.add_argument('--enrollments', type=int, default=200000)
+    parser.add_argument('--batch-size', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    data = make_data(args.courses, args.students, args.enrollments, args.seed)
+    total_rows = args.courses + args.students + args.enrollments
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for name, integer_keys, query in (('uuid text keys', False, LEGACY_JOIN),
+                                          ('integer keys', True, INTEGER_JOIN)):
+            path = os.path.join(directory, f"{name.replace(' ', '_')}.db")
+            insert_seconds = load(path, integer_keys, data, args.batch_size)
+            results[name] = {
+                'size_mb': os.path.getsize(path) / 1024 / 1024,
+                'inserts_per_second': total_rows / insert_seconds,
+                'join_ms': time_join(path, query, args.repeat) * 1000
+            }
+
+    print(f"{args.courses} courses, {args.students} students, {args.enrollments} enrollments")
+    print(f"{'schema':<16}{'size (MB)':>12}{'inserts/s':>14}{'join (ms)':>12}")
+    for name, result in results.items():
+        print(f"{name:<16}{result['size_mb']:>12.2f}{result['inserts_per_second']:>14,.0f}{result['join_ms']:>12.1f}")
+    legacy, integer = results['uuid text keys'], results['integer keys']
+    print(f"size {integer['size_mb'] / legacy['size_mb']:.2f}x, "
+          f"inserts {integer['inserts_per_second'] / legacy['inserts_per_second']:.2f}x, "
+          f"join {legacy['join_ms'] / integer['join_ms']:.2f}x faster")
+
+
+if __name__ == '__main__':
+    main()
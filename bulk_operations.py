@@ -0,0 +1,267 @@
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+bulk_rows_total = metrics.registry.counter(
+    'bulk_rows_total', 'Courses changed by bulk operations', ('action',))
+bulk_chunk_duration_seconds = metrics.registry.histogram(
+    'bulk_chunk_duration_seconds', 'Time to apply one bulk operation chunk', ('action',))
+
+ACTIONS = ('patch', 'status', 'delete')
+COURSE_STATUSES = ('draft', 'active', 'completed', 'archived')
+FILTER_FIELDS = ('category', 'status', 'instructor', 'difficulty_level')
+# Ids are staged this many rows at a time, well under SQLite's bound-variable limit
+STAGE_BATCH = 5000
+MAX_JOBS = 50
+
+
+class BulkOperations:
+    """Applies patches, status changes and cascaded deletes to large course sets.
+
+    Target course ids (or a filter) are resolved once into a temp table of
+    course keys, so the set is fixed when the job starts. The changes are
+    then applied one key range at a time, with each range in its own short
+    transaction that joins against the temp table. This avoids one huge
+    `IN (?, ?, ...)` list and never holds the write lock for long. Progress
+    is recorded on the job after every chunk, and a cancelled job stops
+    between chunks."""
+
+    def __init__(self, database, updatable_fields: List[str], chunk_size: int = 2000):
+        self.database = database
+        self.updatable_fields = list(updatable_fields)
+        self.chunk_size = chunk_size
+        self.completion_listeners: List[Callable[[Dict], None]] = []
+        self.jobs: 'OrderedDict[str, Dict]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._cancelled = set()
+
+    def create_job(self, action: str, course_ids: Optional[List[str]] = None, course_filter: Optional[Dict] = None,
+                   fields: Optional[Dict] = None, status: Optional[str] = None,
+                   chunk_size: Optional[int] = None) -> Dict:
+        """Validate a request and register it as a pending job"""
+        if action not in ACTIONS:
+            raise ValueError(f'Invalid action. Must be one of: {list(ACTIONS)}')
+        if (course_ids is None) == (course_filter is None):
+            raise ValueError('Provide either course_ids or filter')
+        if course_ids is not None:
+            if not isinstance(course_ids, list) or not course_ids:
+                raise ValueError('course_ids must be a non-empty list')
+            course_ids = list(dict.fromkeys(str(course_id) for course_id in course_ids))
+        if course_filter is not None:
+            course_filter = self._validate_filter(course_filter)
+
+        if action == 'status':
+            fields = {'status': status}
+        if action in ('patch', 'status'):
+            if not fields or not isinstance(fields, dict):
+                raise ValueError('No fields to update')
+            invalid = [field for field in fields if field not in self.updatable_fields]
+            if invalid:
+                raise ValueError(f'Invalid fields {invalid}. Must be from: {self.updatable_fields}')
+            if 'status' in fields and fields['status'] not in COURSE_STATUSES:
+                raise ValueError(f'Invalid status. Must be one of: {list(COURSE_STATUSES)}')
+        else:
+            fields = None
+
+        chunk_size = chunk_size or self.chunk_size
+        if not isinstance(chunk_size, int) or chunk_size < 1:
+            raise ValueError('chunk_size must be a positive integer')
+
+        job = {
+            'job_id': str(uuid.uuid4()),
+            'action': action,
+            'status': 'pending',
+            'fields': fields,
+            'filter': course_filter,
+            'requested': len(course_ids) if course_ids is not None else None,
+            'total': None,
+            'not_found': None,
+            'processed': 0,
+            'updated': 0,
+            'deleted_enrollments': 0,
+            'deleted_ratings': 0,
+            'chunks': 0,
+            'chunk_size': chunk_size,
+            'progress': 0.0,
+            'created_at': datetime.now().isoformat(),
+            'started_at': None,
+            'finished_at': None,
+            'error': None
+        }
+        with self._lock:
+            self.jobs[job['job_id']] = job
+            while len(self.jobs) > MAX_JOBS:
+                self.jobs.popitem(last=False)
+        job['_course_ids'] = course_ids
+        return job
+
+    def _validate_filter(self, course_filter: Dict) -> Dict:
+        if not isinstance(course_filter, dict) or not course_filter:
+            raise ValueError('filter must be a non-empty object')
+        allowed = FILTER_FIELDS + ('search',)
+        invalid = [key for key in course_filter if key not in allowed]
+        if invalid:
+            raise ValueError(f'Invalid filter fields {invalid}. Must be from: {list(allowed)}')
+        return {key: str(value) for key, value in course_filter.items()}
+
+    def start(self, job: Dict) -> Dict:
+        """Run a job on a background thread"""
+        threading.Thread(target=self._run_safely, args=(job,), name='bulk-operation', daemon=True).start()
+        return self.public(job)
+
+    def cancel(self, job_id: str) -> Optional[Dict]:
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        self._cancelled.add(job_id)
+        return self.public(job)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        job = self.jobs.get(job_id)
+        return self.public(job) if job else None
+
+    def list_jobs(self) -> List[Dict]:
+        with self._lock:
+            jobs = list(self.jobs.values())
+        return [self.public(job) for job in reversed(jobs)]
+
+    @staticmethod
+    def public(job: Dict) -> Dict:
+        return {key: value for key, value in job.items() if not key.startswith('_')}
+
+    def _run_safely(self, job: Dict):
+        try:
+            self.run(job)
+        except Exception as e:
+            logger.error(f"Bulk operation {job['job_id']} failed: {e}")
+
+    def run(self, job: Dict) -> Dict:
+        """Apply a job chunk by chunk on the calling thread"""
+        job['status'] = 'running'
+        job['started_at'] = datetime.now().isoformat()
+        conn = self.database.get_connection()
+        try:
+            total = self._stage_targets(conn, job)
+            job['total'] = total
+            if job['requested'] is not None:
+                job['not_found'] = job['requested'] - total
+            job.pop('_course_ids', None)
+
+            cursor = conn.cursor()
+            after_pk = 0
+            while True:
+                if job['job_id'] in self._cancelled:
+                    job['status'] = 'cancelled'
+                    break
+                cursor.execute('SELECT pk FROM temp.bulk_targets WHERE pk > ? ORDER BY pk LIMIT 1 OFFSET ?',
+                               (after_pk, job['chunk_size'] - 1))
+                row = cursor.fetchone()
+                if row is None:
+                    cursor.execute('SELECT MAX(pk) FROM temp.bulk_targets WHERE pk > ?', (after_pk,))
+                    row = cursor.fetchone()
+                    if row[0] is None:
+                        break
+                upto_pk = row[0]
+                self._apply_chunk(conn, job, after_pk, upto_pk)
+                after_pk = upto_pk
+            if job['status'] == 'running':
+                job['status'] = 'completed'
+        except Exception as e:
+            job['status'] = 'failed'
+            job['error'] = str(e)
+            raise
+        finally:
+            job.pop('_course_ids', None)
+            self._cancelled.discard(job['job_id'])
+            job['finished_at'] = datetime.now().isoformat()
+            try:
+                conn.execute('DROP TABLE IF EXISTS temp.bulk_targets')
+            finally:
+                conn.close()
+
+        logger.info(f"Bulk {job['action']} {job['job_id']}: {job['processed']}/{job['total']} courses "
+                    f"in {job['chunks']} chunks ({job['status']})")
+        for listener in self.completion_listeners:
+            try:
+                listener(self.public(job))
+            except Exception as e:
+                logger.error(f"Error in bulk operation listener: {e}")
+        return self.public(job)
+
+    def _stage_targets(self, conn, job: Dict) -> int:
+        """Resolve the target courses into temp.bulk_targets and return how many there are"""
+        cursor = conn.cursor()
+        cursor.execute('DROP TABLE IF EXISTS temp.bulk_targets')
+        cursor.execute('CREATE TEMP TABLE bulk_targets (pk INTEGER PRIMARY KEY)')
+        course_ids = job.get('_course_ids')
+        if course_ids is not None:
+            cursor.execute('DROP TABLE IF EXISTS temp.bulk_ids')
+            cursor.execute('CREATE TEMP TABLE bulk_ids (id TEXT)')
+            for start in range(0, len(course_ids), STAGE_BATCH):
+                cursor.executemany('INSERT INTO temp.bulk_ids (id) VALUES (?)',
+                                   [(course_id,) for course_id in course_ids[start:start + STAGE_BATCH]])
+            cursor.execute('''
+                INSERT OR IGNORE INTO temp.bulk_targets (pk)
+                SELECT c.pk FROM temp.bulk_ids b JOIN courses c ON c.id = b.id
+            ''')
+            cursor.execute('DROP TABLE temp.bulk_ids')
+        else:
+            clauses, params = [], []
+            for field in FILTER_FIELDS:
+                if field in job['filter']:
+                    clauses.append(f'{field} = ?')
+                    params.append(job['filter'][field])
+            if 'search' in job['filter']:
+                clauses.append('(title LIKE ? OR description LIKE ? OR instructor LIKE ?)')
+                params.extend([f"%{job['filter']['search']}%"] * 3)
+            cursor.execute(f'INSERT INTO temp.bulk_targets (pk) SELECT pk FROM courses WHERE {" AND ".join(clauses)}',
+                           params)
+        conn.commit()
+        cursor.execute('SELECT COUNT(*) FROM temp.bulk_targets')
+        return cursor.fetchone()[0]
+
+    def _apply_chunk(self, conn, job: Dict, after_pk: int, upto_pk: int):
+        chunk_start = time.perf_counter()
+        targets = 'SELECT pk FROM temp.bulk_targets WHERE pk > ? AND pk <= ?'
+        bounds = (after_pk, upto_pk)
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            cursor.execute(f'SELECT COUNT(*) FROM ({targets})', bounds)
+            processed = cursor.fetchone()[0]
+            if job['action'] == 'delete':
+                cursor.execute(f'DELETE FROM enrollments WHERE course_pk IN ({targets})', bounds)
+                deleted_enrollments = cursor.rowcount
+                cursor.execute(f'DELETE FROM course_ratings WHERE course_pk IN ({targets})', bounds)
+                deleted_ratings = cursor.rowcount
+                cursor.execute(f'DELETE FROM courses WHERE pk IN ({targets})', bounds)
+                changed = cursor.rowcount
+            else:
+                fields = job['fields']
+                set_clauses = [f'{field} = ?' for field in fields] + ['updated_at = ?']
+                params = list(fields.values()) + [datetime.now().isoformat()]
+                cursor.execute(f'UPDATE courses SET {", ".join(set_clauses)} WHERE pk IN ({targets})',
+                               params + list(bounds))
+                changed = cursor.rowcount
+                deleted_enrollments = deleted_ratings = 0
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        job['processed'] += processed
+        job['updated'] += changed
+        job['deleted_enrollments'] += deleted_enrollments
+        job['deleted_ratings'] += deleted_ratings
+        job['chunks'] += 1
+        job['progress'] = round(job['processed'] * 100.0 / job['total'], 1) if job['total'] else 100.0
+        bulk_rows_total.inc(job['action'], amount=changed)
+        bulk_chunk_duration_seconds.observe(time.perf_counter() - chunk_start, job['action'])
@@ -0,0 +1,298 @@
+import logging
+import math
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+catalog_query_duration_seconds = metrics.registry.histogram(
+    'catalog_query_duration_seconds', 'Time to answer a course list query from the in-memory catalog',
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5))
+catalog_sync_rows_total = metrics.registry.counter(
+    'catalog_sync_rows_total', 'Course rows applied to the in-memory catalog', ('op',))
+
+# Stored as float64 columns (NaN for NULL) and converted back on output
+NUMERIC_FIELDS = {'price': float, 'capacity': int, 'enrolled': int, 'rating': float, 'total_ratings': int,
+                  'version': int}
+# Few distinct values: stored as int32 codes into a shared string table
+CATEGORICAL_FIELDS = ('category', 'status', 'instructor', 'difficulty_level', 'duration')
+# Everything else stays a plain list of strings
+TEXT_FIELDS = ('id', 'title', 'description', 'created_at', 'updated_at', 'prerequisites',
+               'learning_outcomes', 'course_image')
+FIELDS = TEXT_FIELDS + CATEGORICAL_FIELDS + tuple(NUMERIC_FIELDS)
+
+SORT_FIELDS = ('created_at', 'updated_at', 'title', 'category', 'instructor', 'status', 'price', 'capacity',
+               'enrolled', 'rating', 'total_ratings')
+SORT_ORDERS = ('ASC', 'DESC')
+FILTER_FIELDS = ('category', 'status')
+SEARCH_FIELDS = ('title', 'description', 'instructor')
+
+INITIAL_CAPACITY = 1024
+
+
+def _to_float(value) -> float:
+    # Columns are loosely typed in SQLite; anything non-numeric is kept as NULL
+    try:
+        return np.nan if value is None else float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class StringTable:
+    """Interns repeated strings as small integer codes; code -1 is NULL"""
+
+    def __init__(self):
+        self.values: List[str] = []
+        self.codes: Dict[str, int] = {}
+
+    def encode(self, value: Optional[str]) -> int:
+        if value is None:
+            return -1
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            value = sys.intern(str(value))
+            self.values.append(value)
+            self.codes[value] = code
+        return code
+
+    def lookup(self, value: str) -> Optional[int]:
+        return self.codes.get(value)
+
+    def decode(self, code: int) -> Optional[str]:
+        return self.values[code] if code >= 0 else None
+
+
+class CourseCatalog:
+    """An in-process, columnar copy of the courses table for list queries.
+
+    Numeric columns are float64 arrays and low-cardinality strings are
+    int32 codes into a shared StringTable, so category/status filters are
+    vectorized comparisons. Each sort key keeps a cached argsort order,
+    which is rebuilt only after a write changes that column. A query is a
+    boolean mask, one pass over the cached order, and dicts built for the
+    requested page only.
+
+    The copy follows the database through the change clock (see
+    delta_sync). `sync()` applies rows with a newer version and drops
+    tombstoned ones. Write routes and bulk jobs call it after they commit,
+    so this process sees its own writes at once. Queries check the clock
+    at most every `sync_interval` seconds, which picks up other worker
+    processes without a database round trip on every list request.
+    Deleted rows are masked out and compacted away once they make up half
+    of the arrays."""
+
+    def __init__(self, database, sync_interval: float = 1.0):
+        self.database = database
+        self.sync_interval = sync_interval
+        self.strings = StringTable()
+        self.version = -1
+        self.loaded_at: Optional[float] = None
+        self.checked_at = float('-inf')
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self.size = 0
+        self.dead = 0
+        self._row_by_id: Dict[str, int] = {}
+        self._text: Dict[str, List[Optional[str]]] = {field: [] for field in TEXT_FIELDS}
+        self._search: List[str] = []
+        self._codes = {field: np.full(INITIAL_CAPACITY, -1, dtype=np.int32) for field in CATEGORICAL_FIELDS}
+        self._numeric = {field: np.full(INITIAL_CAPACITY, np.nan) for field in NUMERIC_FIELDS}
+        self._alive = np.zeros(INITIAL_CAPACITY, dtype=bool)
+        self._orders: Dict[str, np.ndarray] = {}
+
+    # Loading and write-through
+
+    def sync(self) -> int:
+        """Apply course changes committed since the catalog's version; returns rows applied"""
+        with self._lock:
+            conn = self.database.get_connection()
+            try:
+                cursor = conn.cursor()
+                if not conn.in_transaction:
+                    cursor.execute('BEGIN')
+                cursor.execute('SELECT version, pruned_version FROM change_clock WHERE id = 1')
+                current_version, pruned_version = cursor.fetchone()
+                self.checked_at = time.monotonic()
+                if current_version == self.version:
+                    return 0
+                # Deletes we have not seen may already be pruned: start over
+                full = self.version < 0 or self.version < pruned_version
+                since = -1 if full else self.version
+
+                cursor.execute(f'SELECT {", ".join(FIELDS)} FROM courses WHERE version > ? ORDER BY pk',
+                               (since,))
+                rows = cursor.fetchall()
+                deleted = []
+                if not full:
+                    cursor.execute('SELECT course_id FROM course_tombstones WHERE version > ?', (since,))
+                    deleted = [row[0] for row in cursor.fetchall()]
+                conn.rollback()
+            finally:
+                conn.close()
+
+            if full:
+                self._reset()
+            for course_id in deleted:
+                self._delete(course_id)
+            changed = set()
+            for row in rows:
+                changed |= self._upsert(dict(zip(FIELDS, row)))
+            for field in changed:
+                self._orders.pop(field, None)
+            if self.dead > 1000 and self.dead * 2 > self.size:
+                self._compact()
+
+            self.version = current_version
+            if full:
+                self.loaded_at = time.time()
+                logger.info(f"Loaded {len(rows)} courses into the catalog engine at version {current_version}")
+            catalog_sync_rows_total.inc('upsert', amount=len(rows))
+            catalog_sync_rows_total.inc('delete', amount=len(deleted))
+            return len(rows) + len(deleted)
+
+    def _grow(self):
+        capacity = len(self._alive) * 2
+        for field, column in self._codes.items():
+            grown = np.full(capacity, -1, dtype=np.int32)
+            grown[:self.size] = column[:self.size]
+            self._codes[field] = grown
+        for field, column in self._numeric.items():
+            grown = np.full(capacity, np.nan)
+            grown[:self.size] = column[:self.size]
+            self._numeric[field] = grown
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:self.size] = self._alive[:self.size]
+        self._alive = alive
+
+    def _upsert(self, course: Dict) -> set:
+        """Write one row; returns the sort fields whose values changed"""
+        row = self._row_by_id.get(course['id'])
+        if row is None:
+            if self.size == len(self._alive):
+                self._grow()
+            row = self.size
+            self.size += 1
+            self._row_by_id[course['id']] = row
+            for field in TEXT_FIELDS:
+                self._text[field].append(course[field])
+            self._search.append('')
+            self._alive[row] = True
+            changed = set(SORT_FIELDS)
+        else:
+            changed = {field for field in SORT_FIELDS if self._differs(field, row, course[field])}
+            for field in TEXT_FIELDS:
+                self._text[field][row] = course[field]
+
+        for field in CATEGORICAL_FIELDS:
+            self._codes[field][row] = self.strings.encode(course[field])
+        for field in NUMERIC_FIELDS:
+            self._numeric[field][row] = _to_float(course[field])
+        self._search[row] = '\n'.join((course[field] or '') for field in SEARCH_FIELDS).lower()
+        return changed
+
+    def _differs(self, field: str, row: int, value) -> bool:
+        if field in NUMERIC_FIELDS:
+            return self._numeric[field][row] != _to_float(value)
+        return self._value(field, row) != value
+
+    def _delete(self, course_id: str):
+        row = self._row_by_id.pop(course_id, None)
+        if row is not None and self._alive[row]:
+            self._alive[row] = False
+            self._search[row] = ''
+            self.dead += 1
+
+    def _compact(self):
+        live = [self._row(row, FIELDS) for row in np.flatnonzero(self._alive[:self.size])]
+        self._reset()
+        for course in live:
+            self._upsert(course)
+
+    # Queries
+
+    def query(self, search: str = '', category: str = '', status: str = '', sort_by: str = 'created_at',
+              sort_order: str = 'DESC', limit: int = 100, offset: int = 0,
+              columns: Optional[List[str]] = None) -> Tuple[List[Dict], int]:
+        """One page of courses and the total number matching, like the SQL course list"""
+        if sort_by not in SORT_FIELDS:
+            raise ValueError(f'Invalid sort_by. Must be one of: {list(SORT_FIELDS)}')
+        if sort_order.upper() not in SORT_ORDERS:
+            raise ValueError(f'Invalid sort_order. Must be one of: {list(SORT_ORDERS)}')
+        if limit < 0 or offset < 0:
+            raise ValueError('limit and offset must not be negative')
+        start = time.perf_counter()
+        if time.monotonic() - self.checked_at >= self.sync_interval:
+            self.sync()
+
+        with self._lock:
+            mask = self._alive[:self.size].copy()
+            for field, value in (('category', category), ('status', status)):
+                if value:
+                    code = self.strings.lookup(value)
+                    if code is None:
+                        mask[:] = False
+                    else:
+                        mask &= self._codes[field][:self.size] == code
+            if search:
+                needle = search.lower()
+                mask &= np.fromiter((needle in text for text in self._search), dtype=bool, count=self.size)
+
+            order = self._order(sort_by)
+            if sort_order.upper() == 'DESC':
+                order = order[::-1]
+            matched = order[mask[order]]
+            page = matched[offset:offset + limit]
+            courses = [self._row(row, columns or list(FIELDS)) for row in page]
+
+        catalog_query_duration_seconds.observe(time.perf_counter() - start)
+        return courses, int(matched.size)
+
+    def _order(self, field: str) -> np.ndarray:
+        """Row positions sorted ascending by field (NULLs first, like SQLite), cached until it changes"""
+        order = self._orders.get(field)
+        if order is None or order.size != self.size:
+            if field in NUMERIC_FIELDS:
+                keys = np.nan_to_num(self._numeric[field][:self.size], nan=-np.inf)
+            elif field in CATEGORICAL_FIELDS:
+                keys = np.array(['' if value is None else value for value in
+                                 (self.strings.decode(code) for code in self._codes[field][:self.size])],
+                                dtype=object)
+            else:
+                keys = np.array(['' if value is None else value for value in self._text[field]], dtype=object)
+            order = np.argsort(keys, kind='stable')
+            self._orders[field] = order
+        return order
+
+    def _value(self, field: str, row: int):
+        if field in NUMERIC_FIELDS:
+            value = self._numeric[field][row]
+            return None if math.isnan(value) else NUMERIC_FIELDS[field](value)
+        if field in CATEGORICAL_FIELDS:
+            return self.strings.decode(int(self._codes[field][row]))
+        return self._text[field][row]
+
+    def _row(self, row: int, columns) -> Dict:
+        return {field: self._value(field, row) for field in columns}
+
+    def status(self) -> Dict:
+        with self._lock:
+            nbytes = sum(column.nbytes for column in self._codes.values()) + \
+                sum(column.nbytes for column in self._numeric.values()) + self._alive.nbytes
+            return {
+                'courses': self.size - self.dead,
+                'deleted_rows': self.dead,
+                'version': self.version,
+                'sync_interval_seconds': self.sync_interval,
+                'interned_strings': len(self.strings.values),
+                'cached_sort_orders': sorted(self._orders),
+                'column_bytes': nbytes
+            }
@@ -0,0 +1,248 @@
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+certificates_issued_total = metrics.registry.counter(
+    'certificates_issued_total', 'Certificates rendered and marked as issued')
+certificate_chunk_duration_seconds = metrics.registry.histogram(
+    'certificate_chunk_duration_seconds', 'Time to render and mark one chunk of certificates')
+
+PAGE_WIDTH, PAGE_HEIGHT = 842, 595  # A4 landscape, in points
+
+
+def _pdf_text(value: str) -> str:
+    """Escape text for a PDF string literal (Helvetica uses Latin-1)"""
+    value = str(value or '').encode('latin-1', 'replace').decode('latin-1')
+    return value.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def _centered(text: str, size: int, y: int, font: str = 'F1') -> str:
+    # Helvetica averages roughly half an em per character
+    width = len(text) * size * 0.5
+    x = max(40, (PAGE_WIDTH - width) / 2)
+    return f'BT /{font} {size} Tf {x:.1f} {y} Td ({_pdf_text(text)}) Tj ET\n'
+
+
+def render_certificate_pdf(certificate: Dict) -> bytes:
+    """Build a single-page certificate PDF without third-party libraries"""
+    completed = (certificate.get('completion_date') or '')[:10]
+    lines = [
+        '0.55 0.1 0.3 RG 6 w 24 24 794 547 re S\n',
+        '1 w 36 36 770 523 re S\n',
+        _centered('IRON LADY', 18, 500, 'F2'),
+        _centered('Certificate of Completion', 34, 440, 'F2'),
+        _centered('This certifies that', 16, 380),
+        _centered(certificate.get('student_name') or 'Iron Lady Learner', 30, 330, 'F2'),
+        _centered('has successfully completed', 16, 280),
+        _centered(certificate.get('course_title') or 'Iron Lady Program', 24, 235, 'F2'),
+    ]
+    if certificate.get('instructor'):
+        lines.append(_centered(f"Instructor: {certificate['instructor']}", 14, 190))
+    details = f'Completed on {completed}' if completed else 'Completed'
+    if certificate.get('grade'):
+        details += f" with grade {certificate['grade']}"
+    lines.append(_centered(details, 14, 165))
+    lines.append(f"BT /F1 10 Tf 60 60 Td (Certificate ID: {_pdf_text(certificate['certificate_id'])}) Tj ET\n")
+    lines.append('BT /F1 10 Tf 600 60 Td (iamironlady.com) Tj ET\n')
+    content = ''.join(lines).encode('latin-1')
+
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        (f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] '
+         f'/Contents 4 0 R /Resources << /Font << /F1 5 0 R /F2 6 0 R >> >> >>').encode('latin-1'),
+        b'<< /Length ' + str(len(content)).encode() + b' >>\nstream\n' + content + b'endstream',
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>',
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold >>',
+    ]
+    output = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(output))
+        output += f'{number} 0 obj\n'.encode() + body + b'\nendobj\n'
+    xref_offset = len(output)
+    output += f'xref\n0 {len(objects) + 1}\n0000000000 65535 f \n'.encode()
+    for offset in offsets:
+        output += f'{offset:010d} 00000 n \n'.encode()
+    output += f'trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n'.encode()
+    return bytes(output)
+
+
+def render_certificate_file(args: Tuple[Dict, str]) -> str:
+    """Process-pool worker: render one certificate and atomically write it"""
+    certificate, output_dir = args
+    path = os.path.join(output_dir, f"{certificate['enrollment_id']}.pdf")
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(render_certificate_pdf(certificate))
+    os.replace(tmp_path, path)
+    return certificate['enrollment_id']
+
+
+def process_context():
+    """Start method for the render pool.
+
+    fork would copy this multi-threaded process (request threads, background
+    workers, locks held by them) into every child. forkserver forks the
+    workers from a single-threaded server process instead; spawn is the
+    fallback where it is unavailable. Either way a worker imports the main
+    module again (as __mp_main__), so the app skips its start-up side
+    effects in multiprocessing children."""
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+class CertificateIssuer:
+    """Issues certificates for completed enrollments in the background.
+
+    Completed, unissued enrollments are selected in key order, one chunk at
+    a time; each chunk is rendered across a process pool and then marked as
+    issued in a single transaction. Progress lives in the
+    `certificate_issued` flag itself, so a crashed or stopped job resumes
+    where it left off (a chunk rendered but not yet marked is simply
+    rendered again, overwriting the same files)."""
+
+    def __init__(self, database, output_dir: str = 'certificates', workers: Optional[int] = None,
+                 chunk_size: int = 200):
+        self.database = database
+        self.output_dir = output_dir
+        self.workers = workers or os.cpu_count() or 2
+        self.chunk_size = chunk_size
+        self.job: Optional[Dict] = None
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+
+    def certificate_path(self, enrollment_id: str) -> str:
+        return os.path.join(self.output_dir, f'{os.path.basename(enrollment_id)}.pdf')
+
+    def start(self, limit: Optional[int] = None) -> Dict:
+        """Start an issuance job on a background thread"""
+        with self._lock:
+            if self.job and self.job['status'] == 'running':
+                raise RuntimeError('A certificate job is already running')
+            self._cancel.clear()
+            self.job = {
+                'job_id': str(uuid.uuid4()),
+                'status': 'running',
+                'issued': 0,
+                'limit': limit,
+                'started_at': datetime.now().isoformat(),
+                'finished_at': None,
+                'error': None
+            }
+            job = self.job
+        threading.Thread(target=self._run_job, args=(job,), name='certificate-issuer', daemon=True).start()
+        return dict(job)
+
+    def cancel(self):
+        self._cancel.set()
+
+    def status(self) -> Dict:
+        return {'pending': self.count_pending(), 'job': dict(self.job) if self.job else None}
+
+    def count_pending(self) -> int:
+        conn = self.database.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT COUNT(*) FROM enrollments
+                WHERE completion_date IS NOT NULL AND COALESCE(certificate_issued, 0) = 0
+            ''')
+            return cursor.fetchone()[0]
+        finally:
+            conn.close()
+
+    def _run_job(self, job: Dict):
+        try:
+            self.issue(job)
+            job['status'] = 'cancelled' if self._cancel.is_set() else 'completed'
+        except Exception as e:
+            logger.error(f"Certificate job failed: {e}")
+            job['status'] = 'failed'
+            job['error'] = str(e)
+        finally:
+            job['finished_at'] = datetime.now().isoformat()
+
+    def _fetch_chunk(self, after_pk: int, size: int) -> List[Tuple[int, Dict]]:
+        conn = self.database.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT e.pk, e.id, e.completion_date, e.grade, s.name, c.title, c.instructor
+                FROM enrollments e
+                LEFT JOIN students s ON s.pk = e.student_pk
+                LEFT JOIN courses c ON c.pk = e.course_pk
+                WHERE e.completion_date IS NOT NULL
+                  AND COALESCE(e.certificate_issued, 0) = 0
+                  AND e.pk > ?
+                ORDER BY e.pk
+                LIMIT ?
+            ''', (after_pk, size))
+            return [
+                (row[0], {
+                    'enrollment_id': row[1],
+                    'completion_date': row[2],
+                    'grade': row[3],
+                    'student_name': row[4],
+                    'course_title': row[5],
+                    'instructor': row[6],
+                    'certificate_id': f'IL-{row[1].replace("-", "")[:12].upper()}'
+                })
+                for row in cursor.fetchall()
+            ]
+        finally:
+            conn.close()
+
+    def _mark_issued(self, enrollment_ids: List[str]):
+        conn = self.database.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.executemany('UPDATE enrollments SET certificate_issued = 1 WHERE id = ?',
+                               [(enrollment_id,) for enrollment_id in enrollment_ids])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def issue(self, job: Optional[Dict] = None) -> int:
+        """Render and mark every pending certificate (up to the job limit)"""
+        job = job if job is not None else {'issued': 0, 'limit': None}
+        os.makedirs(self.output_dir, exist_ok=True)
+
+        last_pk = 0
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=process_context()) as pool:
+            while not self._cancel.is_set():
+                size = self.chunk_size
+                if job['limit'] is not None:
+                    size = min(size, job['limit'] - job['issued'])
+                    if size <= 0:
+                        break
+                chunk = self._fetch_chunk(last_pk, size)
+                if not chunk:
+                    break
+
+                chunk_start = time.perf_counter()
+                tasks = [(certificate, self.output_dir) for _, certificate in chunk]
+                per_worker = max(1, len(tasks) // (self.workers * 4))
+                rendered = list(pool.map(render_certificate_file, tasks, chunksize=per_worker))
+                self._mark_issued(rendered)
+
+                last_pk = chunk[-1][0]
+                job['issued'] += len(rendered)
+                certificates_issued_total.inc(amount=len(rendered))
+                certificate_chunk_duration_seconds.observe(time.perf_counter() - chunk_start)
+                logger.info(f"Issued {len(rendered)} certificates ({job['issued']} this job)")
+        return job['issued']
@@ -0,0 +1,137 @@
+import json
+import logging
+import threading
+from collections import deque
+from itertools import islice
+from typing import Dict, Optional
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+change_events_total = metrics.registry.counter(
+    'change_events_total', 'Change events published to the stream', ('event_type',))
+change_stream_connections_total = metrics.registry.counter(
+    'change_stream_connections_total', 'Change stream subscriptions opened and closed', ('state',))
+
+KEEPALIVE_FRAME = ': keepalive\n\n'
+
+
+class Subscription:
+    """One client's position in the hub's event buffer.
+
+    This is all the state a connection holds: an event id cursor and at
+    most one pending frame. It is also the response body iterable, so
+    closing the response (client gone) unsubscribes it."""
+
+    __slots__ = ('hub', 'cursor', 'pending', 'closed')
+
+    def __init__(self, hub: 'ChangeHub', cursor: int, pending: str):
+        self.hub = hub
+        self.cursor = cursor
+        self.pending = pending
+        self.closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        if self.closed:
+            raise StopIteration
+        if self.pending:
+            frame, self.pending = self.pending, ''
+            return frame
+        return self.hub._next_frames(self)
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.hub._unsubscribe()
+
+
+class ChangeHub:
+    """Fans course change events out to server-sent event subscribers.
+
+    Each event is formatted once and appended to a single bounded buffer
+    with increasing ids. Subscribers are cursors into that buffer that wait
+    on one shared condition. Publishing is one append and one notify,
+    however many clients listen, and an idle connection holds no queue of
+    its own. A client that reconnects with Last-Event-ID resumes from the
+    buffer. A client that fell behind the buffer (or ids from before a
+    restart) gets a `reset` event and reloads instead."""
+
+    def __init__(self, history: int = 1000, heartbeat: float = 15.0, max_subscribers: int = 10000,
+                 retry_ms: int = 3000):
+        self.history = history
+        self.heartbeat = heartbeat
+        self.max_subscribers = max_subscribers
+        self.retry_ms = retry_ms
+        self.subscribers = 0
+        self._last_id = 0
+        self._events: deque = deque(maxlen=history)
+        self._condition = threading.Condition()
+
+    def publish(self, event_type: str, data: Dict) -> int:
+        """Broadcast an event; returns its id"""
+        payload = json.dumps(data, separators=(',', ':'), default=str)
+        with self._condition:
+            self._last_id += 1
+            event_id = self._last_id
+            self._events.append((event_id, f'id: {event_id}\nevent: {event_type}\ndata: {payload}\n\n'))
+            self._condition.notify_all()
+        change_events_total.inc(event_type)
+        return event_id
+
+    def subscribe(self, last_event_id: Optional[str] = None) -> Subscription:
+        """Open a subscription, resuming after last_event_id when it is still buffered"""
+        with self._condition:
+            if self.subscribers >= self.max_subscribers:
+                raise RuntimeError('Too many change stream subscribers')
+            self.subscribers += 1
+            cursor = self._last_id
+            pending = f'retry: {self.retry_ms}\n\n'
+            if last_event_id:
+                try:
+                    resume_from = int(last_event_id)
+                except ValueError:
+                    resume_from = -1
+                if self._resumable(resume_from):
+                    cursor = resume_from
+                else:
+                    pending += self._reset_frame()
+        change_stream_connections_total.inc('opened')
+        return Subscription(self, cursor, pending)
+
+    def _resumable(self, event_id: int) -> bool:
+        oldest = self._events[0][0] if self._events else self._last_id + 1
+        return oldest - 1 <= event_id <= self._last_id
+
+    def _reset_frame(self) -> str:
+        return f'id: {self._last_id}\nevent: reset\ndata: {{}}\n\n'
+
+    def _next_frames(self, subscription: Subscription) -> str:
+        """Block until there are events past the subscription's cursor, or a heartbeat is due"""
+        with self._condition:
+            if subscription.cursor >= self._last_id:
+                self._condition.wait(self.heartbeat)
+            if subscription.cursor >= self._last_id:
+                return KEEPALIVE_FRAME
+            if not self._resumable(subscription.cursor):
+                subscription.cursor = self._last_id
+                return self._reset_frame()
+            start = len(self._events) - (self._last_id - subscription.cursor)
+            frames = [frame for _, frame in islice(self._events, start, None)]
+            subscription.cursor = self._last_id
+        return ''.join(frames)
+
+    def _unsubscribe(self):
+        with self._condition:
+            self.subscribers -= 1
+        change_stream_connections_total.inc('closed')
+
+    def status(self) -> Dict:
+        return {
+            'subscribers': self.subscribers,
+            'last_event_id': self._last_id,
+            'buffered_events': len(self._events)
+        }
@@ -1,8 +1,13 @@
-import openai
 import os
 import re
 import json
+import itertools
+import queue
+import threading
 from datetime import datetime
+import llm_client
+
+GREETING_PROMPT = "Hello! I'm interested in learning about Iron Lady's programs."
 
 class AIEnhancedIronLadyChatbot:
     def __init__(self):
@@ -62,6 +67,12 @@ class AIEnhancedIronLadyChatbot:
         # Conversation history for context
         self.conversation_history = []
         
+        # Built once; it only depends on the knowledge base
+        self.system_prompt = self.create_system_prompt()
+        
+        # The greeting is generated while the banner prints and the user starts typing
+        self.greeting = self.start_greeting() if self.use_openai else None
+        
     def setup_openai(self):
         """Setup OpenAI client with API key"""
         # Try to get API key from environment variable
@@ -83,21 +94,13 @@ class AIEnhancedIronLadyChatbot:
                 self.use_openai = False
                 return
         
-        try:
-            openai.api_key = api_key
-            # Test the API key with a simple request
-            test_response = openai.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[{"role": "user", "content": "Hello"}],
-                max_tokens=5
-            )
-            self.use_openai = True
-            print("✅ OpenAI integration activated!")
-            
-        except Exception as e:
-            print(f"❌ OpenAI setup failed: {e}")
-            print("📝 Using fallback mode (rule-based responses)")
-            self.use_openai = False
+        # Shared client: pooled connections, deadlines, retries and a circuit breaker.
+        # No blocking test call: the streamed greeting checks the key, and a
+        # rejected key switches the chatbot to fallback mode.
+        self.llm = llm_client.from_env(api_key)
+        self.use_openai = True
+        self.llm_verified = False
+        print("🔑 OpenAI API key found; the opening greeting will confirm it")
 
     def create_system_prompt(self):
         """Create a comprehensive system prompt for the AI"""
@@ -128,39 +131,82 @@ RESPONSE STYLE:
 
 Remember: You represent Iron Lady's mission of empowering women leaders!"""
 
-    def get_ai_response(self, user_input):
-        """Get response from OpenAI GPT"""
+    def stream_ai_response(self, user_input):
+        """Yield the response from OpenAI GPT as it is generated, or the fallback response"""
+        self.conversation_history.append({"role": "user", "content": user_input})
+        messages = [
+            {"role": "system", "content": self.system_prompt}
+        ] + self.conversation_history[-10:]
+        
+        parts = []
         try:
-            # Add user message to conversation history
-            self.conversation_history.append({"role": "user", "content": user_input})
-            
-            # Keep only last 10 messages for context (to manage token limits)
-            recent_history = self.conversation_history[-10:]
-            
-            # Create messages array with system prompt
-            messages = [
-                {"role": "system", "content": self.create_system_prompt()}
-            ] + recent_history
-            
-            response = openai.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=messages,
+            for token in self.llm.stream_chat(
+                'chatbot',
+                messages,
                 max_tokens=300,
                 temperature=0.7,
                 presence_penalty=0.6,
                 frequency_penalty=0.3
-            )
-            
-            ai_response = response.choices[0].message.content.strip()
-            
-            # Add AI response to conversation history
-            self.conversation_history.append({"role": "assistant", "content": ai_response})
-            
-            return ai_response
-            
-        except Exception as e:
-            print(f"❌ AI Error: {e}")
-            return self.get_fallback_response(user_input)
+            ):
+                parts.append(token)
+                yield token
+        except llm_client.LLMUnavailable as e:
+            # The question got no AI answer, so it does not belong in the context
+            self.conversation_history.pop()
+            if isinstance(e, llm_client.LLMRejected):
+                # Bad key or request: stop calling the API for this session
+                self.use_openai = False
+            # Whatever was already shown stays; the fallback follows it
+            yield ("\n\n" if parts else "") + self.get_fallback_response(user_input)
+            return
+        except BaseException:
+            # Cancelled mid-reply (Ctrl+C, or the generator was closed); the
+            # HTTP stream has been closed on the way out
+            self.conversation_history.pop()
+            raise
+        
+        self.llm_verified = True
+        self.conversation_history.append({"role": "assistant", "content": "".join(parts).strip()})
+
+    def start_greeting(self):
+        """Request the initial greeting in the background; returns an iterator over its tokens"""
+        tokens = queue.Queue()
+        
+        def generate():
+            try:
+                for token in self.stream_ai_response(GREETING_PROMPT):
+                    tokens.put(token)
+            finally:
+                tokens.put(None)
+        
+        threading.Thread(target=generate, name='greeting', daemon=True).start()
+        return iter(tokens.get, None)
+
+    def print_greeting(self):
+        """Print the greeting over the already visible prompt once it starts arriving, then prompt again"""
+        first = next(self.greeting, None)
+        if first is not None:
+            print("\r", end="")
+            self.print_reply(itertools.chain([first], self.greeting))
+        if self.llm_verified:
+            print("✅ OpenAI integration activated!")
+        elif not self.use_openai:
+            print("📝 OpenAI rejected the key; using fallback mode (rule-based responses)")
+        else:
+            print("⚠️  OpenAI is not answering; rule-based responses are used until it does")
+        print("\nYou: ", end="", flush=True)
+
+    def print_reply(self, tokens):
+        """Print a reply token by token as it arrives; Ctrl+C stops the reply, not the chat"""
+        print("🤖 Assistant: ", end="", flush=True)
+        try:
+            for token in tokens:
+                print(token, end="", flush=True)
+        except KeyboardInterrupt:
+            if hasattr(tokens, 'close'):
+                tokens.close()
+            print(" [stopped]", end="")
+        print("\n")
 
     def get_fallback_response(self, user_input):
         """Fallback to rule-based responses when OpenAI is unavailable"""
@@ -225,10 +271,12 @@ What would you like to know more about?"""
         print("Ask me anything about Iron Lady's leadership programs!")
         print("Type 'quit', 'exit', or 'bye' to end our conversation.\n")
         
-        # Initial greeting
-        if self.use_openai:
-            initial_greeting = self.get_ai_response("Hello! I'm interested in learning about Iron Lady's programs.")
-            print(f"🤖 Assistant: {initial_greeting}\n")
+        # Initial greeting, already being generated since start-up. The prompt is
+        # shown at once and the greeting prints over it as it streams in.
+        greeting_printer = None
+        if self.greeting is not None:
+            greeting_printer = threading.Thread(target=self.print_greeting, name='greeting-printer', daemon=True)
+            greeting_printer.start()
         else:
             print("📝 Assistant: Hello! I'm here to help you learn about Iron Lady's leadership programs. What would you like to know?\n")
         
@@ -236,6 +284,11 @@ What would you like to know more about?"""
             try:
                 user_input = input("You: ").strip()
                 
+                # The first reply waits for the greeting so the two never interleave
+                if greeting_printer is not None:
+                    greeting_printer.join()
+                    greeting_printer = None
+                
                 if not user_input:
                     print("🤖 Assistant: I'm here when you're ready to ask something!\n")
                     continue
@@ -245,13 +298,13 @@ What would you like to know more about?"""
                     print(f"\n🤖 Assistant: {farewell}")
                     break
                 
-                # Get response (AI or fallback)
+                # Stream the AI response as it is generated, or print the fallback
                 if self.use_openai:
-                    response = self.get_ai_response(user_input)
+                    print()
+                    self.print_reply(self.stream_ai_response(user_input))
                 else:
                     response = self.get_fallback_response(user_input)
-                
-                print(f"\n🤖 Assistant: {response}\n")
+                    print(f"\n🤖 Assistant: {response}\n")
                 print("-" * 65)
                 
             except KeyboardInterrupt:
@@ -0,0 +1,134 @@
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+delta_sync_rows_total = metrics.registry.counter(
+    'delta_sync_rows_total', 'Course changes returned by delta sync', ('op',))
+
+MAX_PAGE_SIZE = 5000
+
+
+class ResyncRequired(Exception):
+    """The requested version is older than the oldest tombstone still kept"""
+
+
+class CourseChangeLog:
+    """Answers "what changed in the catalog since version N".
+
+    Every insert or update of a course takes the next value of the
+    change_clock and stores it in courses.version. Every delete leaves a
+    row in course_tombstones with its own version. This is done by
+    triggers, so bulk jobs, imports and counters are covered too. SQLite
+    has a single writer, so versions are handed out in commit order. A
+    reader that has seen everything up to N therefore never needs
+    anything at or below N again.
+
+    Tombstones are pruned after `tombstone_retention_days`. Clients whose
+    version is older than the newest pruned tombstone must resync from 0."""
+
+    def __init__(self, database, tombstone_retention_days: int = 30, prune_interval: float = 3600.0):
+        self.database = database
+        self.tombstone_retention_days = tombstone_retention_days
+        self.prune_interval = prune_interval
+        self._pruned_at = 0.0
+        self._lock = threading.Lock()
+
+    def changes_since(self, since: int, limit: int, columns: List[str]) -> Dict:
+        """Upserts and deletes with version > since, oldest first, at most `limit` of them"""
+        if since < 0:
+            raise ValueError('since must be a non-negative version')
+        if not 1 <= limit <= MAX_PAGE_SIZE:
+            raise ValueError(f'limit must be between 1 and {MAX_PAGE_SIZE}')
+        self._maybe_prune()
+
+        conn = self.database.get_connection()
+        try:
+            cursor = conn.cursor()
+            # One read transaction, so the clock and both tables agree (a batch already has one)
+            if not conn.in_transaction:
+                cursor.execute('BEGIN')
+            cursor.execute('SELECT version, pruned_version FROM change_clock WHERE id = 1')
+            current_version, pruned_version = cursor.fetchone()
+            if 0 < since < pruned_version:
+                raise ResyncRequired(f'Version {since} is older than retained deletes ({pruned_version}); '
+                                     f'resync from 0')
+
+            select_columns = columns if 'version' in columns else columns + ['version']
+            cursor.execute(f'''
+                SELECT {", ".join(select_columns)} FROM courses
+                WHERE version > ? ORDER BY version LIMIT ?
+            ''', (since, limit + 1))
+            upserts = [dict(zip(select_columns, row)) for row in cursor.fetchall()]
+
+            deletes = []
+            # A full sync (since 0) starts from an empty mirror, so it needs no deletes
+            if since > 0:
+                cursor.execute('''
+                    SELECT version, course_id, deleted_at FROM course_tombstones
+                    WHERE version > ? ORDER BY version LIMIT ?
+                ''', (since, limit + 1))
+                deletes = [{'version': version, 'id': course_id, 'deleted_at': deleted_at}
+                           for version, course_id, deleted_at in cursor.fetchall()]
+            conn.rollback()
+        finally:
+            conn.close()
+
+        changes = sorted(
+            [{'op': 'upsert', 'version': row['version'], 'course': row} for row in upserts] +
+            [{'op': 'delete', **row} for row in deletes],
+            key=lambda change: change['version']
+        )
+        has_more = len(changes) > limit
+        changes = changes[:limit]
+        for change in changes:
+            delta_sync_rows_total.inc(change['op'])
+
+        return {
+            'changes': changes,
+            'since': since,
+            'next_since': changes[-1]['version'] if has_more else max(since, current_version),
+            'current_version': current_version,
+            'has_more': has_more
+        }
+
+    def _maybe_prune(self):
+        if time.time() - self._pruned_at < self.prune_interval:
+            return
+        with self._lock:
+            if time.time() - self._pruned_at < self.prune_interval:
+                return
+            self._pruned_at = time.time()
+        try:
+            self.prune_tombstones()
+        except Exception as e:
+            logger.error(f"Error pruning course tombstones: {e}")
+
+    def prune_tombstones(self, now: Optional[datetime] = None) -> int:
+        """Drop tombstones past retention and move the resync horizon up to them"""
+        cutoff = ((now or datetime.now()) - timedelta(days=self.tombstone_retention_days)).isoformat()
+        conn = self.database.get_connection()
+        if conn.in_transaction:
+            # A batch's read-only snapshot; prune on the next call instead
+            self._pruned_at = 0.0
+            return 0
+        try:
+            cursor = conn.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute('SELECT MAX(version), COUNT(*) FROM course_tombstones WHERE deleted_at < ?', (cutoff,))
+            horizon, count = cursor.fetchone()
+            if count:
+                cursor.execute('DELETE FROM course_tombstones WHERE deleted_at < ?', (cutoff,))
+                cursor.execute('UPDATE change_clock SET pruned_version = MAX(pruned_version, ?) WHERE id = 1',
+                               (horizon,))
+            conn.commit()
+        finally:
+            conn.close()
+        if count:
+            logger.info(f"Pruned {count} course tombstones up to version {horizon}")
+        return count
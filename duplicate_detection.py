@@ -0,0 +1,254 @@
+import logging
+import re
+import threading
+import time
+import zlib
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+duplicate_checks_total = metrics.registry.counter(
+    'duplicate_checks_total', 'Courses checked for near-duplicates', ('result',))
+duplicate_candidates = metrics.registry.histogram(
+    'duplicate_candidates', 'LSH candidates verified per duplicate check', buckets=(0, 1, 2, 5, 10, 50, 100, 500))
+
+ON_DUPLICATE = ('flag', 'skip', 'allow')
+# Mersenne prime for the (a * x + b) mod p permutations; a, b and x stay below 2^31/2^32
+# so the products fit in uint64
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_NON_WORD = re.compile(r'[^a-z0-9]+')
+
+
+def normalize(*parts: Optional[str]) -> str:
+    """Lowercase words of the given fields, punctuation and extra whitespace dropped"""
+    return ' '.join(word for part in parts if part for word in _NON_WORD.sub(' ', part.lower()).split())
+
+
+class DuplicateDetector:
+    """Finds near-duplicate courses with MinHash signatures and an LSH index.
+
+    A course's title, description and instructor are normalized and cut into
+    overlapping character shingles. MinHash compresses the shingle set into
+    `num_perm` values, and the share of equal values estimates the Jaccard
+    similarity of two courses. The signature is split into `bands`. Courses
+    that agree on a whole band share a bucket. A lookup therefore only
+    verifies the few courses sharing one of its buckets, instead of
+    comparing against the whole catalog.
+
+    The index follows the catalog through the change clock, like the
+    catalog engine. Only courses whose text changed are re-signed."""
+
+    def __init__(self, database, threshold: float = 0.8, num_perm: int = 64, bands: int = 8,
+                 shingle_size: int = 5, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError('num_perm must be a multiple of bands')
+        self.database = database
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows_per_band = num_perm // bands
+        self.shingle_size = shingle_size
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, 1 << 31, size=num_perm).astype(np.uint64)
+        self._b = rng.randint(0, 1 << 31, size=num_perm).astype(np.uint64)
+        self.version = -1
+        self._lock = threading.RLock()
+        self.reset()
+
+    def reset(self):
+        """Forget the index; the next sync rebuilds it from the database"""
+        with self._lock:
+            self.version = -1
+            self._signatures: Dict[str, np.ndarray] = {}
+            self._text_hashes: Dict[str, int] = {}
+            self._titles: Dict[str, str] = {}
+            self._buckets: List[Dict[bytes, Set[str]]] = [{} for _ in range(self.bands)]
+
+    # Signatures
+
+    def signature(self, title: str, description: str, instructor: str) -> Tuple[Optional[np.ndarray], int]:
+        """MinHash signature and text hash of a course; no signature for empty text"""
+        text = normalize(title, description, instructor)
+        if not text:
+            return None, 0
+        k = self.shingle_size
+        shingles = {text[i:i + k] for i in range(max(1, len(text) - k + 1))}
+        hashes = np.fromiter((zlib.crc32(shingle.encode('utf-8')) for shingle in shingles),
+                             dtype=np.uint64, count=len(shingles))
+        permuted = (self._a[:, None] * hashes[None, :] + self._b[:, None]) % MERSENNE_PRIME
+        return permuted.min(axis=1).astype(np.uint32), zlib.crc32(text.encode('utf-8'))
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        r = self.rows_per_band
+        return [signature[band * r:(band + 1) * r].tobytes() for band in range(self.bands)]
+
+    # Index
+
+    def add(self, course_id: str, title: str, signature: Optional[np.ndarray], text_hash: int):
+        with self._lock:
+            if self._text_hashes.get(course_id) == text_hash and course_id in self._signatures:
+                self._titles[course_id] = title
+                return
+            self.remove(course_id)
+            if signature is None:
+                return
+            self._signatures[course_id] = signature
+            self._text_hashes[course_id] = text_hash
+            self._titles[course_id] = title
+            for buckets, key in zip(self._buckets, self._band_keys(signature)):
+                buckets.setdefault(key, set()).add(course_id)
+
+    def remove(self, course_id: str):
+        with self._lock:
+            signature = self._signatures.pop(course_id, None)
+            self._text_hashes.pop(course_id, None)
+            self._titles.pop(course_id, None)
+            if signature is None:
+                return
+            for buckets, key in zip(self._buckets, self._band_keys(signature)):
+                members = buckets.get(key)
+                if members is not None:
+                    members.discard(course_id)
+                    if not members:
+                        del buckets[key]
+
+    def sync(self) -> int:
+        """Apply course changes committed since the index's version; returns rows applied"""
+        with self._lock:
+            conn = self.database.get_connection()
+            try:
+                cursor = conn.cursor()
+                if not conn.in_transaction:
+                    cursor.execute('BEGIN')
+                cursor.execute('SELECT version, pruned_version FROM change_clock WHERE id = 1')
+                current_version, pruned_version = cursor.fetchone()
+                if current_version == self.version:
+                    return 0
+                full = self.version < 0 or self.version < pruned_version
+                since = -1 if full else self.version
+                cursor.execute('SELECT id, title, description, instructor FROM courses WHERE version > ?', (since,))
+                rows = cursor.fetchall()
+                deleted = []
+                if not full:
+                    cursor.execute('SELECT course_id FROM course_tombstones WHERE version > ?', (since,))
+                    deleted = [row[0] for row in cursor.fetchall()]
+                conn.rollback()
+            finally:
+                conn.close()
+
+            start = time.perf_counter()
+            if full:
+                self.reset()
+            for course_id in deleted:
+                self.remove(course_id)
+            for course_id, title, description, instructor in rows:
+                text_hash = zlib.crc32(normalize(title, description, instructor).encode('utf-8'))
+                if self._text_hashes.get(course_id) == text_hash:
+                    self._titles[course_id] = title
+                    continue
+                self.add(course_id, title, *self.signature(title, description, instructor))
+            self.version = current_version
+            if full:
+                logger.info(f"Indexed {len(self._signatures)} courses for duplicate detection "
+                            f"in {time.perf_counter() - start:.2f}s")
+            return len(rows) + len(deleted)
+
+    # Lookups
+
+    def similarity(self, left: np.ndarray, right: np.ndarray) -> float:
+        return float(np.count_nonzero(left == right)) / self.num_perm
+
+    def _candidates(self, signature: np.ndarray) -> Set[str]:
+        candidates = set()
+        for buckets, key in zip(self._buckets, self._band_keys(signature)):
+            candidates |= buckets.get(key, set())
+        return candidates
+
+    def find(self, signature: Optional[np.ndarray], exclude: Optional[str] = None, limit: int = 5) -> List[Dict]:
+        """Indexed courses at or above the threshold, most similar first"""
+        if signature is None:
+            return []
+        with self._lock:
+            candidates = self._candidates(signature)
+            candidates.discard(exclude)
+            duplicate_candidates.observe(len(candidates))
+            matches = []
+            if candidates:
+                candidates = list(candidates)
+                # One vectorized comparison against every candidate's signature
+                stacked = np.stack([self._signatures[course_id] for course_id in candidates])
+                similarities = np.count_nonzero(stacked == signature, axis=1) / self.num_perm
+                for index in np.flatnonzero(similarities >= self.threshold):
+                    course_id = candidates[index]
+                    matches.append({'course_id': course_id, 'title': self._titles.get(course_id),
+                                    'similarity': round(float(similarities[index]), 3)})
+        matches.sort(key=lambda match: -match['similarity'])
+        duplicate_checks_total.inc('duplicate' if matches else 'unique')
+        return matches[:limit]
+
+    def check(self, title: str, description: str, instructor: str) -> Tuple[Optional[np.ndarray], int, List[Dict]]:
+        """Signature, text hash and indexed near-duplicates of a course that is about to be written"""
+        signature, text_hash = self.signature(title, description, instructor)
+        return signature, text_hash, self.find(signature)
+
+    def clusters(self, threshold: Optional[float] = None, limit: int = 100) -> Dict:
+        """Groups of near-duplicate courses across the catalog, largest first"""
+        threshold = self.threshold if threshold is None else threshold
+        self.sync()
+        with self._lock:
+            parent: Dict[str, str] = {}
+
+            def root(course_id):
+                parent.setdefault(course_id, course_id)
+                while parent[course_id] != course_id:
+                    parent[course_id] = parent[parent[course_id]]
+                    course_id = parent[course_id]
+                return course_id
+
+            # Only courses sharing a bucket are compared; pairs already joined are skipped
+            compared = 0
+            for buckets in self._buckets:
+                for members in buckets.values():
+                    if len(members) < 2:
+                        continue
+                    members = sorted(members)
+                    for index, left in enumerate(members):
+                        for right in members[index + 1:]:
+                            left_root, right_root = root(left), root(right)
+                            if left_root == right_root:
+                                continue
+                            compared += 1
+                            if self.similarity(self._signatures[left], self._signatures[right]) >= threshold:
+                                parent[right_root] = left_root
+
+            groups: Dict[str, List[str]] = {}
+            for course_id in list(parent):
+                groups.setdefault(root(course_id), []).append(course_id)
+            clusters = []
+            for members in groups.values():
+                members = sorted(set(members))
+                if len(members) < 2:
+                    continue
+                signatures = [self._signatures[course_id] for course_id in members]
+                anchor = signatures[0]
+                clusters.append({
+                    'size': len(members),
+                    'min_similarity': round(min(self.similarity(anchor, other) for other in signatures[1:]), 3),
+                    'courses': [{'course_id': course_id, 'title': self._titles.get(course_id)}
+                                for course_id in members]
+                })
+            indexed = len(self._signatures)
+
+        clusters.sort(key=lambda cluster: -cluster['size'])
+        return {
+            'threshold': threshold,
+            'indexed_courses': indexed,
+            'pairs_compared': compared,
+            'total_clusters': len(clusters),
+            'duplicate_courses': sum(cluster['size'] for cluster in clusters),
+            'clusters': clusters[:limit]
+        }
@@ -0,0 +1,256 @@
+import logging
+import os
+import random
+import threading
+import time
+from typing import Dict, Iterator, List, Optional
+
+import openai
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+llm_retries_total = metrics.registry.counter(
+    'llm_retries_total', 'LLM calls retried after a transient failure, by caller', ('component',))
+llm_rejected_total = metrics.registry.counter(
+    'llm_rejected_total', 'LLM calls answered by the fallback without reaching the API', ('component', 'reason'))
+llm_circuit_transitions_total = metrics.registry.counter(
+    'llm_circuit_transitions_total', 'Circuit breaker state changes', ('state',))
+llm_time_to_first_token_seconds = metrics.registry.histogram(
+    'llm_time_to_first_token_seconds', 'Time from a streaming call to its first token, by caller', ('component',),
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0))
+
+# Errors that say the upstream is slow or overloaded, not that the request was wrong
+TRANSIENT_ERRORS = (openai.APIConnectionError, openai.APITimeoutError, openai.RateLimitError,
+                    openai.InternalServerError)
+
+
+class LLMUnavailable(Exception):
+    """The call was not made, or gave up; callers answer with their rule-based fallback"""
+
+
+class LLMRejected(LLMUnavailable):
+    """The API refused the request itself (bad key, bad input); retrying will not help"""
+
+
+class CircuitBreaker:
+    """Stops calling an upstream that keeps failing.
+
+    After `failure_threshold` consecutive transient failures the breaker
+    opens and every call is refused at once for `reset_timeout` seconds.
+    Then a single trial call is let through (half-open). Its success closes
+    the breaker and its failure opens it again."""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self._transition('half_open')
+            if self.state == 'half_open' and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._trial_running = False
+            if self.state != 'closed':
+                self._transition('closed')
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.state == 'half_open' or (self.state == 'closed' and self.failures >= self.failure_threshold):
+                self.opened_at = time.monotonic()
+                self._transition('open')
+
+    def _transition(self, state: str):
+        logger.warning(f"LLM circuit breaker {self.state} -> {state}")
+        self.state = state
+        llm_circuit_transitions_total.inc(state)
+
+    def status(self) -> Dict:
+        with self._lock:
+            retry_in = self.reset_timeout - (time.monotonic() - self.opened_at) if self.state == 'open' else 0
+            return {'state': self.state, 'consecutive_failures': self.failures,
+                    'retry_in_seconds': round(max(0.0, retry_in), 1)}
+
+
+class RetryBudget:
+    """Caps retries at a share of recent calls so retries cannot multiply an outage.
+
+    Every call deposits `ratio` tokens and every retry spends one. The
+    balance is capped, and `min_tokens` lets a quiet process still retry."""
+
+    def __init__(self, ratio: float = 0.2, min_tokens: float = 3.0, max_tokens: float = 20.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = min_tokens
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            if self.tokens < 1.0:
+                return False
+            self.tokens -= 1.0
+            return True
+
+
+class LLMClient:
+    """One OpenAI client per process for every caller of the chat API.
+
+    The underlying HTTP client keeps a pool of keep-alive connections, so
+    calls skip the TCP/TLS handshake. The SDK's own retries are turned off
+    and replaced by a policy shared by all callers:
+
+    - `deadline` bounds a whole call, retries and backoff included.
+    - Transient failures are retried with full-jitter exponential backoff,
+      at most `max_retries` times and only while the retry budget allows.
+    - The circuit breaker refuses calls while the upstream is failing.
+
+    Anything that does not produce an answer raises LLMUnavailable. Callers
+    then answer from their rule-based fallbacks. `base_url` can point at a
+    local fake server for tests."""
+
+    def __init__(self, api_key: Optional[str], base_url: Optional[str] = None, model: str = 'gpt-3.5-turbo',
+                 deadline: float = 20.0, connect_timeout: float = 3.0, max_retries: int = 2,
+                 backoff_base: float = 0.25, backoff_cap: float = 4.0, breaker: Optional[CircuitBreaker] = None,
+                 retry_budget: Optional[RetryBudget] = None):
+        self.model = model
+        self.deadline = deadline
+        self.connect_timeout = connect_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.breaker = breaker or CircuitBreaker()
+        self.retry_budget = retry_budget or RetryBudget()
+        self.client = openai.OpenAI(
+            api_key=api_key, base_url=base_url or None, max_retries=0,
+            timeout=openai.Timeout(deadline, connect=connect_timeout)
+        ) if api_key else None
+
+    @property
+    def enabled(self) -> bool:
+        return self.client is not None
+
+    def chat(self, component: str, messages: List[Dict], deadline: Optional[float] = None, **kwargs) -> str:
+        """Text of one chat completion, or LLMUnavailable"""
+        expires = time.monotonic() + (deadline or self.deadline)
+        response = self._create(component, messages, expires, **kwargs)
+        return (response.choices[0].message.content or '').strip()
+
+    def stream_chat(self, component: str, messages: List[Dict], deadline: Optional[float] = None,
+                    **kwargs) -> Iterator[str]:
+        """Yield a chat completion's text as it is generated, or raise LLMUnavailable.
+
+        Opening the stream is retried like `chat`. Once tokens have been
+        yielded a failure is not retried, since the caller has already
+        shown them; it raises LLMUnavailable and counts against the breaker."""
+        start = time.monotonic()
+        expires = start + (deadline or self.deadline)
+        stream = self._create(component, messages, expires, stream=True, **kwargs)
+        first = True
+        try:
+            for chunk in stream:
+                if time.monotonic() > expires:
+                    raise LLMUnavailable(f'LLM stream passed its {deadline or self.deadline}s deadline')
+                token = chunk.choices[0].delta.content if chunk.choices else None
+                if token:
+                    if first:
+                        llm_time_to_first_token_seconds.observe(time.monotonic() - start, component)
+                        first = False
+                    yield token
+        except LLMUnavailable:
+            self.breaker.record_failure()
+            raise
+        except openai.OpenAIError as e:
+            self.breaker.record_failure()
+            raise LLMUnavailable(f'LLM stream failed: {e}') from e
+        finally:
+            stream.close()
+
+    def _create(self, component: str, messages: List[Dict], expires: float, **kwargs):
+        """One chat completion request with the breaker, deadline and retry policy applied"""
+        if self.client is None:
+            raise LLMUnavailable('No OpenAI API key configured')
+        if not self.breaker.allow():
+            llm_rejected_total.inc(component, 'circuit_open')
+            raise LLMUnavailable('LLM circuit breaker is open')
+
+        model = kwargs.pop('model', self.model)
+        self.retry_budget.deposit()
+        attempt = 0
+        while True:
+            remaining = expires - time.monotonic()
+            try:
+                response = metrics.timed_openai_call(
+                    component,
+                    self.client.chat.completions.create,
+                    model=model,
+                    messages=messages,
+                    timeout=openai.Timeout(remaining, connect=min(self.connect_timeout, remaining)),
+                    **kwargs
+                )
+            except TRANSIENT_ERRORS as e:
+                attempt += 1
+                backoff = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+                if attempt > self.max_retries or time.monotonic() + backoff >= expires:
+                    self.breaker.record_failure()
+                    raise LLMUnavailable(f'LLM call failed after {attempt} attempt(s): {e}') from e
+                if not self.retry_budget.withdraw():
+                    self.breaker.record_failure()
+                    llm_rejected_total.inc(component, 'retry_budget')
+                    raise LLMUnavailable(f'LLM retry budget exhausted: {e}') from e
+                llm_retries_total.inc(component)
+                logger.info(f"Retrying LLM call for {component} in {backoff:.2f}s after: {e}")
+                time.sleep(backoff)
+                continue
+            except openai.OpenAIError as e:
+                # The request itself was rejected (bad key, bad input); the upstream is healthy
+                self.breaker.record_success()
+                raise LLMRejected(f'LLM call rejected: {e}') from e
+            self.breaker.record_success()
+            return response
+
+    def status(self) -> Dict:
+        return {
+            'enabled': self.enabled,
+            'model': self.model,
+            'deadline_seconds': self.deadline,
+            'max_retries': self.max_retries,
+            'retry_budget_tokens': round(self.retry_budget.tokens, 2),
+            'circuit_breaker': self.breaker.status()
+        }
+
+
+def from_env(api_key: Optional[str] = None) -> LLMClient:
+    """Client configured from OPENAI_API_KEY, OPENAI_BASE_URL and the LLM_* variables"""
+    return LLMClient(
+        api_key=api_key or os.getenv('OPENAI_API_KEY'),
+        base_url=os.getenv('OPENAI_BASE_URL'),
+        model=os.getenv('LLM_MODEL', 'gpt-3.5-turbo'),
+        deadline=float(os.getenv('LLM_DEADLINE_SECONDS', 20)),
+        connect_timeout=float(os.getenv('LLM_CONNECT_TIMEOUT_SECONDS', 3)),
+        max_retries=int(os.getenv('LLM_MAX_RETRIES', 2)),
+        breaker=CircuitBreaker(
+            failure_threshold=int(os.getenv('LLM_BREAKER_FAILURES', 5)),
+            reset_timeout=float(os.getenv('LLM_BREAKER_RESET_SECONDS', 30))
+        )
+    )
@@ -0,0 +1,420 @@
+import atexit
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+maintenance_runs_total = metrics.registry.counter(
+    'maintenance_runs_total', 'Database maintenance steps run, by task and outcome', ('task', 'outcome'))
+maintenance_step_duration_seconds = metrics.registry.histogram(
+    'maintenance_step_duration_seconds', 'Time spent in one database maintenance step', ('task',),
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0))
+
+TASKS = ('checkpoint', 'optimize', 'analyze', 'vacuum')
+# PRAGMA auto_vacuum values
+AUTO_VACUUM_MODES = {0: 'none', 1: 'full', 2: 'incremental'}
+
+
+def parse_hours(hours: str) -> Tuple[int, int]:
+    """'2-5' -> (2, 5): the local hours [start, end) counted as off-peak; may wrap midnight"""
+    start, _, end = hours.partition('-')
+    start, end = int(start), int(end or int(start) + 1)
+    if not (0 <= start <= 23 and 0 <= end <= 24):
+        raise ValueError(f'Invalid off-peak hours: {hours!r}')
+    return start, end
+
+
+def bound_connection(conn: sqlite3.Connection, deadline: Optional[float]):
+    """Make the next statements on conn abort (and roll back) once time.monotonic() passes deadline"""
+    if deadline is None:
+        conn.set_progress_handler(None, 0)
+    else:
+        conn.set_progress_handler(lambda: 1 if time.monotonic() > deadline else 0, 10000)
+
+
+def out_of_time(deadline: Optional[float]) -> bool:
+    """Whether time.monotonic() has reached deadline (None never runs out)"""
+    return deadline is not None and time.monotonic() >= deadline
+
+
+class StepInterrupted(Exception):
+    """A maintenance step ran past its time limit; SQLite rolled back its unfinished work"""
+
+
+class DatabaseMaintenance:
+    """Keeps one SQLite database compact, checkpointed and well planned.
+
+    A background thread wakes every `interval` seconds, measures the file
+    and runs whichever tasks are due:
+
+    - checkpoint: a PASSIVE WAL checkpoint once the -wal file passes
+      `wal_bytes`, and a TRUNCATE checkpoint off-peak.
+    - optimize: `PRAGMA optimize` (with an analysis limit) once an hour
+      after courses have changed.
+    - analyze: a full ANALYZE (no analysis limit) off-peak, or a sampled
+      one sooner once `analyze_ratio` of the catalog has changed since the
+      last one.
+    - vacuum: once `freelist_ratio` of the pages are free. Databases in
+      incremental auto-vacuum mode release pages in batches at any time.
+      Others get one full VACUUM off-peak, which also switches them to
+      incremental mode.
+
+    Other periodic jobs (e.g. analytics retention) can be added with
+    `schedule`; they run every `interval` of their own, on the same thread
+    and under the same lease.
+
+    Every step runs under a progress handler that aborts it after
+    `step_seconds` (`vacuum_seconds` for a full VACUUM or ANALYZE). An aborted step is
+    rolled back by SQLite and retried on a later tick. Scheduled jobs get
+    the same `step_seconds` deadline and must stop by it. Worker processes
+    sharing the file take turns through a lease row, so only one of them
+    does maintenance at a time. Last runs are stored next to the lease, so
+    every worker reports the same history. Plain connections are used, not
+    the instrumented ones, so maintenance never joins a request's query
+    budget or a batch snapshot."""
+
+    def __init__(self, database, interval: float = 300.0, off_peak_hours: str = '2-5',
+                 freelist_ratio: float = 0.2, min_free_pages: int = 256, wal_bytes: int = 64 * 1024 * 1024,
+                 analyze_ratio: float = 0.2, optimize_interval: float = 3600.0, step_seconds: float = 2.0,
+                 vacuum_seconds: float = 60.0, vacuum_pages: int = 1000, analysis_limit: int = 1000,
+                 history: int = 50):
+        self.database = database
+        self.interval = interval
+        self.off_peak = parse_hours(off_peak_hours)
+        self.freelist_ratio = freelist_ratio
+        self.min_free_pages = min_free_pages
+        self.wal_bytes = wal_bytes
+        self.analyze_ratio = analyze_ratio
+        self.optimize_interval = optimize_interval
+        self.step_seconds = step_seconds
+        self.vacuum_seconds = vacuum_seconds
+        self.vacuum_pages = vacuum_pages
+        self.analysis_limit = analysis_limit
+        self.owner = f'{socket.gethostname()}:{os.getpid()}:{id(self):x}'
+        self.lease_seconds = max(interval, vacuum_seconds) * 2
+        self.last_checked_at: Optional[str] = None
+        self.history: deque = deque(maxlen=history)
+        self.jobs: Dict[str, Tuple[Callable[[float], str], float]] = {}
+        self._run_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._ensure_tables()
+
+    def _connection(self) -> sqlite3.Connection:
+        # Autocommit, since VACUUM and the pragmas must run outside a transaction
+        return sqlite3.connect(self.database.db_name, timeout=self.step_seconds, isolation_level=None)
+
+    def _ensure_tables(self):
+        conn = self._connection()
+        try:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS maintenance_lease (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    owner TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS maintenance_runs (
+                    task TEXT PRIMARY KEY,
+                    finished_at REAL NOT NULL,
+                    change_version INTEGER NOT NULL,
+                    outcome TEXT NOT NULL,
+                    duration_ms REAL NOT NULL,
+                    detail TEXT
+                )
+            ''')
+        finally:
+            conn.close()
+
+    # Scheduling
+
+    def schedule(self, name: str, func: Callable[[float], str], interval: float):
+        """Run func(deadline) as a maintenance task every `interval` seconds.
+
+        `deadline` is a time.monotonic() value `step_seconds` away. The job
+        should bound its statements with `bound_connection` and raise
+        StepInterrupted if it stops with work left, so the task stays due.
+        It returns a short detail string."""
+        if name in TASKS:
+            raise ValueError(f'{name!r} is a built-in maintenance task')
+        self.jobs[name] = (func, interval)
+
+    @property
+    def tasks(self) -> List[str]:
+        return list(TASKS) + list(self.jobs)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='db-maintenance', daemon=True)
+            self._thread.start()
+            # A restarted worker should not wait out the lease of its previous process
+            atexit.register(self.stop)
+
+    def stop(self):
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        self._release_lease()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.run()
+            except Exception as e:
+                logger.error(f"Error running database maintenance: {e}")
+
+    def is_off_peak(self, now: Optional[datetime] = None) -> bool:
+        hour = (now or datetime.now()).hour
+        start, end = self.off_peak
+        return start <= hour < end if start <= end else hour >= start or hour < end
+
+    def run(self, tasks: Optional[List[str]] = None, force: bool = False) -> Dict:
+        """Run the tasks that are due (or the given ones, when forced) if this worker holds the lease"""
+        for task in tasks or ():
+            if task not in self.tasks:
+                raise ValueError(f'Invalid task {task!r}. Must be one of: {self.tasks}')
+        with self._run_lock:
+            if not self._acquire_lease():
+                return {'ran': [], 'skipped': 'another worker holds the maintenance lease'}
+            self.last_checked_at = datetime.now().isoformat()
+            stats = self.inspect()
+            due = [task for task in (tasks or self.tasks) if force or self._due(task, stats)]
+            ran = []
+            for task in due:
+                ran.append(self._step(task, stats))
+                if task in ('vacuum', 'checkpoint'):
+                    stats = self.inspect()
+            return {'ran': ran, 'stats': stats}
+
+    def _due(self, task: str, stats: Dict) -> bool:
+        last = stats['last_runs'].get(task)
+        changed = stats['change_version'] - (last['change_version'] if last else 0)
+        since = time.time() - last['finished_at'] if last else float('inf')
+        # Off-peak work runs at most once per off-peak window
+        off_peak_due = self.is_off_peak() and since > 12 * 3600
+        if task in self.jobs:
+            return since >= self.jobs[task][1]
+        if task == 'checkpoint':
+            if stats['journal_mode'] != 'wal':
+                return False
+            return stats['wal_bytes'] >= self.wal_bytes or (off_peak_due and stats['wal_bytes'] > 0)
+        if task == 'optimize':
+            return changed > 0 and since >= self.optimize_interval
+        if task == 'analyze':
+            return changed > 0 and (off_peak_due or changed >= self.analyze_ratio * max(stats['courses'], 1000))
+        if task == 'vacuum':
+            if stats['freelist_pages'] < self.min_free_pages or stats['freelist_ratio'] < self.freelist_ratio:
+                return False
+            return stats['auto_vacuum'] == 'incremental' or off_peak_due
+        return False
+
+    # Steps
+
+    def _step(self, task: str, stats: Dict) -> Dict:
+        change_version = stats['change_version']
+        start = time.perf_counter()
+        try:
+            detail = self._call(task, stats)
+            outcome = 'ok'
+        except StepInterrupted as e:
+            detail, outcome = str(e), 'interrupted'
+        except Exception as e:
+            # A failing task is recorded and retried later; it does not stop the others
+            detail, outcome = str(e), 'failed'
+            logger.error(f"Database maintenance task {task} failed: {e}")
+        duration = time.perf_counter() - start
+        maintenance_runs_total.inc(task, outcome)
+        maintenance_step_duration_seconds.observe(duration, task)
+
+        run = {'task': task, 'outcome': outcome, 'detail': detail, 'duration_ms': round(duration * 1000, 1),
+               'finished_at': time.time(), 'change_version': change_version}
+        self.history.appendleft(run)
+        # An interrupted step keeps its old record, so it stays due
+        if outcome == 'ok':
+            self._record(run)
+        logger.info(f"Database maintenance {task}: {outcome} in {run['duration_ms']}ms ({detail})")
+        return run
+
+    def _call(self, task: str, stats: Dict) -> str:
+        if task in self.jobs:
+            try:
+                return self.jobs[task][0](time.monotonic() + self.step_seconds)
+            except sqlite3.OperationalError as e:
+                if 'interrupt' in str(e):
+                    raise StepInterrupted(f'{task} stopped after {self.step_seconds}s and was rolled back')
+                raise
+        conn = self._connection()
+        try:
+            return getattr(self, f'_{task}')(conn, stats)
+        finally:
+            conn.set_progress_handler(None, 0)
+            conn.close()
+
+    def _bounded(self, conn: sqlite3.Connection, seconds: float):
+        """Make the next statements on conn abort (and roll back) once `seconds` have passed"""
+        deadline = time.monotonic() + seconds
+        bound_connection(conn, deadline)
+        return deadline
+
+    def _execute(self, conn: sqlite3.Connection, sql: str, seconds: float) -> List:
+        self._bounded(conn, seconds)
+        try:
+            return conn.execute(sql).fetchall()
+        except sqlite3.OperationalError as e:
+            if 'interrupt' in str(e):
+                raise StepInterrupted(f'{sql} stopped after {seconds}s')
+            raise
+
+    def _checkpoint(self, conn: sqlite3.Connection, stats: Dict) -> str:
+        # PASSIVE never waits for readers; TRUNCATE waits at most step_seconds for them
+        mode = 'TRUNCATE' if self.is_off_peak() else 'PASSIVE'
+        conn.execute(f'PRAGMA busy_timeout = {int(self.step_seconds * 1000)}')
+        busy, log_frames, checkpointed = self._execute(conn, f'PRAGMA wal_checkpoint({mode})', self.step_seconds)[0]
+        return f'{mode}: {checkpointed}/{log_frames} frames checkpointed' + (', readers busy' if busy else '')
+
+    def _optimize(self, conn: sqlite3.Connection, stats: Dict) -> str:
+        conn.execute(f'PRAGMA analysis_limit = {self.analysis_limit}')
+        self._execute(conn, 'PRAGMA optimize', self.step_seconds)
+        return f'analysis_limit={self.analysis_limit}'
+
+    def _analyze(self, conn: sqlite3.Connection, stats: Dict) -> str:
+        if self.is_off_peak():
+            # Off-peak: read every index in full for exact statistics
+            limit, seconds = 0, self.vacuum_seconds
+        else:
+            # A sampled ANALYZE: good statistics without reading every index in full
+            limit, seconds = self.analysis_limit, self.step_seconds
+        conn.execute(f'PRAGMA analysis_limit = {limit}')
+        self._execute(conn, 'ANALYZE', seconds)
+        return f"{stats['courses']} courses, {'full' if limit == 0 else f'analysis_limit={limit}'}"
+
+    def _vacuum(self, conn: sqlite3.Connection, stats: Dict) -> str:
+        if stats['auto_vacuum'] == 'incremental':
+            # Release free pages in batches until none are left or the step's time is up
+            deadline = self._bounded(conn, self.step_seconds)
+            released = 0
+            while time.monotonic() < deadline:
+                free = conn.execute('PRAGMA freelist_count').fetchone()[0]
+                if not free:
+                    break
+                try:
+                    conn.execute(f'PRAGMA incremental_vacuum({self.vacuum_pages})').fetchall()
+                except sqlite3.OperationalError as e:
+                    if 'interrupt' not in str(e):
+                        raise
+                    break
+                released += free - conn.execute('PRAGMA freelist_count').fetchone()[0]
+            left = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            return f'released {released} pages, {left} free pages left'
+
+        # One full rebuild switches the file to incremental mode for next time
+        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        self._execute(conn, 'VACUUM', self.vacuum_seconds)
+        return f"VACUUM released {stats['freelist_pages']} pages; auto_vacuum=incremental"
+
+    # Lease and bookkeeping
+
+    def _acquire_lease(self) -> bool:
+        now = time.time()
+        conn = self._connection()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('SELECT owner, expires_at FROM maintenance_lease WHERE id = 1').fetchone()
+            if row and row[0] != self.owner and row[1] > now:
+                conn.execute('ROLLBACK')
+                return False
+            conn.execute('''
+                INSERT INTO maintenance_lease (id, owner, expires_at) VALUES (1, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+            ''', (self.owner, now + self.lease_seconds))
+            conn.execute('COMMIT')
+            return True
+        except sqlite3.OperationalError as e:
+            # Busy with writes right now; try again on the next tick
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            logger.info(f"Could not take the maintenance lease: {e}")
+            return False
+        finally:
+            conn.close()
+
+    def _release_lease(self):
+        try:
+            conn = self._connection()
+            try:
+                conn.execute('DELETE FROM maintenance_lease WHERE id = 1 AND owner = ?', (self.owner,))
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"Could not release the maintenance lease: {e}")
+
+    def _record(self, run: Dict):
+        conn = self._connection()
+        try:
+            conn.execute('''
+                INSERT INTO maintenance_runs (task, finished_at, change_version, outcome, duration_ms, detail)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(task) DO UPDATE SET finished_at = excluded.finished_at,
+                    change_version = excluded.change_version, outcome = excluded.outcome,
+                    duration_ms = excluded.duration_ms, detail = excluded.detail
+            ''', (run['task'], run['finished_at'], run['change_version'], run['outcome'], run['duration_ms'],
+                  run['detail']))
+        finally:
+            conn.close()
+
+    def inspect(self) -> Dict:
+        """File size, free pages, WAL size and change activity that decide what is due"""
+        conn = self._connection()
+        try:
+            page_count = conn.execute('PRAGMA page_count').fetchone()[0]
+            freelist = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+            auto_vacuum = conn.execute('PRAGMA auto_vacuum').fetchone()[0]
+            journal_mode = conn.execute('PRAGMA journal_mode').fetchone()[0].lower()
+            version = conn.execute('SELECT version FROM change_clock WHERE id = 1').fetchone()[0]
+            courses = conn.execute('SELECT COUNT(*) FROM courses').fetchone()[0]
+            last_runs = {
+                task: {'finished_at': finished_at, 'change_version': change_version, 'outcome': outcome,
+                       'duration_ms': duration_ms, 'detail': detail}
+                for task, finished_at, change_version, outcome, duration_ms, detail in conn.execute(
+                    'SELECT task, finished_at, change_version, outcome, duration_ms, detail FROM maintenance_runs')
+            }
+            lease = conn.execute('SELECT owner, expires_at FROM maintenance_lease WHERE id = 1').fetchone()
+        finally:
+            conn.close()
+        wal_path = f'{self.database.db_name}-wal'
+        return {
+            'file_bytes': page_count * page_size,
+            'page_count': page_count,
+            'freelist_pages': freelist,
+            'freelist_ratio': round(freelist / page_count, 4) if page_count else 0.0,
+            'auto_vacuum': AUTO_VACUUM_MODES.get(auto_vacuum, str(auto_vacuum)),
+            'journal_mode': journal_mode,
+            'wal_bytes': os.path.getsize(wal_path) if os.path.exists(wal_path) else 0,
+            'change_version': version,
+            'courses': courses,
+            'last_runs': last_runs,
+            'lease_owner': lease[0] if lease and lease[1] > time.time() else None
+        }
+
+    def status(self) -> Dict:
+        stats = self.inspect()
+        return {
+            'worker': self.owner,
+            'off_peak_now': self.is_off_peak(),
+            'interval_seconds': self.interval,
+            'last_checked_at': self.last_checked_at,
+            'due': [task for task in self.tasks if self._due(task, stats)],
+            'stats': stats,
+            'recent_steps': list(self.history)
+        }
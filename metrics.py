@@ -0,0 +1,326 @@
+import re
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, List, Tuple
+
+# Default latency buckets (seconds), tuned for an API that mostly answers
+# in a few milliseconds but occasionally waits on OpenAI for several seconds
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Cap on distinct label sets per metric so interpolated SQL can't blow up memory
+MAX_LABEL_SETS = 500
+OVERFLOW_LABEL = '__other__'
+
+
+def _escape_label(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(label_names: Tuple[str, ...], label_values: Tuple[str, ...], extra: str = '') -> str:
+    parts = [f'{name}="{_escape_label(value)}"' for name, value in zip(label_names, label_values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    metric_type = ''
+
+    def __init__(self, name: str, documentation: str, label_names: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Tuple[str, ...], store: Dict) -> Tuple[str, ...]:
+        if len(labels) != len(self.label_names):
+            raise ValueError(f'{self.name} expects labels {self.label_names}, got {labels}')
+        if labels not in store and len(store) >= MAX_LABEL_SETS:
+            return tuple(OVERFLOW_LABEL for _ in self.label_names)
+        return labels
+
+    def render(self) -> List[str]:
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.metric_type}']
+
+
+class Counter(_Metric):
+    """Monotonically increasing counter"""
+    metric_type = 'counter'
+
+    def __init__(self, name: str, documentation: str, label_names: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, label_names)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            key = self._key(labels, self._values)
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            lines.append(f'{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}')
+        return lines
+
+
+class Histogram(_Metric):
+    """Cumulative histogram with fixed upper bounds"""
+    metric_type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, label_names: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (+Inf last), sum, count]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            key = self._key(labels, self._values)
+            state = self._values.get(key)
+            if state is None:
+                state = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                self._values[key] = state
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, *labels: str) -> '_Timer':
+        """Context manager observing the elapsed wall time of its block"""
+        return _Timer(self, labels)
+
+    def count(self, *labels: str) -> int:
+        state = self._values.get(labels)
+        return state[2] if state else 0
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            items = [(labels, list(state[0]), state[1], state[2]) for labels, state in self._values.items()]
+        for labels, bucket_counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), bucket_counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.label_names, labels, le)} {cumulative}')
+            label_str = _format_labels(self.label_names, labels)
+            lines.append(f'{self.name}_sum{label_str} {_format_value(total)}')
+            lines.append(f'{self.name}_count{label_str} {count}')
+        return lines
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'start')
+
+    def __init__(self, histogram: Histogram, labels: Tuple[str, ...]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+        return False
+
+
+class MetricsRegistry:
+    """Holds every metric and renders them in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, label_names: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, documentation, label_names))
+
+    def histogram(self, name: str, documentation: str, label_names: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, label_names, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+# HTTP
+http_requests_total = registry.counter(
+    'http_requests_total', 'HTTP requests handled, by route, method and status', ('route', 'method', 'status'))
+http_request_duration_seconds = registry.histogram(
+    'http_request_duration_seconds', 'HTTP request latency by route and method', ('route', 'method'))
+http_request_errors_total = registry.counter(
+    'http_request_errors_total', 'HTTP requests answered with a 5xx status', ('route', 'method'))
+
+# SQLite
+db_connections_opened_total = registry.counter(
+    'db_connections_opened_total', 'SQLite connections opened')
+db_connections_closed_total = registry.counter(
+    'db_connections_closed_total', 'SQLite connections closed')
+db_query_duration_seconds = registry.histogram(
+    'db_query_duration_seconds', 'SQLite statement latency by statement template', ('statement',))
+db_query_errors_total = registry.counter(
+    'db_query_errors_total', 'SQLite statements that raised', ('statement',))
+
+# Analytics
+analytics_write_duration_seconds = registry.histogram(
+    'analytics_write_duration_seconds', 'Latency of log_analytics writes')
+analytics_write_errors_total = registry.counter(
+    'analytics_write_errors_total', 'log_analytics writes that failed')
+
+# OpenAI
+openai_request_duration_seconds = registry.histogram(
+    'openai_request_duration_seconds', 'OpenAI chat completion latency by caller', ('component',))
+openai_request_failures_total = registry.counter(
+    'openai_request_failures_total', 'OpenAI chat completions that raised, by caller', ('component',))
+
+
+# Callables invoked as listener(connection, sql, parameters, elapsed, failed)
+# after every statement, e.g. the SQL tracer
+_statement_listeners: List = []
+
+
+def add_statement_listener(listener):
+    """Register a callback that sees every statement run on an instrumented connection"""
+    if listener not in _statement_listeners:
+        _statement_listeners.append(listener)
+
+
+def remove_statement_listener(listener):
+    if listener in _statement_listeners:
+        _statement_listeners.remove(listener)
+
+
+_WHITESPACE_RE = re.compile(r'\s+')
+_IN_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_STRING_LITERAL_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_template_cache: Dict[str, str] = {}
+
+
+def statement_template(sql: str) -> str:
+    """Collapse a SQL statement into a low-cardinality template label"""
+    template = _template_cache.get(sql)
+    if template is not None:
+        return template
+    template = _WHITESPACE_RE.sub(' ', sql).strip()
+    template = _IN_LIST_RE.sub('(?, ...)', template)
+    template = _STRING_LITERAL_RE.sub('?', template)
+    template = _NUMBER_LITERAL_RE.sub('?', template)
+    if len(template) > 200:
+        template = template[:197] + '...'
+    if len(_template_cache) < 4 * MAX_LABEL_SETS:
+        _template_cache[sql] = template
+    return template
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that times every statement it runs"""
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        failed = False
+        try:
+            return super().execute(sql, parameters)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self.connection._record_statement(sql, parameters, time.perf_counter() - start, failed)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        failed = False
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self.connection._record_statement(sql, None, time.perf_counter() - start, failed)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """sqlite3 connection factory that counts opens/closes and times statements"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._closed = False
+        db_connections_opened_total.inc()
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def _record_statement(self, sql: str, parameters, elapsed: float, failed: bool = False):
+        template = statement_template(sql)
+        db_query_duration_seconds.observe(elapsed, template)
+        if failed:
+            db_query_errors_total.inc(template)
+        for listener in _statement_listeners:
+            listener(self, sql, parameters, elapsed, failed)
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            db_connections_closed_total.inc()
+        super().close()
+
+    def __del__(self):
+        # Connections that are garbage collected without close() still count
+        if not getattr(self, '_closed', True):
+            self._closed = True
+            db_connections_closed_total.inc()
+
+
+def connect(database: str, **kwargs) -> sqlite3.Connection:
+    """Open an instrumented SQLite connection"""
+    kwargs.setdefault('factory', InstrumentedConnection)
+    return sqlite3.connect(database, **kwargs)
+
+
+def timed_openai_call(component: str, func, *args, **kwargs):
+    """Invoke an OpenAI client call, recording its latency and failures"""
+    start = time.perf_counter()
+    try:
+        return func(*args, **kwargs)
+    except Exception:
+        openai_request_failures_total.inc(component)
+        raise
+    finally:
+        openai_request_duration_seconds.observe(time.perf_counter() - start, component)
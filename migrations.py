@@ -0,0 +1,199 @@
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# PRAGMA user_version written by the latest migration
+SCHEMA_VERSION = 2
+
+
+def _columns(cursor, table: str):
+    cursor.execute(f'PRAGMA table_info({table})')
+    return [row[1] for row in cursor.fetchall()]
+
+
+def needs_integer_keys(cursor) -> bool:
+    """True for databases created before courses had an INTEGER primary key"""
+    columns = _columns(cursor, 'courses')
+    return bool(columns) and 'pk' not in columns
+
+
+def migrate_to_integer_keys(conn):
+    """Rebuild the tables around INTEGER PRIMARY KEY surrogate keys.
+
+    UUIDs stay on every row as the indexed external `id` the API exposes;
+    enrollments and course_ratings reference courses/students by integer
+    key instead of by UUID text. Rows are copied in created_at order, so
+    the new keys are also time-ordered. Enrollments pointing at a student
+    row that does not exist get a placeholder student so the link (and
+    the original UUID) survives. Runs in one transaction."""
+    start = time.perf_counter()
+    cursor = conn.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        cursor.execute('''
+            CREATE TABLE courses_new (
+                pk INTEGER PRIMARY KEY,
+                id TEXT NOT NULL UNIQUE,
+                title TEXT NOT NULL,
+                description TEXT,
+                duration TEXT,
+                instructor TEXT,
+                category TEXT,
+                price REAL DEFAULT 0,
+                capacity INTEGER DEFAULT 30,
+                enrolled INTEGER DEFAULT 0,
+                status TEXT DEFAULT 'draft',
+                rating REAL DEFAULT 0,
+                total_ratings INTEGER DEFAULT 0,
+                created_at TEXT,
+                updated_at TEXT,
+                prerequisites TEXT,
+                learning_outcomes TEXT,
+                course_image TEXT,
+                difficulty_level TEXT DEFAULT 'intermediate'
+            )
+        ''')
+        course_columns = ('id, title, description, duration, instructor, category, price, capacity, enrolled, '
+                          'status, rating, total_ratings, created_at, updated_at, prerequisites, '
+                          'learning_outcomes, course_image, difficulty_level')
+        cursor.execute(f'INSERT INTO courses_new ({course_columns}) '
+                       f'SELECT {course_columns} FROM courses ORDER BY created_at, rowid')
+
+        cursor.execute('''
+            CREATE TABLE students_new (
+                pk INTEGER PRIMARY KEY,
+                id TEXT NOT NULL UNIQUE,
+                name TEXT NOT NULL,
+                email TEXT UNIQUE NOT NULL,
+                phone TEXT,
+                created_at TEXT,
+                total_courses INTEGER DEFAULT 0,
+                completed_courses INTEGER DEFAULT 0
+            )
+        ''')
+        cursor.execute('''
+            INSERT INTO students_new (id, name, email, phone, created_at, total_courses, completed_courses)
+            SELECT id, name, email, phone, created_at, total_courses, completed_courses
+            FROM students ORDER BY created_at, rowid
+        ''')
+        cursor.execute('''
+            SELECT DISTINCT e.student_id FROM enrollments e
+            WHERE e.student_id IS NOT NULL
+              AND NOT EXISTS (SELECT 1 FROM students_new s WHERE s.id = e.student_id)
+        ''')
+        orphans = [row[0] for row in cursor.fetchall()]
+        cursor.executemany(
+            'INSERT INTO students_new (id, name, email, created_at) VALUES (?, ?, ?, ?)',
+            [(student_id, 'Unknown Student', f'unknown-{student_id}@migrated.invalid', None)
+             for student_id in orphans]
+        )
+
+        cursor.execute('''
+            CREATE TABLE enrollments_new (
+                pk INTEGER PRIMARY KEY,
+                id TEXT NOT NULL UNIQUE,
+                student_pk INTEGER,
+                course_pk INTEGER,
+                enrollment_date TEXT,
+                completion_date TEXT,
+                progress REAL DEFAULT 0,
+                grade TEXT,
+                certificate_issued BOOLEAN DEFAULT FALSE,
+                FOREIGN KEY (student_pk) REFERENCES students (pk),
+                FOREIGN KEY (course_pk) REFERENCES courses (pk)
+            )
+        ''')
+        cursor.execute('''
+            INSERT INTO enrollments_new (id, student_pk, course_pk, enrollment_date, completion_date,
+                                         progress, grade, certificate_issued)
+            SELECT COALESCE(e.id, lower(hex(randomblob(16)))), s.pk, c.pk, e.enrollment_date, e.completion_date,
+                   e.progress, e.grade, e.certificate_issued
+            FROM enrollments e
+            LEFT JOIN students_new s ON s.id = e.student_id
+            LEFT JOIN courses_new c ON c.id = e.course_id
+            ORDER BY e.enrollment_date, e.rowid
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE course_ratings_new (
+                pk INTEGER PRIMARY KEY,
+                id TEXT NOT NULL UNIQUE,
+                course_pk INTEGER,
+                student_id TEXT,
+                rating INTEGER,
+                review TEXT,
+                created_at TEXT,
+                FOREIGN KEY (course_pk) REFERENCES courses (pk)
+            )
+        ''')
+        cursor.execute('''
+            INSERT INTO course_ratings_new (id, course_pk, student_id, rating, review, created_at)
+            SELECT r.id, c.pk, r.student_id, r.rating, r.review, r.created_at
+            FROM course_ratings r
+            LEFT JOIN courses_new c ON c.id = r.course_id
+            ORDER BY r.created_at, r.rowid
+        ''')
+
+        # The analytics UUID is never looked up, so it loses its index
+        cursor.execute('''
+            CREATE TABLE analytics_new (
+                pk INTEGER PRIMARY KEY,
+                id TEXT,
+                event_type TEXT,
+                course_id TEXT,
+                student_id TEXT,
+                data TEXT,
+                timestamp TEXT
+            )
+        ''')
+        cursor.execute('''
+            INSERT INTO analytics_new (id, event_type, course_id, student_id, data, timestamp)
+            SELECT id, event_type, course_id, student_id, data, timestamp
+            FROM analytics ORDER BY timestamp, rowid
+        ''')
+
+        for table in ('enrollments', 'course_ratings', 'analytics', 'courses', 'students'):
+            cursor.execute(f'DROP TABLE {table}')
+            cursor.execute(f'ALTER TABLE {table}_new RENAME TO {table}')
+
+        cursor.execute('PRAGMA user_version = 1')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    logger.info(f"Migrated database to integer keys in {time.perf_counter() - start:.2f}s "
+                f"({len(orphans)} placeholder students)")
+
+
+def needs_change_versions(cursor) -> bool:
+    """True for databases created before courses carried a change version"""
+    columns = _columns(cursor, 'courses')
+    return bool(columns) and 'version' not in columns
+
+
+def add_change_versions(conn):
+    """Add courses.version and number the existing rows in key order.
+
+    The change clock, tombstones and the triggers that maintain them are
+    created by init_database; the clock starts at the highest version
+    assigned here."""
+    cursor = conn.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        cursor.execute('ALTER TABLE courses ADD COLUMN version INTEGER')
+        cursor.execute('UPDATE courses SET version = pk')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    logger.info("Added change versions to courses")
+
+
+def upgrade(conn):
+    """Bring an existing database up to SCHEMA_VERSION; new databases are left alone"""
+    cursor = conn.cursor()
+    if needs_integer_keys(cursor):
+        migrate_to_integer_keys(conn)
+    if needs_change_versions(cursor):
+        add_change_versions(conn)
@@ -0,0 +1,157 @@
+import logging
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+MAX_STACK_DEPTH = 128
+
+
+class ProfileSession:
+    """One armed profiling window: the next N requests and/or a time limit"""
+
+    def __init__(self, max_requests: Optional[int], seconds: Optional[float], interval: float):
+        self.max_requests = max_requests
+        self.remaining_requests = max_requests
+        self.deadline = time.monotonic() + seconds if seconds else None
+        self.interval = interval
+        self.started_at = datetime.now().isoformat()
+        self.finished_at = None
+        self.profiled_requests = 0
+        self.samples: Dict[str, Counter] = {}
+        self.total_samples = 0
+
+    def expired(self) -> bool:
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def summary(self) -> Dict:
+        return {
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'max_requests': self.max_requests,
+            'profiled_requests': self.profiled_requests,
+            'interval_ms': round(self.interval * 1000, 3),
+            'total_samples': self.total_samples,
+            'routes': {route: sum(stacks.values()) for route, stacks in self.samples.items()}
+        }
+
+
+class SamplingProfiler:
+    """Statistical profiler that periodically captures the stacks of threads
+    serving profiled requests and aggregates them per route.
+
+    When no session is armed the only cost on the request path is reading
+    the `armed` attribute; the sampler thread exists only while armed."""
+
+    def __init__(self):
+        self.armed = False
+        self.session: Optional[ProfileSession] = None
+        self._active: Dict[int, str] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def arm(self, max_requests: Optional[int] = None, seconds: Optional[float] = None,
+            interval: float = 0.005) -> ProfileSession:
+        """Start a session covering the next `max_requests` requests and/or `seconds` seconds"""
+        if not max_requests and not seconds:
+            raise ValueError('Either a request count or a time window is required')
+        with self._lock:
+            if self.armed:
+                raise RuntimeError('A profiling session is already running')
+            self.session = ProfileSession(max_requests, seconds, interval)
+            self._active = {}
+            self.armed = True
+            self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+            self._thread.start()
+        logger.info(f"Profiler armed: requests={max_requests} seconds={seconds} interval={interval}s")
+        return self.session
+
+    def disarm(self):
+        with self._lock:
+            self._disarm_locked()
+
+    def _disarm_locked(self):
+        if self.armed:
+            self.armed = False
+            self.session.finished_at = datetime.now().isoformat()
+            logger.info(f"Profiler finished: {self.session.total_samples} samples "
+                        f"over {self.session.profiled_requests} requests")
+
+    def begin_request(self, route: str) -> bool:
+        """Claim a slot for the current request; returns True if it will be sampled"""
+        with self._lock:
+            session = self.session
+            if not self.armed or session.expired():
+                return False
+            if session.remaining_requests is not None:
+                if session.remaining_requests <= 0:
+                    return False
+                session.remaining_requests -= 1
+            session.profiled_requests += 1
+            self._active[threading.get_ident()] = route
+            return True
+
+    def end_request(self):
+        with self._lock:
+            self._active.pop(threading.get_ident(), None)
+            session = self.session
+            if (self.armed and session.remaining_requests is not None
+                    and session.remaining_requests <= 0 and not self._active):
+                self._disarm_locked()
+
+    def _run(self):
+        session = self.session
+        own_ident = threading.get_ident()
+        while self.armed and self.session is session:
+            if session.expired():
+                self.disarm()
+                break
+            with self._lock:
+                active = dict(self._active)
+            if active:
+                frames = sys._current_frames()
+                for ident, route in active.items():
+                    frame = frames.get(ident)
+                    if frame is None or ident == own_ident:
+                        continue
+                    stack = self._collapse(frame)
+                    with self._lock:
+                        session.samples.setdefault(route, Counter())[stack] += 1
+                        session.total_samples += 1
+                del frames
+            time.sleep(session.interval)
+
+    @staticmethod
+    def _collapse(frame) -> str:
+        names = []
+        while frame is not None and len(names) < MAX_STACK_DEPTH:
+            code = frame.f_code
+            module = frame.f_globals.get('__name__', '?')
+            names.append(f'{module}:{code.co_name}')
+            frame = frame.f_back
+        names.reverse()
+        return ';'.join(names)
+
+    def collapsed(self, route: Optional[str] = None) -> str:
+        """Samples in collapsed-stack format (`route;frame;frame count`), ready for flamegraph.pl"""
+        if self.session is None:
+            return ''
+        with self._lock:
+            samples = {key: Counter(stacks) for key, stacks in self.session.samples.items()}
+        lines = []
+        for sampled_route, stacks in samples.items():
+            if route and sampled_route != route:
+                continue
+            for stack, count in stacks.most_common():
+                lines.append(f'{sampled_route};{stack} {count}')
+        return '\n'.join(lines) + ('\n' if lines else '')
+
+    def status(self) -> Dict:
+        return {
+            'armed': self.armed,
+            'session': self.session.summary() if self.session else None
+        }
@@ -0,0 +1,226 @@
+import atexit
+import logging
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+progress_heartbeats_total = metrics.registry.counter(
+    'progress_heartbeats_total', 'Progress heartbeats accepted into the coalescing buffer')
+progress_heartbeats_coalesced_total = metrics.registry.counter(
+    'progress_heartbeats_coalesced_total', 'Heartbeats that replaced a pending value for the same enrollment')
+progress_rows_flushed_total = metrics.registry.counter(
+    'progress_rows_flushed_total', 'Enrollment rows written by progress flushes')
+progress_flush_duration_seconds = metrics.registry.histogram(
+    'progress_flush_duration_seconds', 'Duration of one batched progress flush')
+progress_dead_letters_total = metrics.registry.counter(
+    'progress_dead_letters_total', 'Heartbeats dropped because their row could not be written')
+
+
+class ProgressUpdate:
+    __slots__ = ('progress', 'grade', 'reported_at')
+
+    def __init__(self, progress: float, grade: Optional[str], reported_at: float):
+        self.progress = progress
+        self.grade = grade
+        self.reported_at = reported_at
+
+
+class ProgressIngestor:
+    """Coalesces learner progress heartbeats in memory and writes them in batches.
+
+    Only the most recent report per enrollment is kept, so however many
+    heartbeats arrive between flushes each enrollment costs one row update.
+    A background thread flushes every `flush_interval` seconds (or sooner if
+    `max_pending` enrollments are waiting) in a single transaction, stamping
+    completion_date and bumping students.completed_courses the first time an
+    enrollment reaches 100%.
+
+    If the batch fails for anything but a busy or locked database, its rows
+    are retried one at a time. Rows that still fail are set aside in
+    `dead_letters` instead of blocking every later flush."""
+
+    def __init__(self, database, flush_interval: float = 1.0, max_pending: int = 50000,
+                 max_dead_letters: int = 1000):
+        self.database = database
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.completion_listeners: List[Callable[[Dict], None]] = []
+        self._pending: Dict[str, ProgressUpdate] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.last_flush: Optional[Dict] = None
+        self.dead_letters: deque = deque(maxlen=max_dead_letters)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='progress-flusher', daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval * 5)
+        self.flush()
+
+    def submit(self, enrollment_id: str, progress: float, grade: Optional[str] = None,
+               reported_at: Optional[float] = None):
+        """Record a heartbeat; out-of-order reports older than the pending one are dropped"""
+        reported_at = reported_at if reported_at is not None else time.time()
+        with self._lock:
+            pending = self._pending.get(enrollment_id)
+            if pending is not None:
+                if reported_at < pending.reported_at:
+                    return
+                progress_heartbeats_coalesced_total.inc()
+                if grade is None:
+                    grade = pending.grade
+            self._pending[enrollment_id] = ProgressUpdate(progress, grade, reported_at)
+            pending_count = len(self._pending)
+        progress_heartbeats_total.inc()
+        if pending_count >= self.max_pending:
+            self._wakeup.set()
+
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing progress updates: {e}")
+
+    def flush(self) -> Dict:
+        """Write all pending updates in one transaction"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return {'updated': 0, 'completed': 0}
+
+            start = time.perf_counter()
+            now = datetime.now().isoformat()
+            dropped = 0
+            try:
+                newly_completed, updated = self._write(batch, now)
+            except sqlite3.OperationalError:
+                # Busy or locked: the rows are fine, try the whole batch again next time
+                self._requeue(batch)
+                raise
+            except Exception as e:
+                logger.warning(f"Progress batch of {len(batch)} failed ({e}); writing rows one by one")
+                newly_completed, updated, dropped = self._write_each(batch, now)
+
+            elapsed = time.perf_counter() - start
+            progress_flush_duration_seconds.observe(elapsed)
+            progress_rows_flushed_total.inc(amount=updated)
+            self.last_flush = {
+                'updated': updated,
+                'dead_lettered': dropped,
+                'completed': len(newly_completed),
+                'duration_ms': round(elapsed * 1000, 3),
+                'timestamp': now
+            }
+
+            for item in newly_completed:
+                for listener in self.completion_listeners:
+                    try:
+                        listener(item)
+                    except Exception as e:
+                        logger.error(f"Error in completion listener: {e}")
+            return self.last_flush
+
+    def _write(self, batch: Dict[str, ProgressUpdate], now: str) -> Tuple[List[Dict], int]:
+        """Apply updates in one transaction; returns the enrollments completed by it and the rows updated"""
+        completed_ids = [eid for eid, update in batch.items() if update.progress >= 100]
+        conn = self.database.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.executemany(
+                'UPDATE enrollments SET progress = ?, grade = COALESCE(?, grade) WHERE id = ?',
+                [(min(update.progress, 100.0), update.grade, eid) for eid, update in batch.items()]
+            )
+            # Ids with no enrollment row (e.g. deleted since the heartbeat) update nothing
+            updated = cursor.rowcount
+
+            newly_completed = []
+            for enrollment_id in completed_ids:
+                cursor.execute('''
+                    SELECT e.student_pk, s.id, c.id FROM enrollments e
+                    LEFT JOIN students s ON s.pk = e.student_pk
+                    LEFT JOIN courses c ON c.pk = e.course_pk
+                    WHERE e.id = ? AND e.completion_date IS NULL
+                ''', (enrollment_id,))
+                row = cursor.fetchone()
+                if row:
+                    newly_completed.append({'enrollment_id': enrollment_id, 'student_pk': row[0],
+                                            'student_id': row[1], 'course_id': row[2],
+                                            'completion_date': now})
+            cursor.executemany(
+                'UPDATE enrollments SET completion_date = ? WHERE id = ? AND completion_date IS NULL',
+                [(now, item['enrollment_id']) for item in newly_completed]
+            )
+            cursor.executemany(
+                'UPDATE students SET completed_courses = completed_courses + 1 WHERE pk = ?',
+                [(item['student_pk'],) for item in newly_completed]
+            )
+            conn.commit()
+            return newly_completed, updated
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def _write_each(self, batch: Dict[str, ProgressUpdate], now: str) -> Tuple[List[Dict], int, int]:
+        """Apply updates one transaction per row, dead-lettering the rows that fail"""
+        newly_completed = []
+        updated = dropped = 0
+        items = list(batch.items())
+        for index, (enrollment_id, update) in enumerate(items):
+            try:
+                completed, count = self._write({enrollment_id: update}, now)
+                newly_completed += completed
+                updated += count
+            except sqlite3.OperationalError:
+                self._requeue(dict(items[index:]))
+                raise
+            except Exception as e:
+                dropped += 1
+                progress_dead_letters_total.inc()
+                self.dead_letters.append({'enrollment_id': enrollment_id, 'progress': update.progress,
+                                          'grade': repr(update.grade), 'error': str(e), 'failed_at': now})
+                logger.error(f"Dropped progress update for enrollment {enrollment_id}: {e}")
+        return newly_completed, updated, dropped
+
+    def _requeue(self, batch: Dict[str, ProgressUpdate]):
+        """Put updates back unless newer heartbeats arrived meanwhile"""
+        with self._lock:
+            for eid, update in batch.items():
+                current = self._pending.get(eid)
+                if current is None or current.reported_at < update.reported_at:
+                    self._pending[eid] = update
+
+    def status(self) -> Dict:
+        return {
+            'pending': self.pending_count(),
+            'dead_letters': len(self.dead_letters),
+            'recent_dead_letters': list(self.dead_letters)[-10:],
+            'flush_interval_seconds': self.flush_interval,
+            'last_flush': self.last_flush
+        }
@@ -0,0 +1,261 @@
+import logging
+import math
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+requests_limited_total = metrics.registry.counter(
+    'requests_limited_total', 'Requests rejected by the rate or concurrency limiter', ('route_class', 'reason'))
+limiter_queue_wait_seconds = metrics.registry.histogram(
+    'limiter_queue_wait_seconds', 'Time requests waited for a concurrency slot', ('route_class',),
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+
+
+class RouteClass:
+    """Limits shared by a group of routes with similar cost"""
+
+    def __init__(self, name: str, rate: float, burst: int, max_concurrent: int, max_queue: int,
+                 max_wait: float, latency_target: float):
+        self.name = name
+        self.rate = rate                      # tokens refilled per second, per client
+        self.burst = burst                    # bucket size, per client
+        self.max_concurrent = max_concurrent  # in-flight requests per worker
+        self.max_queue = max_queue            # requests allowed to wait for a slot
+        self.max_wait = max_wait              # seconds a request may wait for a slot
+        self.latency_target = latency_target  # seconds; above this the slot count is halved
+
+    def to_dict(self) -> Dict:
+        return {key: value for key, value in vars(self).items() if key != 'name'}
+
+
+ROUTE_CLASSES = {
+    'ai': RouteClass('ai', rate=0.2, burst=3, max_concurrent=2, max_queue=4, max_wait=2.0, latency_target=10.0),
+    'import': RouteClass('import', rate=0.1, burst=2, max_concurrent=1, max_queue=2, max_wait=5.0,
+                         latency_target=30.0),
+    'export': RouteClass('export', rate=0.5, burst=5, max_concurrent=2, max_queue=4, max_wait=2.0,
+                         latency_target=5.0),
+    'analytics': RouteClass('analytics', rate=2.0, burst=10, max_concurrent=4, max_queue=8, max_wait=1.0,
+                            latency_target=2.0),
+    'default': RouteClass('default', rate=20.0, burst=100, max_concurrent=32, max_queue=64, max_wait=0.5,
+                          latency_target=1.0),
+}
+
+ROUTE_CLASS_BY_RULE = {
+    '/api/ai/generate-course': 'ai',
+    '/api/import/courses': 'import',
+    '/api/bulk/operations': 'import',
+    '/api/export/courses': 'export',
+    '/api/analytics/dashboard': 'analytics',
+    '/api/analytics/report': 'analytics',
+    '/api/admin/aggregates': 'analytics',
+}
+
+# Health checks and scrapes must keep working while the API is shedding load
+EXEMPT_RULES = {'/api/health', '/api/metrics'}
+
+
+class MemoryBucketStore:
+    """Token buckets in this process; the least recently used clients are evicted past max_keys"""
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._buckets: 'OrderedDict[str, Tuple[float, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rate: float, burst: int, now: float) -> Tuple[bool, float]:
+        """Take one token; returns (allowed, tokens left)"""
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (float(burst), now))
+            tokens = min(float(burst), tokens + (now - updated) * rate)
+            allowed = tokens >= 1.0
+            if allowed:
+                tokens -= 1.0
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return allowed, tokens
+
+
+class SQLiteBucketStore:
+    """Token buckets in a local SQLite file, shared by every worker process on the host.
+
+    Uses plain connections, not the instrumented ones, so limiter
+    bookkeeping does not count against a request's query budget."""
+
+    def __init__(self, path: str, idle_seconds: float = 3600.0):
+        self.path = path
+        self.idle_seconds = idle_seconds
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS rate_limit_buckets (
+                key TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated REAL NOT NULL
+            )
+        ''')
+        conn.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            conn.execute('PRAGMA synchronous = OFF')
+            self._local.conn = conn
+        return conn
+
+    def take(self, key: str, rate: float, burst: int, now: float) -> Tuple[bool, float]:
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT tokens, updated FROM rate_limit_buckets WHERE key = ?', (key,)).fetchone()
+            tokens, updated = row if row else (float(burst), now)
+            tokens = min(float(burst), tokens + max(0.0, now - updated) * rate)
+            allowed = tokens >= 1.0
+            if allowed:
+                tokens -= 1.0
+            conn.execute('''
+                INSERT INTO rate_limit_buckets (key, tokens, updated) VALUES (?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated
+            ''', (key, tokens, now))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+        # Buckets idle long enough to have refilled are indistinguishable from new ones
+        self._local.calls = getattr(self._local, 'calls', 0) + 1
+        if self._local.calls % 1000 == 0:
+            conn.execute('DELETE FROM rate_limit_buckets WHERE updated < ?', (now - self.idle_seconds,))
+        return allowed, tokens
+
+
+class ConcurrencyLimiter:
+    """Bounded in-flight requests for one route class, with a short bounded queue.
+
+    Latency is tracked as an EWMA of completed requests. While it is above
+    the class target, the number of slots is halved, so a slow dependency
+    sheds load instead of queueing it. Some requests are still admitted,
+    which lets the average recover."""
+
+    def __init__(self, route_class: RouteClass, alpha: float = 0.2):
+        self.route_class = route_class
+        self.alpha = alpha
+        self.inflight = 0
+        self.waiting = 0
+        self.latency_ewma = 0.0
+        self._condition = threading.Condition()
+
+    def limit(self) -> int:
+        limit = self.route_class.max_concurrent
+        if self.latency_ewma > self.route_class.latency_target:
+            limit = max(1, limit // 2)
+        return limit
+
+    def acquire(self) -> Optional[str]:
+        """Take a slot; returns None on success or the reason for shedding"""
+        start = time.perf_counter()
+        with self._condition:
+            if self.inflight < self.limit():
+                self.inflight += 1
+                return None
+            if self.waiting >= self.route_class.max_queue:
+                return 'queue_full'
+            self.waiting += 1
+            deadline = start + self.route_class.max_wait
+            try:
+                while self.inflight >= self.limit():
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        return 'queue_timeout'
+                    self._condition.wait(remaining)
+                self.inflight += 1
+            finally:
+                self.waiting -= 1
+        limiter_queue_wait_seconds.observe(time.perf_counter() - start, self.route_class.name)
+        return None
+
+    def release(self, elapsed: float):
+        with self._condition:
+            self.inflight -= 1
+            self.latency_ewma = elapsed if not self.latency_ewma else (
+                self.alpha * elapsed + (1 - self.alpha) * self.latency_ewma)
+            self._condition.notify()
+
+    def status(self) -> Dict:
+        return {
+            'inflight': self.inflight,
+            'waiting': self.waiting,
+            'limit': self.limit(),
+            'latency_ewma_ms': round(self.latency_ewma * 1000, 3)
+        }
+
+
+class RateLimiter:
+    """Per-client token buckets plus per-worker concurrency limits, by route class.
+
+    Token buckets answer "is this client asking too often" (429). The
+    concurrency limiter answers "is this worker too busy for this kind of
+    request" (503). Both return a Retry-After. Cheap routes get their own
+    generous class, so abuse of an expensive route cannot use up their
+    capacity."""
+
+    def __init__(self, store=None, route_classes: Optional[Dict[str, RouteClass]] = None,
+                 class_by_rule: Optional[Dict[str, str]] = None):
+        self.store = store or MemoryBucketStore()
+        self.route_classes = route_classes or ROUTE_CLASSES
+        self.class_by_rule = class_by_rule if class_by_rule is not None else ROUTE_CLASS_BY_RULE
+        self.limiters = {name: ConcurrencyLimiter(route_class) for name, route_class in self.route_classes.items()}
+
+    def classify(self, rule: Optional[str]) -> Optional[str]:
+        """Route class for a URL rule, or None for exempt routes"""
+        if rule in EXEMPT_RULES:
+            return None
+        return self.class_by_rule.get(rule or '', 'default')
+
+    def check_rate(self, client: str, class_name: str) -> Tuple[bool, float, float]:
+        """Returns (allowed, tokens left, seconds until the next token)"""
+        route_class = self.route_classes[class_name]
+        try:
+            allowed, tokens = self.store.take(f'{class_name}:{client}', route_class.rate, route_class.burst,
+                                              time.time())
+        except sqlite3.Error as e:
+            # A busy or broken shared store should not take the API down with it
+            logger.error(f"Rate limit store unavailable, allowing request: {e}")
+            return True, 0.0, 0.0
+        retry_after = 0.0 if allowed else (1.0 - tokens) / route_class.rate
+        if not allowed:
+            requests_limited_total.inc(class_name, 'rate')
+        return allowed, tokens, retry_after
+
+    def admit(self, class_name: str) -> Tuple[Optional[str], float]:
+        """Take a concurrency slot; returns (shed reason or None, Retry-After seconds)"""
+        limiter = self.limiters[class_name]
+        reason = limiter.acquire()
+        if reason is None:
+            return None, 0.0
+        requests_limited_total.inc(class_name, reason)
+        return reason, max(1.0, limiter.latency_ewma or limiter.route_class.max_wait)
+
+    def release(self, class_name: str, elapsed: float):
+        self.limiters[class_name].release(elapsed)
+
+    def status(self) -> Dict:
+        return {
+            'store': type(self.store).__name__,
+            'classes': {
+                name: {**route_class.to_dict(), **self.limiters[name].status()}
+                for name, route_class in self.route_classes.items()
+            }
+        }
+
+
+def retry_after_header(seconds: float) -> str:
+    return str(max(1, math.ceil(seconds)))
@@ -0,0 +1,424 @@
+import logging
+import math
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+recommendation_build_duration_seconds = metrics.registry.histogram(
+    'recommendation_build_duration_seconds', 'Time to build or update recommendation tables', ('kind',),
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0))
+
+DIFFICULTY_LEVELS = {'beginner': 0, 'intermediate': 1, 'advanced': 2}
+
+# Blend of co-enrollment similarity with catalog signals
+WEIGHTS = {'co_enrollment': 0.7, 'category': 0.15, 'difficulty': 0.05, 'rating': 0.1}
+
+# Co-occurrence pairs are keyed as (course pk << PAIR_SHIFT) | other course pk
+PAIR_SHIFT = 32
+PAIR_MASK = (1 << PAIR_SHIFT) - 1
+
+
+class RecommendationTables:
+    """Immutable snapshot served to readers; swapped wholesale on rebuild"""
+
+    def __init__(self, by_course: Dict[str, List[Dict]], by_student: Dict[str, List[Dict]],
+                 popular: List[Dict], built_at: str, enrollments: int):
+        self.by_course = by_course
+        self.by_student = by_student
+        self.popular = popular
+        self.built_at = built_at
+        self.enrollments = enrollments
+
+
+class RecommendationEngine:
+    """"Learners also enrolled in" recommendations.
+
+    Course x course co-occurrence is kept sparse, as sorted (course pk,
+    course pk) keys with learner counts; the diagonal holds each course's
+    learner count. A full build sums every learner's course pairs,
+    vectorised in chunks. Refreshes add the pairs created by enrollments
+    since the last build and subtract the ones they replace. Learners with
+    more than `max_learner_courses` courses only count on the diagonal:
+    their pairs grow quadratically and say little.
+
+    Co-occurrence is normalised to cosine similarity and blended with
+    same-category, difficulty proximity and rating signals. Each course
+    (and learner) is scored row by row, against its co-enrolled courses plus
+    the best-rated few of each category and difficulty, since nothing else
+    can reach its top-k. The top-k per course and per learner are
+    precomputed into dictionaries so serving is a single lookup."""
+
+    def __init__(self, database, top_k: int = 10, refresh_interval: float = 60.0,
+                 rebuild_interval: float = 3600.0, max_learner_courses: int = 500, pair_chunk: int = 4_000_000):
+        self.database = database
+        self.top_k = top_k
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+        self.max_learner_courses = max_learner_courses
+        self.pair_chunk = pair_chunk
+        self.tables = RecommendationTables({}, {}, [], None, 0)
+        self._pair_keys = np.zeros(0, dtype=np.int64)
+        self._pair_counts = np.zeros(0, dtype=np.int64)
+        self._watermark = 0
+        self._last_full_build = 0.0
+        self._build_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Build once in the background and keep the tables fresh on a schedule"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='recommendations', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                if time.monotonic() - self._last_full_build >= self.rebuild_interval:
+                    self.rebuild()
+                else:
+                    self.refresh()
+            except Exception as e:
+                logger.error(f"Error updating recommendations: {e}")
+            self._stopped.wait(self.refresh_interval)
+
+    # Serving
+
+    def for_course(self, course_id: str, limit: Optional[int] = None) -> List[Dict]:
+        return self.tables.by_course.get(course_id, [])[:limit or self.top_k]
+
+    def for_student(self, student_id: str, limit: Optional[int] = None) -> List[Dict]:
+        tables = self.tables
+        recommendations = tables.by_student.get(student_id)
+        if recommendations is None:
+            recommendations = tables.popular
+        return recommendations[:limit or self.top_k]
+
+    def status(self) -> Dict:
+        return {
+            'built_at': self.tables.built_at,
+            'enrollments': self.tables.enrollments,
+            'courses': len(self.tables.by_course),
+            'students': len(self.tables.by_student)
+        }
+
+    # Building
+
+    def _load_courses(self, conn) -> Dict:
+        cursor = conn.cursor()
+        cursor.execute('SELECT id, category, difficulty_level, rating, status, title, pk FROM courses ORDER BY pk')
+        rows = cursor.fetchall()
+        _, category = np.unique(np.array([row[1] or '' for row in rows], dtype=object), return_inverse=True)
+        courses = {
+            'ids': [row[0] for row in rows],
+            'category': category.astype(np.int64),
+            'difficulty': np.array([DIFFICULTY_LEVELS.get((row[2] or '').lower(), 1) for row in rows],
+                                   dtype=np.int64),
+            'rating': np.array([row[3] or 0 for row in rows], dtype=np.float64),
+            'active': np.array([row[4] == 'active' for row in rows], dtype=bool),
+            'title': [row[5] for row in rows],
+            'pks': np.array([row[6] for row in rows], dtype=np.int64)
+        }
+        # Active courses best rated first, per difficulty and per (category, difficulty). A course
+        # nobody co-enrolled with is ranked by these signals alone, so only the head of each
+        # list can make a top-k.
+        active = np.flatnonzero(courses['active'])
+        active = active[np.argsort(-courses['rating'][active], kind='stable')]
+        courses['by_difficulty'] = {level: active[courses['difficulty'][active] == level]
+                                    for level in DIFFICULTY_LEVELS.values()}
+        courses['by_category'] = {}
+        for level, ranked in courses['by_difficulty'].items():
+            for code in np.unique(courses['category'][ranked]):
+                courses['by_category'][(int(code), level)] = ranked[courses['category'][ranked] == code]
+        return courses
+
+    def _positions(self, courses: Dict, course_pks: np.ndarray) -> np.ndarray:
+        """Position of each course pk in the catalog, -1 for courses that no longer exist"""
+        positions = np.searchsorted(courses['pks'], course_pks)
+        found = positions < len(courses['pks'])
+        found[found] = courses['pks'][positions[found]] == course_pks[found]
+        return np.where(found, positions, -1)
+
+    def _learner_courses(self, conn, watermark: int, student_pks: Optional[List[int]] = None):
+        """(learner pks, course pks, first enrollment pks) per distinct learner and course, by learner,
+        up to enrollment `watermark`, plus the learners' ids"""
+        cursor = conn.cursor()
+        query = '''
+            SELECT e.student_pk, s.id, e.course_pk, MIN(e.pk) FROM enrollments e
+            JOIN students s ON s.pk = e.student_pk
+            WHERE e.pk <= ? {}
+            GROUP BY e.student_pk, e.course_pk
+        '''
+        if student_pks is None:
+            cursor.execute(query.format(''), (watermark,))
+            rows = cursor.fetchall()
+        else:
+            rows = []
+            for start in range(0, len(student_pks), 500):
+                batch = student_pks[start:start + 500]
+                placeholders = ','.join('?' for _ in batch)
+                cursor.execute(query.format(f'AND e.student_pk IN ({placeholders})'), [watermark, *batch])
+                rows.extend(cursor.fetchall())
+        rows.sort()
+        learners = np.array([row[0] for row in rows], dtype=np.int64)
+        course_pks = np.array([row[2] for row in rows], dtype=np.int64)
+        enrollment_pks = np.array([row[3] for row in rows], dtype=np.int64)
+        return learners, course_pks, enrollment_pks, {row[0]: row[1] or '' for row in rows}
+
+    def _co_occurrence(self, learners: np.ndarray, course_pks: np.ndarray):
+        """Sorted pair keys and counts of the sum of S x S over each learner's course set S"""
+        keys, counts = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        if not len(learners):
+            return keys, counts
+        starts = np.flatnonzero(np.r_[True, learners[1:] != learners[:-1]])
+        sizes = np.diff(np.r_[starts, len(learners)])
+        # Learners past the limit only add their diagonal
+        fan = np.repeat(np.where(sizes > self.max_learner_courses, 1, sizes), sizes)
+        first = np.repeat(np.where(sizes > self.max_learner_courses, -1, starts), sizes)
+
+        # Entries in chunks of whole learners, so at most about pair_chunk pairs are expanded at once
+        ends = np.r_[starts[1:], len(learners)]
+        pairs_before = np.r_[0, np.cumsum(fan)]
+        chunk_start = 0
+        while chunk_start < len(learners):
+            limit = np.searchsorted(pairs_before, pairs_before[chunk_start] + self.pair_chunk, side='right') - 1
+            # Up to the end of the learner that crosses the limit, and always at least one learner
+            chunk_end = ends[min(np.searchsorted(ends, max(limit, chunk_start + 1)), len(ends) - 1)]
+            entry = np.arange(chunk_start, chunk_end)
+            rows = np.repeat(entry, fan[entry])
+            offset = np.arange(len(rows)) - np.repeat(pairs_before[entry] - pairs_before[chunk_start], fan[entry])
+            row_first = first[rows]
+            cols = np.where(row_first < 0, rows, row_first + offset)
+            chunk_keys, chunk_counts = np.unique((course_pks[rows] << PAIR_SHIFT) | course_pks[cols],
+                                                 return_counts=True)
+            keys, counts = merge_pairs(keys, counts, chunk_keys, chunk_counts)
+            chunk_start = chunk_end
+        return keys, counts
+
+    def rebuild(self) -> Dict:
+        """Full rebuild of the co-occurrence counts and both tables"""
+        with self._build_lock:
+            start = time.perf_counter()
+            conn = self.database.get_connection()
+            try:
+                cursor = conn.cursor()
+                cursor.execute('SELECT COALESCE(MAX(pk), 0), COUNT(*) FROM enrollments')
+                watermark, enrollment_count = cursor.fetchone()
+                courses = self._load_courses(conn)
+                learners, course_pks, enrollment_pks, student_ids = self._learner_courses(conn, watermark)
+            finally:
+                conn.close()
+
+            self._pair_keys, self._pair_counts = self._co_occurrence(learners, course_pks)
+            matrix = self._similarity(courses)
+            by_student = self._student_recommendations(learners, course_pks, enrollment_pks, student_ids,
+                                                       matrix, courses)
+
+            self._watermark = watermark
+            self._last_full_build = time.monotonic()
+            self.tables = RecommendationTables(
+                self._course_recommendations(matrix, courses), by_student, self._popular(matrix, courses),
+                datetime.now().isoformat(), enrollment_count
+            )
+            recommendation_build_duration_seconds.observe(time.perf_counter() - start, 'rebuild')
+            logger.info(f"Rebuilt recommendations for {len(courses['ids'])} courses and {len(by_student)} learners")
+            return self.status()
+
+    def refresh(self) -> Dict:
+        """Fold in enrollments added since the last build"""
+        with self._build_lock:
+            start = time.perf_counter()
+            conn = self.database.get_connection()
+            try:
+                cursor = conn.cursor()
+                cursor.execute('SELECT pk, student_pk FROM enrollments WHERE pk > ? ORDER BY pk', (self._watermark,))
+                new_rows = cursor.fetchall()
+                if not new_rows:
+                    return self.status()
+                watermark = new_rows[-1][0]
+                cursor.execute('SELECT COUNT(*) FROM enrollments')
+                enrollment_count = cursor.fetchone()[0]
+                courses = self._load_courses(conn)
+                learners, course_pks, enrollment_pks, student_ids = self._learner_courses(
+                    conn, watermark, sorted({row[1] for row in new_rows}))
+            finally:
+                conn.close()
+
+            # (old + new) x (old + new) - old x old, per affected learner
+            old = enrollment_pks <= self._watermark
+            added_keys, added_counts = self._co_occurrence(learners, course_pks)
+            removed_keys, removed_counts = self._co_occurrence(learners[old], course_pks[old])
+            keys, counts = merge_pairs(self._pair_keys, self._pair_counts, added_keys, added_counts)
+            self._pair_keys, self._pair_counts = merge_pairs(keys, counts, removed_keys, -removed_counts)
+
+            matrix = self._similarity(courses)
+            by_student = dict(self.tables.by_student)
+            by_student.update(self._student_recommendations(learners, course_pks, enrollment_pks, student_ids,
+                                                            matrix, courses))
+            self._watermark = watermark
+            self.tables = RecommendationTables(
+                self._course_recommendations(matrix, courses), by_student, self._popular(matrix, courses),
+                datetime.now().isoformat(), enrollment_count
+            )
+            recommendation_build_duration_seconds.observe(time.perf_counter() - start, 'refresh')
+            return self.status()
+
+    # Scoring
+
+    def _similarity(self, courses: Dict) -> Dict:
+        """CSR rows of cosine co-enrollment similarity in catalog order, plus learners per course"""
+        size = len(courses['ids'])
+        rows = self._positions(courses, self._pair_keys >> PAIR_SHIFT)
+        cols = self._positions(courses, self._pair_keys & PAIR_MASK)
+        known = (rows >= 0) & (cols >= 0)
+        rows, cols, counts = rows[known], cols[known], self._pair_counts[known].astype(np.float64)
+
+        enrolled = np.zeros(size, dtype=np.float64)
+        diagonal = rows == cols
+        enrolled[rows[diagonal]] = counts[diagonal]
+        rows, cols, counts = rows[~diagonal], cols[~diagonal], counts[~diagonal]
+        norm = np.sqrt(np.maximum(enrolled, 1.0))
+        return {
+            'indptr': np.searchsorted(rows, np.arange(size + 1)),
+            'cols': cols,
+            'values': counts / (norm[rows] * norm[cols]),
+            'enrolled': enrolled
+        }
+
+    def _catalog_scores(self, category, difficulty, candidates: np.ndarray, courses: Dict) -> np.ndarray:
+        """Catalog part of a course's score for each candidate"""
+        return (WEIGHTS['category'] * (courses['category'][candidates] == category)
+                + WEIGHTS['difficulty'] * (1.0 - np.abs(courses['difficulty'][candidates] - difficulty) / 2.0)
+                + WEIGHTS['rating'] * courses['rating'][candidates] / 5.0)
+
+    def _entries(self, candidates: np.ndarray, scores: np.ndarray, courses: Dict,
+                 limit: Optional[int] = None) -> List[Dict]:
+        """The top-k (or `limit`) candidates by score, best first"""
+        limit = limit or self.top_k
+        if len(candidates) > limit:
+            best = np.argpartition(-scores, limit - 1)[:limit]
+            candidates, scores = candidates[best], scores[best]
+        order = np.argsort(-scores, kind='stable')
+        return [
+            {'course_id': courses['ids'][i], 'title': courses['title'][i], 'score': round(score, 4)}
+            for i, score in zip(candidates[order].tolist(), scores[order].tolist()) if math.isfinite(score)
+        ]
+
+    def _course_recommendations(self, matrix: Dict, courses: Dict) -> Dict[str, List[Dict]]:
+        indptr, cols, values = matrix['indptr'], matrix['cols'], matrix['values']
+        # Only active courses are recommended, never the course itself
+        row_of = np.repeat(np.arange(len(courses['ids'])), np.diff(indptr))
+        scores = WEIGHTS['co_enrollment'] * values + self._catalog_scores(
+            courses['category'][row_of], courses['difficulty'][row_of], cols, courses)
+        scores[~courses['active'][cols]] = -np.inf
+
+        heads = {}
+        recommendations = {}
+        for i, course_id in enumerate(courses['ids']):
+            key = (int(courses['category'][i]), int(courses['difficulty'][i]))
+            if key not in heads:
+                head = np.unique(np.concatenate([
+                    ranked[:self.top_k + 1] for level in DIFFICULTY_LEVELS.values()
+                    for ranked in (courses['by_difficulty'][level], courses['by_category'].get((key[0], level), []))
+                ]).astype(np.int64))
+                head_scores = self._catalog_scores(key[0], key[1], head, courses)
+                heads[key] = (head, head_scores, self._entries(head, head_scores, courses, self.top_k + 1))
+            head, head_scores, head_entries = heads[key]
+
+            if indptr[i] == indptr[i + 1]:
+                # Nobody co-enrolled: the catalog ranking of its kind of course, minus itself
+                recommendations[course_id] = [entry for entry in head_entries
+                                              if entry['course_id'] != course_id][:self.top_k]
+                continue
+            neighbours = cols[indptr[i]:indptr[i + 1]]
+            catalog_only = (head != i) & ~np.isin(head, neighbours)
+            recommendations[course_id] = self._entries(
+                np.concatenate([neighbours, head[catalog_only]]),
+                np.concatenate([scores[indptr[i]:indptr[i + 1]], head_scores[catalog_only]]),
+                courses
+            )
+        return recommendations
+
+    def _student_recommendations(self, learners: np.ndarray, course_pks: np.ndarray, enrollment_pks: np.ndarray,
+                                 student_ids: Dict[int, str], matrix: Dict, courses: Dict) -> Dict[str, List[Dict]]:
+        """Per learner, the average score their courses give each course they haven't taken"""
+        indptr, cols, values = matrix['indptr'], matrix['cols'], matrix['values']
+        positions = self._positions(courses, course_pks)
+        known = positions >= 0
+        learners, positions, enrollment_pks = learners[known], positions[known], enrollment_pks[known]
+        levels = np.array(sorted(DIFFICULTY_LEVELS.values()))
+
+        size = len(courses['ids'])
+        category_count = int(courses['category'].max()) + 1 if size else 0
+        no_courses = np.zeros(0, dtype=np.int64)
+        recommendations = {}
+        starts = np.flatnonzero(np.r_[True, learners[1:] != learners[:-1]]) if len(learners) else []
+        for start, end in zip(starts, np.r_[starts[1:], len(learners)]):
+            taken = positions[start:end]
+            # Learners past the pair limit are scored from their latest courses
+            basis = taken[np.argsort(-enrollment_pks[start:end], kind='stable')[:self.max_learner_courses]]
+            neighbours = np.concatenate([cols[indptr[c]:indptr[c + 1]] for c in basis])
+            weights = np.concatenate([values[indptr[c]:indptr[c + 1]] for c in basis])
+
+            # Co-enrolled courses, plus enough of the best rated in each list to skip the taken ones
+            head = self.top_k + len(taken)
+            categories = np.unique(courses['category'][basis])
+            heads = [ranked[:head] for level in levels
+                     for ranked in [courses['by_difficulty'][level]]
+                     + [courses['by_category'].get((int(code), level), no_courses) for code in categories]]
+            if len(neighbours) * 64 < size:
+                # Few co-enrolled courses: sum their similarity over those alone
+                co_enrolled, inverse = np.unique(neighbours, return_inverse=True)
+                summed = np.bincount(inverse, weights=weights, minlength=len(co_enrolled))
+                candidates = np.unique(np.concatenate([co_enrolled, *heads]))
+                candidates = candidates[courses['active'][candidates] & ~np.isin(candidates, taken)]
+                found = np.minimum(np.searchsorted(co_enrolled, candidates), max(len(co_enrolled) - 1, 0))
+                similarity = (np.where(co_enrolled[found] == candidates, summed[found], 0.0) if len(co_enrolled)
+                              else np.zeros(len(candidates)))
+            else:
+                summed = np.bincount(neighbours, weights=weights, minlength=size)
+                candidate = summed > 0
+                for ranked in heads:
+                    candidate[ranked] = True
+                candidate[taken] = False
+                candidates = np.flatnonzero(candidate & courses['active'])
+                similarity = summed[candidates]
+
+            same_category = np.bincount(courses['category'][basis],
+                                        minlength=category_count)[courses['category'][candidates]]
+            level_counts = np.bincount(courses['difficulty'][basis], minlength=len(levels))
+            proximity = (level_counts[None, :]
+                         * (1.0 - np.abs(levels[None, :] - courses['difficulty'][candidates][:, None]) / 2.0)).sum(axis=1)
+            scores = ((WEIGHTS['co_enrollment'] * similarity + WEIGHTS['category'] * same_category
+                       + WEIGHTS['difficulty'] * proximity) / len(basis)
+                      + WEIGHTS['rating'] * courses['rating'][candidates] / 5.0)
+            recommendations[student_ids[int(learners[start])]] = self._entries(candidates, scores, courses)
+        return recommendations
+
+    def _popular(self, matrix: Dict, courses: Dict) -> List[Dict]:
+        """Fallback for learners without enrollments: most enrolled active courses"""
+        active = np.flatnonzero(courses['active'])
+        return self._entries(active, matrix['enrolled'][active] + courses['rating'][active] / 5.0, courses)
+
+
+def merge_pairs(keys: np.ndarray, counts: np.ndarray, new_keys: np.ndarray, new_counts: np.ndarray):
+    """Add sorted, unique (new_keys, new_counts) into sorted (keys, counts); pairs that reach 0 are dropped"""
+    positions = np.searchsorted(keys, new_keys)
+    found = positions < len(keys)
+    found[found] = keys[positions[found]] == new_keys[found]
+    counts = counts.copy()
+    counts[positions[found]] += new_counts[found]
+    keys = np.insert(keys, positions[~found], new_keys[~found])
+    counts = np.insert(counts, positions[~found], new_counts[~found])
+    kept = counts != 0
+    return keys[kept], counts[kept]
@@ -0,0 +1,62 @@
+import gzip
+import json
+import logging
+from typing import Any
+
+from flask import Response
+
+import metrics
+
+try:
+    import orjson
+except ImportError:  # optional: falls back to the stdlib encoder
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+response_bytes_total = metrics.registry.counter(
+    'response_bytes_total', 'Response body bytes before and after compression', ('route', 'stage'))
+
+# Bodies smaller than this are not worth a gzip header and the CPU
+MIN_COMPRESS_BYTES = 1024
+COMPRESS_LEVEL = 6
+
+
+def encode_json(payload: Any) -> bytes:
+    """Compact JSON bytes, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, separators=(',', ':'), ensure_ascii=False, default=str).encode('utf-8')
+
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    """Whether an Accept-Encoding header allows gzip (honours q=0)"""
+    for part in (accept_encoding or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if coding not in ('gzip', '*'):
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        return quality > 0
+    return False
+
+
+def json_response(payload: Any, accept_encoding: str = '', route: str = '', status: int = 200) -> Response:
+    """Encode a JSON body and gzip it when the client accepts gzip and the body is large enough"""
+    body = encode_json(payload)
+    response_bytes_total.inc(route, 'raw', amount=len(body))
+    response = Response(body, status=status, mimetype='application/json')
+    response.vary.add('Accept-Encoding')
+    if len(body) >= MIN_COMPRESS_BYTES and accepts_gzip(accept_encoding):
+        body = gzip.compress(body, compresslevel=COMPRESS_LEVEL)
+        response.set_data(body)
+        response.headers['Content-Encoding'] = 'gzip'
+    response_bytes_total.inc(route, 'sent', amount=len(body))
+    return response
@@ -0,0 +1,273 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+tenant_requests_total = metrics.registry.counter(
+    'tenant_requests_total', 'Requests routed to each tenant shard', ('tenant',))
+shard_fanout_duration_seconds = metrics.registry.histogram(
+    'shard_fanout_duration_seconds', 'Time for a cross-tenant fan-out across all shards')
+
+TENANT_ID_PATTERN = re.compile(r'^[a-z0-9][a-z0-9_-]{0,62}$')
+
+
+class UnknownTenantError(LookupError):
+    pass
+
+
+def tenant_dir(base: str, tenant: str, default_tenant: str) -> str:
+    """Per-tenant subdirectory for files a subsystem writes; the default tenant keeps `base`"""
+    return base if tenant == default_tenant else os.path.join(base, tenant)
+
+
+class ShardMap:
+    """Tenant id -> database file, persisted as a JSON document.
+
+    The default tenant always maps to the original database file, so an
+    unsharded deployment keeps working unchanged. Every worker process has
+    its own copy of the map and reloads it when the file on disk changes,
+    so a tenant provisioned by another worker is found. `assign`
+    re-reads and rewrites the file under an exclusive lock on a sidecar
+    `.lock` file, so concurrent workers never drop each other's tenants."""
+
+    def __init__(self, path: str, shard_dir: str, default_tenant: str, default_database: str):
+        self.path = path
+        self.shard_dir = shard_dir
+        self.default_tenant = default_tenant
+        self.default_database = default_database
+        self._lock = threading.Lock()
+        self._tenants: Dict[str, str] = {}
+        self._signature = None
+        self.load()
+
+    def _file_signature(self):
+        """Identifies one version of the file; os.replace gives every save a new inode"""
+        try:
+            stat = os.stat(self.path)
+        except (FileNotFoundError, TypeError, ValueError):
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _read(self) -> Dict[str, str]:
+        tenants = {}
+        if self.path and os.path.exists(self.path):
+            with open(self.path) as f:
+                tenants = json.load(f).get('tenants', {})
+        tenants.setdefault(self.default_tenant, self.default_database)
+        return tenants
+
+    def load(self):
+        signature = self._file_signature()
+        tenants = self._read()
+        with self._lock:
+            self._tenants = tenants
+            self._signature = signature
+
+    def _refresh(self):
+        """Reload when another process has rewritten the file"""
+        if self.path and self._file_signature() != self._signature:
+            self.load()
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive across processes (POSIX flock); other platforms only lock within the process"""
+        if not self.path or fcntl is None:
+            yield
+            return
+        with open(f'{self.path}.lock', 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _save(self):
+        if not self.path:
+            return
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'tenants': self._tenants}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+        self._signature = self._file_signature()
+
+    def get(self, tenant: str) -> Optional[str]:
+        # A tenant another worker just assigned shows up as a changed file
+        self._refresh()
+        return self._tenants.get(tenant)
+
+    def assign(self, tenant: str) -> str:
+        """Give a new tenant its own database file under shard_dir"""
+        with self._lock, self._file_lock():
+            # Merge with whatever other workers have saved since our last read
+            self._tenants = self._read()
+            if tenant in self._tenants:
+                self._signature = self._file_signature()
+                return self._tenants[tenant]
+            os.makedirs(self.shard_dir, exist_ok=True)
+            path = os.path.join(self.shard_dir, f'{tenant}.db')
+            self._tenants[tenant] = path
+            self._save()
+            return path
+
+    def tenants(self) -> Dict[str, str]:
+        self._refresh()
+        return dict(self._tenants)
+
+
+class ShardRouter:
+    """Routes database access to the current tenant's shard.
+
+    Each tenant has its own SQLite file, created by `database_factory`, so
+    each has its own connections, writer lock and schema migrations. The
+    tenant for the current request lives in a ContextVar. That means
+    `get_connection()` is a drop-in for a single database, and code that
+    already calls `db.get_connection()` becomes tenant-aware unchanged.
+    Shards are opened (and migrated) the first time they are used."""
+
+    def __init__(self, database_factory: Callable[[str, str], Any], shard_map: ShardMap,
+                 auto_provision: bool = False, max_workers: int = 8):
+        self.database_factory = database_factory
+        self.shard_map = shard_map
+        self.default_tenant = shard_map.default_tenant
+        self.auto_provision = auto_provision
+        self.max_workers = max_workers
+        self._current: ContextVar[str] = ContextVar('tenant', default=self.default_tenant)
+        self._shards: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    # Tenant resolution
+
+    def current_tenant(self) -> str:
+        return self._current.get()
+
+    def resolve(self, tenant: Optional[str]) -> str:
+        """Validate a tenant id, provisioning it when auto-provisioning is on"""
+        tenant = (tenant or self.default_tenant).strip().lower()
+        if not TENANT_ID_PATTERN.match(tenant):
+            raise ValueError('Invalid tenant id')
+        if self.shard_map.get(tenant) is None:
+            if not self.auto_provision:
+                raise UnknownTenantError(tenant)
+            self.provision(tenant)
+        return tenant
+
+    def activate(self, tenant: str):
+        tenant_requests_total.inc(tenant)
+        return self._current.set(tenant)
+
+    def deactivate(self, token):
+        self._current.reset(token)
+
+    @contextmanager
+    def use_tenant(self, tenant: str):
+        token = self._current.set(tenant)
+        try:
+            yield self.shard(tenant)
+        finally:
+            self._current.reset(token)
+
+    # Shards
+
+    def shard(self, tenant: Optional[str] = None):
+        tenant = tenant or self.current_tenant()
+        database = self._shards.get(tenant)
+        if database is None:
+            with self._lock:
+                database = self._shards.get(tenant)
+                if database is None:
+                    path = self.shard_map.get(tenant)
+                    if path is None:
+                        raise UnknownTenantError(tenant)
+                    database = self.database_factory(tenant, path)
+                    self._shards[tenant] = database
+                    logger.info(f"Opened shard {path} for tenant {tenant}")
+        return database
+
+    def provision(self, tenant: str) -> Dict:
+        if not TENANT_ID_PATTERN.match(tenant):
+            raise ValueError('Invalid tenant id')
+        created = self.shard_map.get(tenant) is None
+        path = self.shard_map.assign(tenant)
+        self.shard(tenant)
+        return {'tenant_id': tenant, 'database': path, 'created': created}
+
+    def tenants(self) -> List[Dict]:
+        return [{'tenant_id': tenant, 'database': path, 'open': tenant in self._shards}
+                for tenant, path in sorted(self.shard_map.tenants().items())]
+
+    def get_connection(self):
+        """Open a connection to the current tenant's shard"""
+        return self.shard().get_connection()
+
+    @property
+    def db_name(self) -> str:
+        return self.shard().db_name
+
+    def fan_out(self, func: Callable[[str, Any], Any], tenants: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Run func(tenant, shard) on every shard in parallel.
+
+        Each call runs with that tenant active. A failing shard reports its
+        error instead of failing the whole aggregate."""
+        tenants = tenants or sorted(self.shard_map.tenants())
+        start = time.perf_counter()
+
+        def call(tenant):
+            try:
+                with self.use_tenant(tenant) as shard:
+                    return func(tenant, shard)
+            except Exception as e:
+                logger.error(f"Fan-out to tenant {tenant} failed: {e}")
+                return {'error': str(e)}
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(tenants)))) as pool:
+            results = dict(zip(tenants, pool.map(call, tenants)))
+        shard_fanout_duration_seconds.observe(time.perf_counter() - start)
+        return results
+
+
+class TenantLocal:
+    """One instance of a stateful subsystem per tenant, built on first use.
+
+    Attribute access is proxied to the current tenant's instance, so the
+    wrapper's own methods avoid common names like get(). Each
+    instance is constructed from its own shard database, so background
+    threads it starts keep talking to the right file without a request
+    context."""
+
+    def __init__(self, router: ShardRouter, factory: Callable[[str, Any], Any]):
+        self._router = router
+        self._factory = factory
+        self._instances: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def for_tenant(self, tenant: Optional[str] = None):
+        tenant = tenant or self._router.current_tenant()
+        instance = self._instances.get(tenant)
+        if instance is None:
+            with self._lock:
+                instance = self._instances.get(tenant)
+                if instance is None:
+                    instance = self._factory(tenant, self._router.shard(tenant))
+                    self._instances[tenant] = instance
+        return instance
+
+    def tenant_instances(self) -> Dict[str, Any]:
+        return dict(self._instances)
+
+    def __getattr__(self, name):
+        return getattr(self.for_tenant(), name)
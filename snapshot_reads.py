@@ -0,0 +1,215 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import metrics
+from batch_requests import shared_connection
+
+logger = logging.getLogger(__name__)
+
+snapshot_reads_total = metrics.registry.counter(
+    'snapshot_reads_total', 'Read snapshots handed out', ('mode',))
+replica_refresh_duration_seconds = metrics.registry.histogram(
+    'replica_refresh_duration_seconds', 'Time to copy the database into the read replica',
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0))
+
+MODES = ('wal', 'replica', 'off')
+
+
+class Snapshot:
+    """A consistent read view; close() ends the read transaction and returns the connection"""
+
+    def __init__(self, reader: 'SnapshotReader', connection: sqlite3.Connection, generation: int,
+                 taken_at: float):
+        self.reader = reader
+        self.connection = connection
+        self.generation = generation
+        self.taken_at = taken_at
+
+    @property
+    def age_seconds(self) -> float:
+        return max(0.0, time.time() - self.taken_at)
+
+    def info(self) -> Dict:
+        return {
+            'mode': self.reader.mode,
+            'taken_at': datetime.fromtimestamp(self.taken_at).isoformat(),
+            'age_seconds': round(self.age_seconds, 3)
+        }
+
+    def headers(self) -> Dict[str, str]:
+        return {'X-Snapshot-Mode': self.reader.mode, 'X-Snapshot-Age': f'{self.age_seconds:.3f}'}
+
+    def close(self):
+        self.reader._release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class SnapshotReader:
+    """Serves long reporting/export reads without blocking the write routes.
+
+    `wal` switches the database to write-ahead logging and reads through a
+    small pool of read-only connections, each read in its own transaction.
+    Writers append to the WAL while readers keep seeing the snapshot they
+    started with. `replica` copies the database into a separate file with
+    the online backup API every `refresh_interval` seconds and swaps it in
+    atomically, so readers never touch the primary file at all. The cost is
+    staleness, which is reported as the snapshot age. `off` reads the
+    primary database directly in a deferred read transaction; without WAL
+    that transaction holds a shared lock, so writers wait until it ends."""
+
+    def __init__(self, database, mode: str = 'wal', replica_path: Optional[str] = None,
+                 refresh_interval: float = 30.0, pool_size: int = 4, backup_pages: int = 1024):
+        if mode not in MODES:
+            raise ValueError(f'Invalid snapshot mode. Must be one of: {list(MODES)}')
+        self.database = database
+        self.mode = mode
+        self.replica_path = replica_path or f'{os.path.splitext(database.db_name)[0]}.replica.db'
+        self.refresh_interval = refresh_interval
+        self.pool_size = pool_size
+        self.backup_pages = backup_pages
+        self.refreshed_at: Optional[float] = None
+        self.last_refresh: Optional[Dict] = None
+        self._generation = 0
+        self._pool: List[Tuple[int, sqlite3.Connection]] = []
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self.mode == 'wal':
+            conn = self.database.get_connection()
+            try:
+                journal_mode = conn.execute('PRAGMA journal_mode = WAL').fetchone()[0]
+            finally:
+                conn.close()
+            if journal_mode.lower() != 'wal':
+                logger.warning(f"Could not enable WAL (journal_mode={journal_mode}); reading the primary directly")
+                self.mode = 'off'
+        elif self.mode == 'replica' and self._thread is None:
+            self.refresh()
+            self._thread = threading.Thread(target=self._run, name='replica-refresher', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        with self._lock:
+            pool, self._pool = self._pool, []
+        for _, conn in pool:
+            conn.close()
+
+    def _run(self):
+        while not self._stopped.wait(self.refresh_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Error refreshing read replica: {e}")
+
+    def refresh(self) -> Dict:
+        """Copy the primary into a new replica file and swap it in"""
+        with self._refresh_lock:
+            started = time.time()
+            tmp_path = f'{self.replica_path}.tmp'
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            source = self.database.get_connection()
+            target = sqlite3.connect(tmp_path)
+            try:
+                # Copying in steps lets writers in between them
+                source.backup(target, pages=self.backup_pages, sleep=0.001)
+            finally:
+                target.close()
+                source.close()
+            os.replace(tmp_path, self.replica_path)
+
+            with self._lock:
+                self._generation += 1
+                self.refreshed_at = started
+                stale, self._pool = self._pool, []
+            for _, conn in stale:
+                conn.close()
+
+            elapsed = time.time() - started
+            replica_refresh_duration_seconds.observe(elapsed)
+            self.last_refresh = {
+                'refreshed_at': datetime.fromtimestamp(started).isoformat(),
+                'duration_ms': round(elapsed * 1000, 3),
+                'size_bytes': os.path.getsize(self.replica_path)
+            }
+            return self.last_refresh
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.mode == 'replica':
+            # The replica file is only ever replaced, never written in place
+            path = f'file:{os.path.abspath(self.replica_path)}?mode=ro&immutable=1'
+        else:
+            path = f'file:{os.path.abspath(self.database.db_name)}?mode=ro'
+        return metrics.connect(path, uri=True, check_same_thread=False)
+
+    def open(self) -> Snapshot:
+        """Begin a snapshot read; callers must close() it"""
+        shared = shared_connection(self.database.db_name)
+        if shared is not None:
+            # Inside a batch: read from the batch's snapshot
+            return Snapshot(self, shared, -1, shared.taken_at)
+        if self.mode == 'off':
+            # Still one read transaction, so a batch sees a single consistent view
+            conn = self.database.get_connection()
+            conn.execute('BEGIN')
+            return Snapshot(self, conn, -1, time.time())
+
+        with self._lock:
+            generation = self._generation
+            conn = None
+            while self._pool and conn is None:
+                pooled_generation, pooled = self._pool.pop()
+                if pooled_generation == generation:
+                    conn = pooled
+                else:
+                    pooled.close()
+        if conn is None:
+            conn = self._connect()
+
+        conn.execute('BEGIN')
+        snapshot_reads_total.inc(self.mode)
+        taken_at = self.refreshed_at if self.mode == 'replica' else time.time()
+        return Snapshot(self, conn, generation, taken_at)
+
+    def _release(self, snapshot: Snapshot):
+        conn = snapshot.connection
+        if snapshot.generation < 0:
+            conn.close()
+            return
+        try:
+            conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            return
+        with self._lock:
+            if snapshot.generation == self._generation and len(self._pool) < self.pool_size:
+                self._pool.append((snapshot.generation, conn))
+                return
+        conn.close()
+
+    def status(self) -> Dict:
+        status = {'mode': self.mode, 'pooled_connections': len(self._pool)}
+        if self.mode == 'replica':
+            status.update({
+                'replica_path': self.replica_path,
+                'refresh_interval_seconds': self.refresh_interval,
+                'snapshot_age_seconds': round(time.time() - self.refreshed_at, 3) if self.refreshed_at else None,
+                'last_refresh': self.last_refresh
+            })
+        else:
+            status['snapshot_age_seconds'] = 0.0
+        return status
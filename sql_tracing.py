@@ -0,0 +1,171 @@
+import logging
+import sqlite3
+import threading
+import time
+from collections import Counter as TallyCounter, deque
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+db_slow_queries_total = metrics.registry.counter(
+    'db_slow_queries_total', 'SQLite statements slower than the slow-query threshold', ('statement',))
+db_query_budget_exceeded_total = metrics.registry.counter(
+    'db_query_budget_exceeded_total', 'Requests that ran more statements than the query budget', ('route',))
+db_queries_per_request = metrics.registry.histogram(
+    'db_queries_per_request', 'SQLite statements issued per HTTP request', ('route',),
+    buckets=(1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144))
+
+# Statements worth asking the planner about; DDL and PRAGMAs are skipped
+_EXPLAINABLE_PREFIXES = ('SELECT', 'WITH', 'UPDATE', 'DELETE', 'INSERT', 'REPLACE')
+
+
+def param_shape(parameters) -> str:
+    """Describe bound parameters by type only, never by value"""
+    if parameters is None:
+        return 'many'
+    if isinstance(parameters, dict):
+        return '{' + ', '.join(f'{key}: {type(value).__name__}' for key, value in parameters.items()) + '}'
+    try:
+        return '(' + ', '.join(type(value).__name__ for value in parameters) + ')'
+    except TypeError:
+        return type(parameters).__name__
+
+
+class RequestTrace:
+    """Statements recorded while serving a single request"""
+
+    def __init__(self, route: str):
+        self.route = route
+        self.started_at = time.perf_counter()
+        self.statements: List[Dict] = []
+        self.total_time = 0.0
+
+    @property
+    def query_count(self) -> int:
+        return len(self.statements)
+
+    def repeated_templates(self, threshold: int) -> Dict[str, int]:
+        """Templates issued at least `threshold` times, the usual N+1 signature"""
+        tally = TallyCounter(statement['statement'] for statement in self.statements)
+        return {template: count for template, count in tally.items() if count >= threshold}
+
+
+class SQLTracer:
+    """Records every statement with its parameter shape and duration, logs slow
+    ones together with their EXPLAIN QUERY PLAN and flags requests that go over
+    the per-request query budget"""
+
+    def __init__(self, slow_query_ms: float = 100.0, query_budget: int = 20,
+                 repeat_threshold: int = 5, history_size: int = 100):
+        self.slow_query_ms = slow_query_ms
+        self.query_budget = query_budget
+        self.repeat_threshold = repeat_threshold
+        self.slow_queries = deque(maxlen=history_size)
+        self.flagged_requests = deque(maxlen=history_size)
+        self._current: ContextVar[Optional[RequestTrace]] = ContextVar('sql_trace', default=None)
+        self._explaining = threading.local()
+
+    def install(self):
+        metrics.add_statement_listener(self.record)
+
+    def start_request(self, route: str):
+        return self._current.set(RequestTrace(route))
+
+    def current(self) -> Optional[RequestTrace]:
+        return self._current.get()
+
+    def finish_request(self, token=None) -> Optional[RequestTrace]:
+        """Close the active trace and flag it if it blew the budget"""
+        trace = self._current.get()
+        if token is not None:
+            self._current.reset(token)
+        else:
+            self._current.set(None)
+        if trace is None:
+            return None
+
+        db_queries_per_request.observe(trace.query_count, trace.route)
+        repeated = trace.repeated_templates(self.repeat_threshold)
+        over_budget = trace.query_count > self.query_budget
+        if over_budget or repeated:
+            if over_budget:
+                db_query_budget_exceeded_total.inc(trace.route)
+            logger.warning(
+                f"Request {trace.route} ran {trace.query_count} queries "
+                f"(budget {self.query_budget}) in {trace.total_time * 1000:.1f}ms; repeated: {repeated}"
+            )
+            self.flagged_requests.append({
+                'route': trace.route,
+                'query_count': trace.query_count,
+                'query_budget': self.query_budget,
+                'query_time_ms': round(trace.total_time * 1000, 3),
+                'repeated_statements': repeated,
+                'timestamp': datetime.now().isoformat()
+            })
+        return trace
+
+    def record(self, connection, sql: str, parameters, elapsed: float, failed: bool):
+        """Statement listener registered with metrics.add_statement_listener"""
+        if getattr(self._explaining, 'active', False):
+            return
+        try:
+            template = metrics.statement_template(sql)
+            trace = self._current.get()
+            if trace is not None:
+                trace.statements.append({
+                    'statement': template,
+                    'params': param_shape(parameters),
+                    'duration_ms': round(elapsed * 1000, 3),
+                    'failed': failed
+                })
+                trace.total_time += elapsed
+
+            if elapsed * 1000 >= self.slow_query_ms and not failed:
+                self._log_slow_query(connection, sql, template, parameters, elapsed, trace)
+        except Exception as e:
+            logger.error(f"Error tracing SQL statement: {e}")
+
+    def explain(self, connection, sql: str, parameters) -> List[str]:
+        """Return EXPLAIN QUERY PLAN detail lines for a statement"""
+        if parameters is None or not sql.lstrip().upper().startswith(_EXPLAINABLE_PREFIXES):
+            return []
+        self._explaining.active = True
+        try:
+            # A plain cursor bypasses the instrumentation so EXPLAIN isn't itself traced
+            cursor = sqlite3.Cursor(connection)
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', parameters)
+            return [row[-1] for row in cursor.fetchall()]
+        except sqlite3.Error as e:
+            return [f'EXPLAIN failed: {e}']
+        finally:
+            self._explaining.active = False
+
+    def _log_slow_query(self, connection, sql, template, parameters, elapsed, trace):
+        db_slow_queries_total.inc(template)
+        plan = self.explain(connection, sql, parameters)
+        full_scans = [step for step in plan if step.startswith('SCAN') and 'USING' not in step]
+        logger.warning(
+            f"Slow query ({elapsed * 1000:.1f}ms) on {trace.route if trace else 'background'}: "
+            f"{template} params={param_shape(parameters)} plan={plan}"
+        )
+        self.slow_queries.append({
+            'statement': template,
+            'params': param_shape(parameters),
+            'duration_ms': round(elapsed * 1000, 3),
+            'route': trace.route if trace else None,
+            'query_plan': plan,
+            'full_scans': full_scans,
+            'timestamp': datetime.now().isoformat()
+        })
+
+    def report(self) -> Dict:
+        return {
+            'slow_query_ms': self.slow_query_ms,
+            'query_budget': self.query_budget,
+            'slow_queries': list(self.slow_queries),
+            'flagged_requests': list(self.flagged_requests)
+        }
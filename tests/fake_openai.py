@@ -0,0 +1,134 @@
+"""A local stand-in for the OpenAI chat completions API.
+
+Each request takes the next queued behaviour (or the default one), so a
+test can script latency, error statuses, dropped connections and streamed
+replies. Point a client at `server.url` as its base_url."""
+
+import json
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+DEFAULT_TOKENS = ['Hello', ' from', ' the', ' fake', ' server', '.']
+
+
+def behaviour(status: int = 200, delay: float = 0.0, drop: bool = False, tokens: Optional[List[str]] = None,
+              token_delay: float = 0.0, fail_after: Optional[int] = None) -> Dict:
+    """One scripted response.
+
+    status: HTTP status; anything but 200 returns an OpenAI-style error body
+    delay: seconds to wait before answering
+    drop: close the connection without answering
+    tokens: reply text, split into stream chunks
+    token_delay: seconds between stream chunks
+    fail_after: end a stream with an error event after this many chunks
+    """
+    return {'status': status, 'delay': delay, 'drop': drop, 'tokens': tokens or DEFAULT_TOKENS,
+            'token_delay': token_delay, 'fail_after': fail_after}
+
+
+class FakeOpenAI:
+    def __init__(self):
+        self.default = behaviour()
+        self.script: deque = deque()
+        self.requests: List[Dict] = []
+        self.connections = set()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self._server.server_address[1]}/v1'
+
+    def start(self) -> 'FakeOpenAI':
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def enqueue(self, *behaviours: Dict):
+        self.script.extend(behaviours)
+
+    def _next(self) -> Dict:
+        try:
+            return self.script.popleft()
+        except IndexError:
+            return self.default
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                fake.requests.append(body)
+                fake.connections.add(self.client_address)
+                plan = fake._next()
+                time.sleep(plan['delay'])
+                if plan['drop']:
+                    self.close_connection = True
+                    self.connection.close()
+                    return
+                if plan['status'] != 200:
+                    self._json(plan['status'], {'error': {'message': f"injected {plan['status']}",
+                                                          'type': 'server_error'}})
+                elif body.get('stream'):
+                    self._stream(body, plan)
+                else:
+                    self._json(200, {
+                        'id': 'chatcmpl-fake', 'object': 'chat.completion', 'created': int(time.time()),
+                        'model': body['model'],
+                        'choices': [{'index': 0, 'finish_reason': 'stop',
+                                     'message': {'role': 'assistant', 'content': ''.join(plan['tokens'])}}]
+                    })
+
+            def _json(self, status: int, payload: Dict):
+                data = json.dumps(payload).encode()
+                try:
+                    self.send_response(status)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client gave up waiting (deadline passed)
+                    self.close_connection = True
+
+            def _chunk(self, data: bytes):
+                self.wfile.write(f'{len(data):x}\r\n'.encode() + data + b'\r\n')
+                self.wfile.flush()
+
+            def _stream(self, body: Dict, plan: Dict):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                try:
+                    for index, token in enumerate(plan['tokens']):
+                        if plan['fail_after'] is not None and index == plan['fail_after']:
+                            error = {'error': {'message': 'injected stream failure', 'type': 'server_error'}}
+                            self._chunk(f'data: {json.dumps(error)}\n\n'.encode())
+                            break
+                        time.sleep(plan['token_delay'])
+                        chunk = {'id': 'chatcmpl-fake', 'object': 'chat.completion.chunk',
+                                 'created': int(time.time()), 'model': body['model'],
+                                 'choices': [{'index': 0, 'delta': {'content': token}, 'finish_reason': None}]}
+                        self._chunk(f'data: {json.dumps(chunk)}\n\n'.encode())
+                    else:
+                        self._chunk(b'data: [DONE]\n\n')
+                    self._chunk(b'')
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client hung up mid-stream (cancelled or past its deadline)
+                    self.close_connection = True
+
+        return Handler
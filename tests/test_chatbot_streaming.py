@@ -0,0 +1,107 @@
+import _thread
+import builtins
+import threading
+import time
+
+import pytest
+
+from fake_openai import DEFAULT_TOKENS, behaviour
+from chatbot import AIEnhancedIronLadyChatbot
+
+
+@pytest.fixture
+def chatbot(fake_openai, monkeypatch):
+    monkeypatch.setenv('OPENAI_API_KEY', 'test-key')
+    monkeypatch.setenv('OPENAI_BASE_URL', fake_openai.url)
+    monkeypatch.setenv('LLM_DEADLINE_SECONDS', '5')
+    return AIEnhancedIronLadyChatbot()
+
+
+def finish_greeting(bot):
+    greeting = ''.join(bot.greeting)
+    bot.greeting = None
+    return greeting
+
+
+def test_greeting_checks_the_key(chatbot):
+    assert finish_greeting(chatbot) == ''.join(DEFAULT_TOKENS)
+    assert chatbot.llm_verified
+    assert [m['role'] for m in chatbot.conversation_history] == ['user', 'assistant']
+
+
+def test_rejected_key_switches_to_fallback(fake_openai, monkeypatch):
+    fake_openai.default = behaviour(status=401)
+    monkeypatch.setenv('OPENAI_API_KEY', 'bad-key')
+    monkeypatch.setenv('OPENAI_BASE_URL', fake_openai.url)
+    bot = AIEnhancedIronLadyChatbot()
+    assert finish_greeting(bot) == bot.get_fallback_response('Hello')
+    assert not bot.use_openai
+    assert not bot.llm_verified
+    assert bot.conversation_history == []
+
+
+def test_reply_streams_token_by_token(chatbot, fake_openai):
+    finish_greeting(chatbot)
+    fake_openai.enqueue(behaviour(tokens=['One', ' two', ' three'], token_delay=0.05))
+    tokens = list(chatbot.stream_ai_response('Tell me about mentors'))
+    assert tokens == ['One', ' two', ' three']
+    assert chatbot.conversation_history[-2:] == [
+        {'role': 'user', 'content': 'Tell me about mentors'},
+        {'role': 'assistant', 'content': 'One two three'}
+    ]
+
+
+def test_failed_stream_keeps_shown_tokens_and_drops_question(chatbot, fake_openai):
+    finish_greeting(chatbot)
+    history = list(chatbot.conversation_history)
+    fake_openai.enqueue(behaviour(tokens=['One', ' two', ' three'], fail_after=2))
+    tokens = list(chatbot.stream_ai_response('Tell me about mentors'))
+    assert tokens[:2] == ['One', ' two']
+    assert tokens[2] == '\n\n' + chatbot.get_fallback_response('Tell me about mentors')
+    assert chatbot.conversation_history == history
+    assert chatbot.use_openai
+
+
+def test_cancelled_stream_stops_early_and_drops_question(chatbot, fake_openai):
+    finish_greeting(chatbot)
+    history = list(chatbot.conversation_history)
+    fake_openai.enqueue(behaviour(tokens=['word '] * 50, token_delay=0.1))
+    stream = chatbot.stream_ai_response('Tell me everything')
+    started = time.monotonic()
+    assert [next(stream), next(stream)] == ['word ', 'word ']
+    stream.close()
+    assert time.monotonic() - started < 1.0
+    assert chatbot.conversation_history == history
+    # Cancelling is not an upstream failure
+    assert chatbot.llm.breaker.failures == 0
+
+
+def test_ctrl_c_stops_the_reply_not_the_chat(chatbot, fake_openai, capsys):
+    finish_greeting(chatbot)
+    history = list(chatbot.conversation_history)
+    fake_openai.enqueue(behaviour(tokens=['word '] * 50, token_delay=0.1))
+    threading.Timer(0.35, _thread.interrupt_main).start()
+    chatbot.print_reply(chatbot.stream_ai_response('Tell me everything'))
+    assert '[stopped]' in capsys.readouterr().out
+    assert chatbot.conversation_history == history
+
+
+def test_prompt_is_shown_before_the_greeting_arrives(chatbot, fake_openai, monkeypatch, capsys):
+    fake_openai.default = behaviour(token_delay=0.2)
+    # A new greeting so it streams slowly
+    chatbot.conversation_history = []
+    chatbot.greeting = chatbot.start_greeting()
+    prompted = []
+
+    def fake_input(prompt):
+        prompted.append(time.monotonic())
+        return 'quit'
+
+    monkeypatch.setattr(builtins, 'input', fake_input)
+    started = time.monotonic()
+    chatbot.chat()
+    assert prompted[0] - started < 0.2
+    out = capsys.readouterr().out
+    # The greeting still printed, before the farewell
+    assert out.index(''.join(DEFAULT_TOKENS)) < out.index('Thank you for chatting')
+    assert '✅ OpenAI integration activated!' in out
@@ -0,0 +1,107 @@
+import time
+
+import pytest
+
+from fake_openai import behaviour
+from llm_client import CircuitBreaker, LLMClient, LLMRejected, LLMUnavailable, RetryBudget
+
+MESSAGES = [{'role': 'user', 'content': 'hi'}]
+
+
+def make_client(server, **kwargs):
+    kwargs.setdefault('backoff_base', 0.01)
+    kwargs.setdefault('backoff_cap', 0.02)
+    return LLMClient(api_key='test-key', base_url=server.url, **kwargs)
+
+
+def test_chat_reuses_one_connection(fake_openai):
+    client = make_client(fake_openai)
+    for _ in range(3):
+        assert client.chat('test', MESSAGES) == 'Hello from the fake server.'
+    assert len(fake_openai.requests) == 3
+    assert len(fake_openai.connections) == 1
+
+
+@pytest.mark.parametrize('failure', [behaviour(status=429), behaviour(status=503), behaviour(drop=True)])
+def test_transient_failure_is_retried(fake_openai, failure):
+    fake_openai.enqueue(failure)
+    client = make_client(fake_openai)
+    assert client.chat('test', MESSAGES) == 'Hello from the fake server.'
+    assert len(fake_openai.requests) == 2
+    assert client.breaker.state == 'closed'
+
+
+def test_rejected_request_is_not_retried(fake_openai):
+    fake_openai.enqueue(behaviour(status=400))
+    client = make_client(fake_openai)
+    with pytest.raises(LLMRejected):
+        client.chat('test', MESSAGES)
+    assert len(fake_openai.requests) == 1
+    assert client.breaker.state == 'closed'
+
+
+def test_breaker_opens_then_half_opens(fake_openai):
+    fake_openai.default = behaviour(status=500)
+    client = make_client(fake_openai, max_retries=0,
+                         breaker=CircuitBreaker(failure_threshold=2, reset_timeout=0.3))
+    for _ in range(2):
+        with pytest.raises(LLMUnavailable):
+            client.chat('test', MESSAGES)
+    assert client.breaker.state == 'open'
+
+    # Refused without reaching the server
+    with pytest.raises(LLMUnavailable, match='circuit breaker is open'):
+        client.chat('test', MESSAGES)
+    assert len(fake_openai.requests) == 2
+
+    # After the reset timeout one trial call goes through; its failure reopens the breaker
+    time.sleep(0.35)
+    with pytest.raises(LLMUnavailable):
+        client.chat('test', MESSAGES)
+    assert len(fake_openai.requests) == 3
+    assert client.breaker.state == 'open'
+
+    # A successful trial closes it again
+    fake_openai.default = behaviour()
+    time.sleep(0.35)
+    assert client.chat('test', MESSAGES) == 'Hello from the fake server.'
+    assert client.breaker.state == 'closed'
+
+
+def test_retry_budget_limits_retries(fake_openai):
+    fake_openai.default = behaviour(status=503)
+    client = make_client(fake_openai, max_retries=5, retry_budget=RetryBudget(ratio=0.0, min_tokens=1.0))
+    with pytest.raises(LLMUnavailable, match='retry budget exhausted'):
+        client.chat('test', MESSAGES)
+    # One call and the single retry the budget allowed, not 1 + max_retries
+    assert len(fake_openai.requests) == 2
+
+    with pytest.raises(LLMUnavailable, match='retry budget exhausted'):
+        client.chat('test', MESSAGES)
+    assert len(fake_openai.requests) == 3
+
+
+def test_deadline_cuts_off_slow_response(fake_openai):
+    fake_openai.default = behaviour(delay=2.0)
+    client = make_client(fake_openai, deadline=0.3)
+    started = time.monotonic()
+    with pytest.raises(LLMUnavailable):
+        client.chat('test', MESSAGES)
+    assert time.monotonic() - started < 1.0
+
+
+def test_deadline_covers_retries(fake_openai):
+    fake_openai.default = behaviour(status=503, delay=0.2)
+    client = make_client(fake_openai, deadline=0.5, max_retries=10, retry_budget=RetryBudget(min_tokens=10.0))
+    started = time.monotonic()
+    with pytest.raises(LLMUnavailable):
+        client.chat('test', MESSAGES)
+    assert time.monotonic() - started < 1.0
+    assert len(fake_openai.requests) <= 3
+
+
+def test_missing_key_is_unavailable():
+    client = LLMClient(api_key=None)
+    assert not client.enabled
+    with pytest.raises(LLMUnavailable):
+        client.chat('test', MESSAGES)
@@ -0,0 +1,49 @@
+import sqlite3
+import time
+from types import SimpleNamespace
+
+from maintenance import DatabaseMaintenance, bound_connection
+
+SLOW_QUERY = 'WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) SELECT COUNT(*) FROM n'
+
+
+def make_maintenance(tmp_path, **kwargs):
+    path = str(tmp_path / 'app.db')
+    with sqlite3.connect(path) as conn:
+        conn.execute('CREATE TABLE courses (pk INTEGER PRIMARY KEY)')
+        conn.execute('CREATE TABLE change_clock (id INTEGER PRIMARY KEY, version INTEGER, pruned_version INTEGER)')
+        conn.execute('INSERT INTO change_clock VALUES (1, 0, 0)')
+    return DatabaseMaintenance(SimpleNamespace(db_name=path), **kwargs)
+
+
+def test_scheduled_job_gets_the_step_deadline(tmp_path):
+    maintenance = make_maintenance(tmp_path, step_seconds=0.2)
+    deadlines = []
+
+    def job(deadline):
+        deadlines.append(deadline - time.monotonic())
+        return 'done'
+
+    maintenance.schedule('job', job, 3600)
+    run = maintenance.run(tasks=['job'], force=True)['ran'][0]
+    assert run['outcome'] == 'ok'
+    assert 0.1 < deadlines[0] <= 0.2
+
+
+def test_scheduled_job_is_interrupted_and_stays_due(tmp_path):
+    maintenance = make_maintenance(tmp_path, step_seconds=0.2)
+
+    def job(deadline):
+        conn = sqlite3.connect(maintenance.database.db_name)
+        try:
+            bound_connection(conn, deadline)
+            return str(conn.execute(SLOW_QUERY).fetchone())
+        finally:
+            conn.close()
+
+    maintenance.schedule('job', job, 3600)
+    started = time.monotonic()
+    run = maintenance.run(tasks=['job'])['ran'][0]
+    assert time.monotonic() - started < 1.0
+    assert run['outcome'] == 'interrupted'
+    assert [run['task'] for run in maintenance.run()['ran']] == ['job']
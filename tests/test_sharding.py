@@ -0,0 +1,42 @@
+import multiprocessing
+
+from sharding import ShardMap
+
+
+def make_map(tmp_path):
+    return ShardMap(str(tmp_path / 'shard_map.json'), str(tmp_path / 'shards'), 'default', 'default.db')
+
+
+def assign_all(tmp_path, tenants):
+    shard_map = make_map(tmp_path)
+    for tenant in tenants:
+        shard_map.assign(tenant)
+
+
+def test_worker_sees_tenant_assigned_by_another(tmp_path):
+    first, second = make_map(tmp_path), make_map(tmp_path)
+    assert second.get('acme') is None
+    path = first.assign('acme')
+    assert second.get('acme') == path
+    assert set(second.tenants()) == {'default', 'acme'}
+
+
+def test_assign_merges_with_other_workers(tmp_path):
+    first, second = make_map(tmp_path), make_map(tmp_path)
+    first.assign('acme')
+    # second's in-memory map predates acme; saving must not drop it
+    second.assign('globex')
+    assert set(make_map(tmp_path).tenants()) == {'default', 'acme', 'globex'}
+    assert first.assign('globex') == second.get('globex')
+
+
+def test_concurrent_processes_keep_every_tenant(tmp_path):
+    context = multiprocessing.get_context('spawn')
+    workers = [context.Process(target=assign_all, args=(tmp_path, [f'w{w}-t{t}' for t in range(10)]))
+               for w in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+    assert len(make_map(tmp_path).tenants()) == 1 + 4 * 10
@@ -0,0 +1,67 @@
+import importlib
+import json
+import os
+import sqlite3
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+
+@pytest.fixture(scope='module')
+def app_module(tmp_path_factory):
+    workdir = tmp_path_factory.mktemp('app')
+    # A tenant already in the shard map when the app starts
+    (workdir / 'shard_map.json').write_text(json.dumps({'tenants': {'globex': str(workdir / 'globex.db')}}))
+    patch = pytest.MonkeyPatch()
+    patch.chdir(workdir)
+    patch.setenv('TENANT_SHARDING', 'true')
+    patch.setenv('RATE_LIMITING', 'false')
+    patch.setenv('SHARD_MAP_PATH', str(workdir / 'shard_map.json'))
+    patch.setenv('SHARD_DIR', str(workdir / 'shards'))
+    sys.modules.pop('app', None)
+    module = importlib.import_module('app')
+    yield module
+    for subsystem in module.TENANT_WORKERS:
+        for instance in subsystem.tenant_instances().values():
+            if hasattr(instance, 'stop'):
+                instance.stop()
+    sys.modules.pop('app', None)
+    patch.undo()
+
+
+def worker_tenants(module):
+    return {name: set(subsystem.tenant_instances()) for name, subsystem in
+            zip(('snapshot_reader', 'progress_ingestor', 'recommender', 'db_maintenance'), module.TENANT_WORKERS)}
+
+
+def test_mapped_tenants_get_workers_at_startup(app_module):
+    for name, tenants in worker_tenants(app_module).items():
+        assert {'default', 'globex'} <= tenants, name
+
+
+def test_provisioned_tenant_gets_workers(app_module):
+    client = app_module.app.test_client()
+    response = client.post('/api/admin/tenants', json={'tenant_id': 'acme'})
+    assert response.status_code == 201
+    for name, tenants in worker_tenants(app_module).items():
+        assert 'acme' in tenants, name
+    # Its maintenance runs analytics retention against its own shard
+    maintenance = app_module.db_maintenance.for_tenant('acme')
+    assert 'analytics_retention' in maintenance.tasks
+    assert maintenance.database is app_module.db.shard('acme')
+
+
+def test_retention_runs_on_a_tenant_shard(app_module):
+    app_module.app.test_client().post('/api/admin/tenants', json={'tenant_id': 'initech'})
+    shard = app_module.db.shard('initech')
+    old = (datetime.now() - timedelta(days=400)).isoformat()
+    with sqlite3.connect(shard.db_name) as conn:
+        conn.execute("INSERT INTO analytics (id, event_type, course_id, data, timestamp) "
+                     "VALUES ('old-event', 'course_viewed', 'c1', '{}', ?)", (old,))
+    result = app_module.db_maintenance.for_tenant('initech').run(tasks=['analytics_retention'], force=True)
+    assert [run['outcome'] for run in result['ran']] == ['ok']
+    with sqlite3.connect(shard.db_name) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM analytics WHERE id = 'old-event'").fetchone()[0] == 0
+    archive_dir = app_module.analytics_retention.for_tenant('initech').archive_dir
+    assert 'initech' in archive_dir and os.listdir(archive_dir)